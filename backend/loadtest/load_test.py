@@ -0,0 +1,494 @@
+"""
+Load Testing Harness for PersonalizeAI Platform
+Replays a weighted traffic mix against the API and reports latency percentiles per endpoint
+
+Usage (from backend/):
+    # Start gunicorn on a fresh database seeded with 20k subscribers and run a closed loop
+    python loadtest/load_test.py --workers 2 --subscribers 20000 --mode closed --concurrency 32
+
+    # Fixed arrival rate against an already running server
+    python loadtest/load_test.py --url http://localhost:8000 --mode open --rate 300
+
+    # Compare two result files
+    python loadtest/load_test.py --compare loadtest/results/a.json loadtest/results/b.json
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(BACKEND_DIR, 'src')
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'loadtest', 'results')
+
+# Relative weights of each endpoint in the replayed traffic
+DEFAULT_MIX = {
+    'list': 25,
+    'search': 15,
+    'detail': 25,
+    'create': 5,
+    'update': 10,
+    'dashboard': 10,
+    'personalize': 7,
+    'email_event': 3
+}
+
+SEARCH_TERMS = ['smith', 'john', 'chen', 'mar', 'lee', 'pat', 'example.com', 'wil']
+CONTENT_TYPES = ['market_update', 'stock_picks', 'education', 'dividend_stocks']
+# Tracking events the email platform reports for personalized emails (opens and clicks are rarer than sends)
+EMAIL_EVENTS = ['sent', 'sent', 'opened', 'clicked']
+
+
+# ----------------------------------------------------------------------
+# Traffic mix
+# ----------------------------------------------------------------------
+
+class TrafficContext:
+    """Subscriber and personalization result ids known to the load generator, shared by all client threads"""
+
+    def __init__(self, subscriber_ids):
+        self.subscriber_ids = list(subscriber_ids)
+        self.results = []  # (result id, subscriber id) from personalize responses
+
+    def subscriber_id(self, rng):
+        return rng.choice(self.subscriber_ids)
+
+    def add(self, subscriber_id):
+        self.subscriber_ids.append(subscriber_id)  # list.append is atomic under the GIL
+
+    def add_result(self, result_id, subscriber_id):
+        self.results.append((result_id, subscriber_id))
+
+    def result(self, rng):
+        return rng.choice(self.results)
+
+
+def build_request(endpoint, context, rng):
+    """(method, path, json body) for one request of the given endpoint type"""
+    if endpoint == 'list':
+        sort_by = rng.choice(['created_at', 'engagement_score', 'lifetime_value'])
+        return 'GET', f'/api/subscribers/?page={rng.randint(1, 20)}&per_page=20&sort_by={sort_by}', None
+    if endpoint == 'search':
+        return 'GET', f'/api/subscribers/?search={rng.choice(SEARCH_TERMS)}&per_page=20', None
+    if endpoint == 'detail':
+        return 'GET', f'/api/subscribers/{context.subscriber_id(rng)}', None
+    if endpoint == 'create':
+        return 'POST', '/api/subscribers/', {
+            'email': f'load-{uuid.uuid4().hex}@example.com',
+            'first_name': 'Load',
+            'last_name': 'Test',
+            'subscription_tier': rng.choice(['basic', 'premium', 'enterprise']),
+            'risk_tolerance': rng.choice(['conservative', 'moderate', 'aggressive'])
+        }
+    if endpoint == 'update':
+        return 'PUT', f'/api/subscribers/{context.subscriber_id(rng)}', {
+            'preferred_frequency': rng.choice(['daily', 'weekly', 'bi-weekly']),
+            'device_preference': rng.choice(['desktop', 'mobile', 'tablet'])
+        }
+    if endpoint == 'dashboard':
+        return 'GET', '/api/dashboard', None
+    if endpoint == 'personalize':
+        return 'POST', '/api/personalize/subject-line', {
+            'subscriber_id': context.subscriber_id(rng),
+            'content_type': rng.choice(CONTENT_TYPES),
+            'base_subject': 'Weekly Market Analysis',
+            'market_context': {
+                'trending_stocks': rng.sample(['AAPL', 'MSFT', 'GOOGL', 'NVDA', 'AMZN', 'TSLA'], 3),
+                'market_sentiment': rng.choice(['bullish', 'bearish', 'neutral'])
+            }
+        }
+    if endpoint == 'email_event':
+        # The email platform's tracking webhook for a result returned by an earlier personalize request
+        result_id, subscriber_id = context.result(rng)
+        return 'POST', f'/api/personalize/results/{result_id}/events', {
+            'event': rng.choice(EMAIL_EVENTS),
+            'occurred_at': datetime.utcnow().isoformat() + 'Z',
+            'subscriber_id': subscriber_id  # Required with sharded storage
+        }
+    raise ValueError(f'Unknown endpoint type: {endpoint}')
+
+
+def parse_mix(spec):
+    """'list=30,create=0' -> DEFAULT_MIX with those weights overridden"""
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, (spec or '').split(',')):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f'Unknown endpoint type in --mix: {name} (choose from {", ".join(DEFAULT_MIX)})')
+        mix[name] = float(weight)
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+    if not mix:
+        raise SystemExit('--mix leaves no endpoint with a positive weight')
+    return mix
+
+
+# ----------------------------------------------------------------------
+# Client
+# ----------------------------------------------------------------------
+
+class LoadClient:
+    """Issues requests over one keep-alive session per thread and records latencies"""
+
+    def __init__(self, base_url, context, mix, timeout=10.0, seed=0):
+        self.base_url = base_url.rstrip('/')
+        self.context = context
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+        self.timeout = timeout
+        self.seed = seed
+        self.records = []  # (endpoint, latency seconds, status code, completed at)
+        self._local = threading.local()
+        self._seeds = iter(range(seed, seed + 10 ** 9))
+        self._lock = threading.Lock()
+
+    def _thread_state(self):
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            with self._lock:
+                rng = random.Random(next(self._seeds))
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            state = self._local.state = (rng, session)
+        return state
+
+    def request(self, scheduled_at=None, record=True):
+        """
+        Send one request drawn from the mix.
+
+        In open-loop mode latency is measured from the scheduled start, so time
+        spent queued behind a slow server counts (no coordinated omission).
+        """
+        rng, session = self._thread_state()
+        endpoint = rng.choices(self.endpoints, weights=self.weights)[0]
+        if endpoint == 'email_event' and not self.context.results:
+            endpoint = 'personalize'  # Nothing to report events for yet
+        method, path, body = build_request(endpoint, self.context, rng)
+
+        started = scheduled_at if scheduled_at is not None else time.perf_counter()
+        try:
+            response = session.request(method, self.base_url + path, json=body, timeout=self.timeout)
+            status = response.status_code
+            if endpoint == 'create' and status == 201:
+                self.context.add(response.json()['subscriber']['id'])
+            elif endpoint == 'personalize' and status == 200:
+                self.context.add_result(response.json()['data']['result_id'], body['subscriber_id'])
+        except requests.RequestException:
+            status = 0  # Connection error or timeout
+        finished = time.perf_counter()
+
+        if record:
+            self.records.append((endpoint, finished - started, status, finished))
+
+
+def run_closed_loop(client, concurrency, duration, warmup, think_time=0.0):
+    """`concurrency` clients each send a request as soon as the previous one returns"""
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def worker():
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                return
+            client.request(record=now >= measure_from)
+            if think_time:
+                time.sleep(think_time)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    client.records = [r for r in client.records if r[3] <= stop_at]
+    return duration
+
+
+def run_open_loop(client, rate, duration, warmup, max_in_flight=512, seed=0):
+    """Requests arrive as a Poisson process at `rate` per second, whatever the response times"""
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='load') as executor:
+        scheduled = start
+        while True:
+            scheduled += rng.expovariate(rate)
+            if scheduled >= stop_at:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(client.request, scheduled, scheduled >= measure_from)
+    return duration
+
+
+# ----------------------------------------------------------------------
+# Reporting
+# ----------------------------------------------------------------------
+
+def _latency_summary(latencies):
+    if not len(latencies):
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'mean_ms': None, 'max_ms': None}
+    millis = np.asarray(latencies) * 1000.0
+    p50, p95, p99 = np.percentile(millis, [50, 95, 99])
+    return {
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'mean_ms': round(float(millis.mean()), 2),
+        'max_ms': round(float(millis.max()), 2)
+    }
+
+
+def summarize(records, measured_seconds):
+    """Per-endpoint and overall throughput and latency percentiles (successful requests only)"""
+    def block(rows):
+        statuses = {}
+        for row in rows:
+            statuses[str(row[2])] = statuses.get(str(row[2]), 0) + 1
+        ok = [row[1] for row in rows if 200 <= row[2] < 400]
+        return dict({
+            'requests': len(rows),
+            'errors': len(rows) - len(ok),
+            'throughput_rps': round(len(ok) / measured_seconds, 2),
+            'status_codes': statuses
+        }, **_latency_summary(ok))
+
+    endpoints = {}
+    for row in records:
+        endpoints.setdefault(row[0], []).append(row)
+    return {
+        'endpoints': {name: block(rows) for name, rows in sorted(endpoints.items())},
+        'total': block(records)
+    }
+
+
+def print_report(report):
+    columns = ['requests', 'errors', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+    print(f"\n{'endpoint':<12}" + ''.join(f'{c:>15}' for c in columns))
+    rows = list(report['endpoints'].items()) + [('TOTAL', report['total'])]
+    for name, stats in rows:
+        print(f'{name:<12}' + ''.join(f"{'-' if stats[c] is None else stats[c]:>15}" for c in columns))
+
+
+def compare_reports(baseline_path, candidate_path):
+    """Print throughput and percentile changes between two result files"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    metrics = ['throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms']
+    print(f'baseline:  {baseline_path} ({baseline["meta"]["started_at"]})')
+    print(f'candidate: {candidate_path} ({candidate["meta"]["started_at"]})')
+    print(f"\n{'endpoint':<12}" + ''.join(f'{m:>26}' for m in metrics))
+    names = sorted(set(baseline['endpoints']) | set(candidate['endpoints']))
+    for name in names + ['TOTAL']:
+        old = baseline['total'] if name == 'TOTAL' else baseline['endpoints'].get(name, {})
+        new = candidate['total'] if name == 'TOTAL' else candidate['endpoints'].get(name, {})
+        cells = []
+        for metric in metrics:
+            a, b = old.get(metric), new.get(metric)
+            if a is None or b is None:
+                cells.append(f'{"-":>26}')
+                continue
+            change = f'{(b - a) / a * 100:+.1f}%' if a else 'n/a'
+            cells.append(f'{f"{a} -> {b} ({change})":>26}')
+        print(f'{name:<12}' + ''.join(cells))
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ----------------------------------------------------------------------
+# Local server
+# ----------------------------------------------------------------------
+
+class LocalServer:
+    """gunicorn on a private database seeded with synthetic subscribers"""
+
+    def __init__(self, workers, port, subscribers, database_url=None, seed=0):
+        self.workers = workers
+        self.port = port
+        self.subscribers = subscribers
+        self.seed = seed
+        self._tmpdir = None
+        self.database_url = database_url
+        self.process = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    def _env(self):
+        env = dict(os.environ)
+        env.update({
+            'DATABASE_URL': self.database_url,
+            'FLASK_APP': 'main',
+            'RATE_LIMIT_ENABLED': 'false',  # Load comes from one address and would be throttled
+            'RATE_LIMIT_FILE': os.path.join(self._tmpdir or tempfile.gettempdir(), 'rate-limit.bin'),
+            'EVENT_STORE_PATH': os.path.join(self._tmpdir or tempfile.gettempdir(), 'events'),
+            'PYTHONPATH': SRC_DIR
+        })
+        return env
+
+    def start(self):
+        if self.database_url is None:
+            self._tmpdir = tempfile.mkdtemp(prefix='personalizeai-load-')
+            self.database_url = 'sqlite:///' + os.path.join(self._tmpdir, 'load.db')
+
+        print(f'Seeding {self.subscribers} synthetic subscribers into {self.database_url}')
+        subprocess.run([sys.executable, '-m', 'flask', 'seed-synthetic',
+                        '--subscribers', str(self.subscribers), '--seed', str(self.seed)],
+                       cwd=SRC_DIR, env=self._env(), check=True)
+
+        print(f'Starting gunicorn with {self.workers} workers on port {self.port}')
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{self.port}',
+             '--workers', str(self.workers), '--worker-class', 'gthread', '--threads', '16',
+             '--timeout', '120', 'main:app'],
+            cwd=SRC_DIR, env=self._env()
+        )
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise SystemExit('gunicorn exited during startup')
+            try:
+                if requests.get(self.url + '/health', timeout=1).ok:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.25)
+        self.stop()
+        raise SystemExit('Server did not become healthy within 60 seconds')
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self._tmpdir:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+
+def fetch_subscriber_ids(base_url, limit=2000):
+    """Page through the API for ids to use in detail/update/personalize requests"""
+    ids, page = [], 1
+    while len(ids) < limit:
+        response = requests.get(f'{base_url}/api/subscribers/',
+                                params={'page': page, 'per_page': 100}, timeout=30)
+        response.raise_for_status()
+        batch = [s['id'] for s in response.json()['subscribers']]
+        if not batch:
+            break
+        ids.extend(batch)
+        page += 1
+    if not ids:
+        raise SystemExit('No subscribers found; seed the database first')
+    return ids[:limit]
+
+
+# ----------------------------------------------------------------------
+# Entry point
+# ----------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a traffic mix against the PersonalizeAI API')
+    parser.add_argument('--url', help='Target an already running server instead of starting one')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers for the local server')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--database-url', help='Database for the local server (default: temporary SQLite file)')
+    parser.add_argument('--subscribers', type=int, default=10000, help='Synthetic subscribers to seed')
+    parser.add_argument('--mode', choices=['closed', 'open'], default='closed')
+    parser.add_argument('--concurrency', type=int, default=16, help='Closed loop: concurrent clients')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Closed loop: pause between requests (s)')
+    parser.add_argument('--rate', type=float, default=100.0, help='Open loop: requests per second')
+    parser.add_argument('--max-in-flight', type=int, default=512, help='Open loop: client thread limit')
+    parser.add_argument('--duration', type=float, default=60.0, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=5.0, help='Unmeasured seconds before measuring')
+    parser.add_argument('--mix', help='Weight overrides, e.g. "list=40,email_event=0"')
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Result file (default: loadtest/results/<timestamp>-<mode>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'),
+                        help='Compare two result files and exit')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare_reports(*args.compare)
+        return 0
+
+    mix = parse_mix(args.mix)
+    server = None if args.url else LocalServer(args.workers, args.port, args.subscribers,
+                                               args.database_url, args.seed).start()
+    base_url = args.url or server.url
+    started_at = datetime.utcnow()
+    try:
+        context = TrafficContext(fetch_subscriber_ids(base_url))
+        client = LoadClient(base_url, context, mix, timeout=args.timeout, seed=args.seed)
+        print(f'Running {args.mode} loop for {args.warmup:g}s warmup + {args.duration:g}s against {base_url}')
+        if args.mode == 'closed':
+            measured = run_closed_loop(client, args.concurrency, args.duration, args.warmup, args.think_time)
+        else:
+            measured = run_open_loop(client, args.rate, args.duration, args.warmup,
+                                     args.max_in_flight, args.seed)
+    finally:
+        if server:
+            server.stop()
+
+    report = {
+        'meta': {
+            'started_at': started_at.isoformat() + 'Z',
+            'git_commit': _git_commit(),
+            'target': args.url or 'local',
+            'workers': None if args.url else args.workers,
+            'subscribers': None if args.url else args.subscribers,
+            'mode': args.mode,
+            'concurrency': args.concurrency if args.mode == 'closed' else None,
+            'rate': args.rate if args.mode == 'open' else None,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'mix': mix
+        }
+    }
+    report.update(summarize(client.records, measured))
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{started_at.strftime('%Y%m%d-%H%M%S')}-{args.mode}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print_report(report)
+    print(f'\nResults written to {output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Maintenance Commands for PersonalizeAI Platform
+Flask CLI commands for periodic and batch jobs (run with `flask <command>`)
+"""
+
+import click
+
+
+def _refuse_if_sharded(operation):
+    """Exit with an error instead of a traceback for jobs that only see the main database"""
+    from services.sharding import ShardingNotSupported, require_unsharded
+
+    try:
+        require_unsharded(operation)
+    except ShardingNotSupported as e:
+        raise click.ClickException(str(e))
+
+
+def register_commands(app):
+    """Register maintenance commands on the Flask app"""
+
+    @app.cli.command('ltv-refresh')
+    @click.option('--full', is_flag=True, help='Recompute every subscriber, ignoring the watermark')
+    @click.option('--chunk-size', default=5000, show_default=True)
+    def ltv_refresh(full, chunk_size):
+        """Recompute lifetime value for subscribers with new conversions"""
+        from services.ltv import refresh_lifetime_values
+
+        _refuse_if_sharded('LTV refresh')
+        updated = refresh_lifetime_values(chunk_size=chunk_size, full=full)
+        click.echo(f'Updated lifetime value for {updated} subscribers')
+
+    @app.cli.command('engagement-backfill')
+    @click.option('--chunk-size', default=1000, show_default=True)
+    @click.option('--force', is_flag=True, help='Reseed every subscriber, not only those without decayed engagement')
+    def engagement_backfill(chunk_size, force):
+        """Seed decayed engagement scores from past opens, clicks and conversions"""
+        from services.engagement import backfill_decayed_engagement
+
+        seeded = backfill_decayed_engagement(chunk_size=chunk_size, force=force)
+        click.echo(f'Seeded decayed engagement for {seeded} subscribers')
+
+    @app.cli.command('events-backfill')
+    @click.option('--batch-size', default=10000, show_default=True)
+    @click.option('--force', is_flag=True, help='Append even if the store already holds events (duplicates them)')
+    def events_backfill(batch_size, force):
+        """Seed the engagement event store from sent/opened/clicked timestamps on personalization results"""
+        from services.event_store import get_event_store
+
+        _refuse_if_sharded('Event store backfill')
+        store = get_event_store()
+        if not store.is_empty() and not force:
+            raise click.ClickException(f'{store.root} already holds events; pass --force to append anyway')
+        appended = store.backfill_from_results(batch_size=batch_size)
+        store.compact()
+        click.echo(f'Appended {appended} events to {store.root}')
+
+    @app.cli.command('events-compact')
+    @click.option('--partition', default=None, help='Month to compact (YYYY-MM); default: every month')
+    def events_compact(partition):
+        """Merge each month's event segments into one sorted segment (run daily, e.g. from cron)"""
+        from services.event_store import get_event_store
+
+        compacted = get_event_store().compact(partition)
+        click.echo(f'Compacted {compacted} partitions')
+
+    @app.cli.command('activity-prune')
+    @click.option('--keep-days', default=30, show_default=True)
+    def activity_prune(keep_days):
+        """Delete persisted activity feed events older than --keep-days"""
+        from services.activity_feed import activity_feed
+
+        deleted = activity_feed.prune(keep_days=keep_days)
+        click.echo(f'Deleted {deleted} activity events')
+
+    @app.cli.command('personas-refit')
+    @click.option('--clusters', default=6, show_default=True)
+    @click.option('--epochs', default=2, show_default=True)
+    @click.option('--chunk-size', default=10000, show_default=True)
+    def personas_refit(clusters, epochs, chunk_size):
+        """Refit persona clusters and relabel Subscriber.ai_persona in bulk"""
+        from services.personas import refit_personas
+
+        _refuse_if_sharded('Persona refit')
+        result = refit_personas(n_clusters=clusters, epochs=epochs, chunk_size=chunk_size)
+        click.echo(f"Assigned personas to {result['subscribers']} subscribers")
+        for name, count in sorted(result['personas'].items()):
+            click.echo(f'  {name}: {count}')
+
+    @app.cli.command('results-retention')
+    @click.option('--hot-months', default=3, show_default=True,
+                  help='Months of results kept in the personalization_results table')
+    @click.option('--archive-after-months', default=12, show_default=True,
+                  help='Months after which partitions are compacted into archive files')
+    @click.option('--attribution-days', default=None, type=int,
+                  help='Days after a month ends that its results still accept events '
+                       '(default: RESULTS_ATTRIBUTION_DAYS or 30)')
+    def results_retention(hot_months, archive_after_months, attribution_days):
+        """Partition aging personalization results by month and archive cold partitions"""
+        from services.retention import ResultsRetention
+
+        _refuse_if_sharded('Results retention')
+        result = ResultsRetention(hot_months=hot_months, archive_after_months=archive_after_months,
+                                  attribution_days=attribution_days).run()
+        for month, count in result['demoted'].items():
+            click.echo(f'Moved {count} results from {month} into a monthly partition')
+        for month, count in result['archived'].items():
+            click.echo(f'Archived {count} results from {month}')
+
+    @app.cli.command('shards-rebalance')
+    @click.argument('new_urls', nargs=-1, required=True)
+    @click.option('--chunk-size', default=1000, show_default=True)
+    def shards_rebalance(new_urls, chunk_size):
+        """Add shard database URLs and move the subscribers that now hash to them"""
+        from services.sharding import ShardRouter, shard_urls_from_env
+
+        current = shard_urls_from_env()
+        if not current:
+            raise click.ClickException('SUBSCRIBER_SHARD_URLS is not set')
+        moved = ShardRouter(current).rebalance(current + list(new_urls), chunk_size=chunk_size)
+        for shard, count in sorted(moved.items()):
+            click.echo(f'Moved {count} subscribers to shard {shard}')
+        click.echo('Update SUBSCRIBER_SHARD_URLS to: ' + ','.join(current + list(new_urls)))
+
+    @app.cli.command('schema-upgrade')
+    def schema_upgrade():
+        """Upgrade existing tables on the main database and every shard (safe to re-run)"""
+        from services.schema import upgrade_schema
+
+        for database, changes in upgrade_schema().items():
+            for change in changes:
+                click.echo(f'{database}: {change}')
+            if not changes:
+                click.echo(f'{database}: up to date')
+
+    @app.cli.command('seed-synthetic')
+    @click.option('--subscribers', default=10000, show_default=True)
+    @click.option('--seed', default=0, show_default=True)
+    def seed_synthetic(subscribers, seed):
+        """Fill the database with synthetic subscribers (local development and load tests)"""
+        from main import db
+        from services.synthetic_data import seed_subscribers
+
+        db.create_all()
+        inserted = seed_subscribers(subscribers, seed=seed)
+        click.echo(f'Inserted {inserted} synthetic subscribers')
+
+    @app.cli.command('ab-evaluate')
+    @click.option('--mixing-sd', default=0.03, show_default=True,
+                  help='Spread of plausible rate differences for the mSPRT mixture')
+    @click.option('--no-stop', is_flag=True, help='Record results without stopping decided tests')
+    def ab_evaluate(mixing_sd, no_stop):
+        """Run sequential significance tests on every running A/B test"""
+        from services.sequential_testing import SequentialEvaluator
+
+        decisions = SequentialEvaluator(mixing_sd=mixing_sd, auto_stop=not no_stop).evaluate()
+        decided = {test_id: d for test_id, d in decisions.items() if d}
+        click.echo(f'Evaluated {len(decisions)} running tests, {len(decided)} decided')
+        for test_id, decision in sorted(decided.items()):
+            click.echo(f"  test {test_id}: variant {decision['winning_variant']} ({decision['reason']})")
+
+    @app.cli.command('webhooks-dispatch')
+    @click.option('--concurrency', default=16, show_default=True, help='Requests in flight across all endpoints')
+    @click.option('--max-attempts', default=8, show_default=True, help='Attempts before an event is dead-lettered')
+    @click.option('--drain', is_flag=True, help='Exit once nothing is due instead of running forever')
+    def webhooks_dispatch(concurrency, max_attempts, drain):
+        """Deliver queued webhook events (long-running worker)"""
+        import signal
+        from services.webhooks import WebhookDispatcher
+
+        dispatcher = WebhookDispatcher(concurrency=concurrency, max_attempts=max_attempts)
+        signal.signal(signal.SIGTERM, lambda *_: dispatcher.stop())
+        try:
+            totals = dispatcher.run(drain=drain)
+        except KeyboardInterrupt:
+            dispatcher.stop()
+            return
+        click.echo(f"Delivered {totals['delivered']} events, dead-lettered {totals['dead']}")
@@ -6,6 +6,7 @@ AI-powered newsletter personalization for financial publishers
 import os
 from flask import Flask, jsonify
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_sqlalchemy import SQLAlchemy
 from dotenv import load_dotenv
 
@@ -18,6 +19,12 @@ app = Flask(__name__)
 # Configure CORS
 CORS(app, origins=["*"])
 
+# Behind reverse proxies, take the client address from the hop they append to
+# X-Forwarded-For (set TRUSTED_PROXY_COUNT to the number of proxies in front)
+trusted_proxies = int(os.getenv('TRUSTED_PROXY_COUNT', 0))
+if trusted_proxies:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies)
+
 # Database configuration
 database_url = os.getenv('DATABASE_URL', 'sqlite:///personalizeai.db')
 if database_url.startswith('postgres://'):
@@ -33,16 +40,41 @@ db = SQLAlchemy(app)
 # Import models and routes
 from models.subscriber import Subscriber
 from models.personalization import PersonalizationResult, ABTest
+from models.pipeline import PipelineState
+from models.activity import ActivityEvent
+from models.webhook import WebhookEndpoint, WebhookOutbox
+from models.content import ContentItem
 from routes.subscribers import subscribers_bp
 from routes.personalization import personalization_bp
 from routes.analytics import analytics_bp
 from routes.ab_testing import ab_testing_bp
+from routes.activity import activity_bp
+from routes.profiles import profiles_bp
+from routes.webhooks import webhooks_bp
+from routes.content import content_bp
+from services.activity_feed import activity_feed
 
 # Register blueprints
 app.register_blueprint(subscribers_bp, url_prefix='/api/subscribers')
 app.register_blueprint(personalization_bp, url_prefix='/api/personalize')
 app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
 app.register_blueprint(ab_testing_bp, url_prefix='/api/ab-test')
+app.register_blueprint(activity_bp, url_prefix='/api/activity')
+app.register_blueprint(profiles_bp, url_prefix='/api/admin/profiles')
+app.register_blueprint(webhooks_bp, url_prefix='/api/webhooks')
+app.register_blueprint(content_bp, url_prefix='/api/content')
+
+# Per-tier API rate limiting (shared across gunicorn workers on this host)
+from middleware.rate_limit import init_rate_limiter
+init_rate_limiter(app)
+
+# Opt-in per-request profiling (PROFILING_TOKEN / PROFILING_SAMPLE_RATE)
+from middleware.profiler import init_profiler
+init_profiler(app)
+
+# Maintenance commands (flask <command>)
+from commands import register_commands
+register_commands(app)
 
 # Health check endpoint
 @app.route('/health')
@@ -68,7 +100,9 @@ def root():
             'subscribers': '/api/subscribers',
             'personalization': '/api/personalize',
             'analytics': '/api/analytics',
-            'ab_testing': '/api/ab-test'
+            'ab_testing': '/api/ab-test',
+            'activity': '/api/activity',
+            'webhooks': '/api/webhooks'
         },
         'documentation': 'https://github.com/[username]/PersonalizeAI-Platform/docs/API.md'
     })
@@ -78,21 +112,18 @@ def root():
 def dashboard_data():
     """Get dashboard overview data"""
     try:
-        # Get subscriber count
-        total_subscribers = Subscriber.query.count()
+        # Get subscriber count (summed across shards with sharded storage)
+        from services.sharding import get_shard_router
+        router = get_shard_router()
+        total_subscribers = router.count() if router else Subscriber.query.count()
         
         # Calculate engagement metrics (mock data for demo)
         engagement_rate = 23.4
         revenue_impact = 285000
         churn_reduction = 18.5
         
-        # Recent activity (mock data)
-        recent_activity = [
-            {'action': 'Subject line generated', 'subscriber': 'John D.', 'time': '2 minutes ago'},
-            {'action': 'A/B test completed', 'test': 'Newsletter #47', 'time': '15 minutes ago'},
-            {'action': 'New subscriber added', 'subscriber': 'Sarah M.', 'time': '1 hour ago'},
-            {'action': 'Revenue impact calculated', 'amount': '$12,450', 'time': '2 hours ago'}
-        ]
+        # Recent activity from the in-memory feed; live updates via /api/activity/stream
+        recent_activity = activity_feed.latest(10)
         
         return jsonify({
             'total_subscribers': total_subscribers,
@@ -100,6 +131,7 @@ def dashboard_data():
             'revenue_impact': revenue_impact,
             'churn_reduction': churn_reduction,
             'recent_activity': recent_activity,
+            'activity_cursor': recent_activity[0]['id'] if recent_activity else 0,
             'status': 'success'
         })
     except Exception as e:
@@ -114,21 +146,14 @@ def not_found(error):
 def internal_error(error):
     return jsonify({'error': 'Internal server error', 'status': 'error'}), 500
 
-# Database initialization
-@app.before_first_request
-def create_tables():
-    """Create database tables on first request"""
+# Database initialization (Flask 3 has no before_first_request hook)
+with app.app_context():
     try:
         db.create_all()
-        print("Database tables created successfully")
     except Exception as e:
         print(f"Error creating database tables: {e}")
 
 if __name__ == '__main__':
-    # Create tables if they don't exist
-    with app.app_context():
-        db.create_all()
-    
     # Run the application
     port = int(os.getenv('PORT', 8000))
     debug = os.getenv('FLASK_ENV') == 'development'
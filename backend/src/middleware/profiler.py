@@ -0,0 +1,288 @@
+"""
+Request Profiling Middleware for PersonalizeAI Platform
+Opt-in sampling profiler and SQL timer around individual requests
+"""
+
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from flask import request, g
+
+PROFILE_HEADER = 'X-Profile-Token'
+SKIP_PREFIXES = ('/api/admin/profiles', '/api/activity/stream')
+MAX_SQL_STATEMENT_LENGTH = 500
+
+
+class RequestProfile:
+    """Stack samples and SQL timings collected for one request"""
+
+    def __init__(self, method, path, reason):
+        self.id = f"{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.reason = reason  # 'header' or 'sampled'
+        self.started = time.perf_counter()
+        self.started_at = datetime.utcnow()
+        self.stacks = {}  # tuple of frame labels (root first) -> sample count
+        self.queries = []  # (statement, duration seconds)
+
+    def add_stack(self, stack):
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def collapsed(self):
+        """Brendan Gregg's folded format, one 'frame;frame;frame count' line per stack"""
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in
+                       sorted(self.stacks.items(), key=lambda item: -item[1]))
+
+    def speedscope(self, interval):
+        """speedscope 'sampled' profile (https://www.speedscope.app/file-format-schema.json)"""
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, count in self.stacks.items():
+            ids = []
+            for label in stack:
+                if label not in index:
+                    index[label] = len(frames)
+                    name, _, location = label.partition(' (')
+                    file, _, line = location.rstrip(')').rpartition(':')
+                    frames.append({'name': name, 'file': file, 'line': int(line or 0)})
+                ids.append(index[label])
+            samples.append(ids)
+            weights.append(count * interval * 1000.0)
+        total = sum(weights)
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': f'{self.method} {self.path}',
+            'exporter': 'personalizeai-profiler',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': f'{self.method} {self.path}',
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': total,
+                'samples': samples,
+                'weights': weights
+            }]
+        }
+
+    def summary(self, status_code, duration):
+        sql_time = sum(seconds for _, seconds in self.queries)
+        slowest = sorted(self.queries, key=lambda query: -query[1])[:20]
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'reason': self.reason,
+            'status_code': status_code,
+            'started_at': self.started_at.isoformat() + 'Z',
+            'duration_ms': round(duration * 1000.0, 2),
+            'samples': sum(self.stacks.values()),
+            'sql': {
+                'queries': len(self.queries),
+                'total_ms': round(sql_time * 1000.0, 2),
+                'share_of_request': round(sql_time / duration, 4) if duration else None,
+                'slowest': [{'statement': statement, 'duration_ms': round(seconds * 1000.0, 3)}
+                            for statement, seconds in slowest]
+            }
+        }
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the threads serving profiled requests.
+
+    A single background thread wakes every `interval` seconds while at least
+    one request is being profiled and sleeps otherwise, so unprofiled
+    requests never pay for sampling.
+    """
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.active = {}  # thread id -> RequestProfile
+        self._labels = {}  # code object -> frame label
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, profile):
+        with self._lock:
+            self.active[threading.get_ident()] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self):
+        with self._lock:
+            profile = self.active.pop(threading.get_ident(), None)
+            if not self.active:
+                self._wake.clear()
+        return profile
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})'
+        return label
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            self._wake.wait()
+            frames = sys._current_frames()
+            for thread_id, profile in list(self.active.items()):
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                profile.add_stack(tuple(reversed(stack)))
+            del frames
+            time.sleep(self.interval)
+
+
+class ProfileStore:
+    """Profile files on disk, shared by every worker on the host"""
+
+    def __init__(self, directory, max_profiles=200):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, profile_id, suffix):
+        if not profile_id.replace('-', '').isalnum():
+            raise ValueError('Invalid profile id')
+        return os.path.join(self.directory, f'{profile_id}{suffix}')
+
+    def save(self, profile, summary, interval):
+        with open(self._path(profile.id, '.collapsed'), 'w') as f:
+            f.write(profile.collapsed())
+        with open(self._path(profile.id, '.speedscope.json'), 'w') as f:
+            json.dump(profile.speedscope(interval), f)
+        # Summary last: listing only shows profiles whose files are complete
+        with open(self._path(profile.id, '.json'), 'w') as f:
+            json.dump(summary, f)
+        self.prune()
+
+    def list(self, limit=50):
+        names = sorted((n for n in os.listdir(self.directory)
+                        if n.endswith('.json') and not n.endswith('.speedscope.json')), reverse=True)
+        summaries = []
+        for name in names[:limit]:
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    summaries.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # Pruned or being written by another worker
+        return summaries
+
+    def load(self, profile_id, suffix):
+        """File contents for a profile, or None"""
+        try:
+            with open(self._path(profile_id, suffix)) as f:
+                return f.read()
+        except (OSError, ValueError):
+            return None
+
+    def prune(self):
+        summaries = sorted(n for n in os.listdir(self.directory)
+                           if n.endswith('.json') and not n.endswith('.speedscope.json'))
+        excess = len(summaries) - self.max_profiles
+        for name in summaries[:max(excess, 0)]:
+            profile_id = name[:-len('.json')]
+            for suffix in ('.json', '.collapsed', '.speedscope.json'):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + suffix))
+                except OSError:
+                    pass
+
+
+def _install_sql_timer(sampler):
+    """Time SQL statements on threads with an active profile; a dict lookup otherwise"""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    active = sampler.active
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if active and threading.get_ident() in active:
+            conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not active:
+            return
+        profile = active.get(threading.get_ident())
+        starts = conn.info.get('profile_query_start')
+        if profile is not None and starts:
+            profile.queries.append((statement[:MAX_SQL_STATEMENT_LENGTH],
+                                    time.perf_counter() - starts.pop()))
+
+
+def init_profiler(app):
+    """
+    Register the request profiling hooks on the Flask app.
+
+    Disabled unless PROFILING_TOKEN or PROFILING_SAMPLE_RATE is set. A request
+    is profiled when it sends the token in the X-Profile-Token header, or at
+    random with probability PROFILING_SAMPLE_RATE.
+    """
+    token = os.getenv('PROFILING_TOKEN')
+    sample_rate = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+    if not token and sample_rate <= 0:
+        return None
+
+    interval = float(os.getenv('PROFILING_INTERVAL_MS', 2)) / 1000.0
+    sampler = SamplingProfiler(interval=interval)
+    store = ProfileStore(os.getenv('PROFILE_DIR', os.path.join('data', 'profiles')),
+                         max_profiles=int(os.getenv('PROFILING_MAX_PROFILES', 200)))
+    _install_sql_timer(sampler)
+    app.extensions['profiler'] = {'store': store, 'token': token, 'sampler': sampler}
+
+    @app.before_request
+    def start_profile():
+        supplied = request.headers.get(PROFILE_HEADER)
+        if supplied is not None and token and hmac.compare_digest(supplied, token):
+            reason = 'header'
+        elif sample_rate > 0 and random.random() < sample_rate:
+            reason = 'sampled'
+        else:
+            return None
+        if request.path.startswith(SKIP_PREFIXES):
+            return None
+        g.profile = RequestProfile(request.method, request.full_path.rstrip('?'), reason)
+        sampler.start(g.profile)
+        return None
+
+    @app.after_request
+    def finish_profile(response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        sampler.stop()
+        duration = time.perf_counter() - profile.started
+        try:
+            store.save(profile, profile.summary(response.status_code, duration), interval)
+            response.headers['X-Profile-Id'] = profile.id
+        except OSError as e:
+            app.logger.warning('Could not write profile %s: %s', profile.id, e)
+        return response
+
+    @app.teardown_request
+    def abandon_profile(error=None):
+        # Unhandled exceptions skip after_request; make sure sampling stops
+        if g.pop('profile', None) is not None:
+            sampler.stop()
+
+    return store
@@ -0,0 +1,179 @@
+"""
+API Rate Limiting Middleware for PersonalizeAI Platform
+Per-tier token buckets shared by all worker processes on a host
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+from flask import request, jsonify, g
+
+# Requests per hour for each API tier (None = unlimited), see docs/API.md
+TIER_LIMITS = {
+    'free': 100,
+    'basic': 1000,
+    'premium': 10000,
+    'enterprise': None
+}
+
+EXEMPT_PATHS = {'/', '/health'}
+
+# Reads the dashboard makes on load (GET, no API key). They get a per-address
+# bucket of their own so browsing the dashboard does not use up the free tier.
+DASHBOARD_READ_PATHS = {'/api/dashboard', '/api/subscribers', '/api/subscribers/', '/api/activity', '/api/activity/'}
+DASHBOARD_LIMIT = int(os.getenv('RATE_LIMIT_DASHBOARD_PER_HOUR', 3600))
+
+# Long-lived streams: reconnects (about once a minute) are not API calls worth metering
+EXEMPT_PREFIXES = ('/api/activity/stream',)
+
+# Slot layout: key hash, tokens remaining, last refill (epoch seconds)
+SLOT = struct.Struct('<Qdd')
+SLOTS_PER_GROUP = 8
+
+
+class SharedTokenBuckets:
+    """
+    Fixed-size hash table of token buckets in a memory-mapped file.
+
+    Every gunicorn worker maps the same file, so counters are shared without
+    a database round trip. Slots are grouped; a group is protected by an
+    fcntl byte-range lock (between processes) plus a thread lock (within one).
+    """
+
+    def __init__(self, path, groups=8192):
+        self.path = path
+        self.groups = groups
+        self.size = groups * SLOTS_PER_GROUP * SLOT.size
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < self.size:
+            os.ftruncate(fd, self.size)
+        self.fd = fd
+        self.map = mmap.mmap(fd, self.size)
+        self._thread_lock = threading.Lock()
+
+    @staticmethod
+    def _key_hash(key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big') or 1  # 0 marks an empty slot
+
+    def consume(self, key, capacity, refill_per_second, now=None):
+        """
+        Take one token from the bucket for `key`.
+
+        Returns (allowed, tokens_remaining, seconds_until_full).
+        """
+        now = time.time() if now is None else now
+        key_hash = self._key_hash(key)
+        group = key_hash % self.groups
+        start = group * SLOTS_PER_GROUP * SLOT.size
+        length = SLOTS_PER_GROUP * SLOT.size
+
+        with self._thread_lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, length, start)
+            try:
+                offset, tokens, updated = self._find_slot(key_hash, start, capacity, now)
+                tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+                allowed = tokens >= 1.0
+                if allowed:
+                    tokens -= 1.0
+                SLOT.pack_into(self.map, offset, key_hash, tokens, now)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, length, start)
+
+        seconds_until_full = (capacity - tokens) / refill_per_second
+        return allowed, tokens, seconds_until_full
+
+    def _find_slot(self, key_hash, start, capacity, now):
+        """Locate the slot for a key within its group, claiming the stalest one if absent"""
+        stalest_offset, stalest_time = start, None
+        for i in range(SLOTS_PER_GROUP):
+            offset = start + i * SLOT.size
+            slot_hash, tokens, updated = SLOT.unpack_from(self.map, offset)
+            if slot_hash == key_hash:
+                return offset, tokens, updated
+            if slot_hash == 0:
+                return offset, float(capacity), now
+            if stalest_time is None or updated < stalest_time:
+                stalest_offset, stalest_time = offset, updated
+        return stalest_offset, float(capacity), now
+
+
+def _default_path():
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else '/tmp'
+    return os.path.join(base, 'personalizeai-ratelimit.bin')
+
+
+def _parse_api_keys(raw):
+    """Parse "key1:premium,key2:basic" into {key: tier}"""
+    keys = {}
+    for entry in (raw or '').split(','):
+        if ':' in entry:
+            key, tier = entry.strip().rsplit(':', 1)
+            if tier in TIER_LIMITS:
+                keys[key] = tier
+    return keys
+
+
+def _client_identity(api_keys):
+    """
+    Resolve the caller's (bucket key, tier) from its API key or address.
+
+    The address is request.remote_addr. X-Forwarded-For is client-controlled
+    and is only honoured through ProxyFix (TRUSTED_PROXY_COUNT, see main.py),
+    which takes the hop appended by the trusted proxies.
+    """
+    auth = request.headers.get('Authorization', '')
+    api_key = request.headers.get('X-API-Key') or (auth[7:] if auth.startswith('Bearer ') else None)
+    if api_key and api_key in api_keys:
+        return f'key:{api_key}', api_keys[api_key]
+    if request.method == 'GET' and request.path in DASHBOARD_READ_PATHS:
+        return f'dashboard:{request.remote_addr or "unknown"}', 'dashboard'
+    return f'ip:{request.remote_addr or "unknown"}', 'free'
+
+
+def init_rate_limiter(app):
+    """Register the rate limiting hooks on the Flask app (on unless RATE_LIMIT_ENABLED=false)"""
+    if os.getenv('RATE_LIMIT_ENABLED', 'true').lower() != 'true':
+        return None
+
+    api_keys = _parse_api_keys(os.getenv('API_KEYS'))
+    buckets = SharedTokenBuckets(os.getenv('RATE_LIMIT_FILE', _default_path()))
+
+    @app.before_request
+    def check_rate_limit():
+        if (request.path in EXEMPT_PATHS or request.path.startswith(EXEMPT_PREFIXES)
+                or request.method == 'OPTIONS'):
+            return None
+
+        key, tier = _client_identity(api_keys)
+        limit = DASHBOARD_LIMIT if tier == 'dashboard' else TIER_LIMITS[tier]
+        if limit is None:
+            return None
+
+        allowed, remaining, until_full = buckets.consume(key, limit, limit / 3600.0)
+        g.rate_limit = (limit, int(remaining), int(time.time() + until_full))
+        if not allowed:
+            response = jsonify({'error': 'Rate limit exceeded', 'status': 'error'})
+            response.status_code = 429
+            retry_after = (1.0 - remaining) * 3600.0 / limit
+            response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+            return response
+        return None
+
+    @app.after_request
+    def add_rate_limit_headers(response):
+        rate_limit = g.pop('rate_limit', None)
+        if rate_limit:
+            limit, remaining, reset = rate_limit
+            response.headers['X-RateLimit-Limit'] = str(limit)
+            response.headers['X-RateLimit-Remaining'] = str(remaining)
+            response.headers['X-RateLimit-Reset'] = str(reset)
+        return response
+
+    return buckets
@@ -0,0 +1,40 @@
+"""
+Activity Model for PersonalizeAI Platform
+Persisted dashboard activity feed entries
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, JSON
+
+# Import db from main app
+from main import db
+
+class ActivityEvent(db.Model):
+    """A single entry in the dashboard activity feed"""
+
+    __tablename__ = 'activity_events'
+
+    # Primary key doubles as the feed cursor
+    id = Column(Integer, primary_key=True)
+
+    # Event details
+    event_type = Column(String(50), nullable=False)  # subscriber.created, ab_test.completed, email.opened, ...
+    action = Column(String(200), nullable=False)  # Human readable, e.g. "New subscriber added"
+    details = Column(JSON, nullable=True)  # subscriber, test, amount, ids
+
+    # Metadata
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<ActivityEvent {self.id} {self.event_type}>'
+
+    def to_dict(self):
+        """Convert to dictionary for JSON serialization"""
+        data = dict(self.details or {})
+        data.update({
+            'id': self.id,
+            'event_type': self.event_type,
+            'action': self.action,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        })
+        return data
@@ -0,0 +1,55 @@
+"""
+Content Model for PersonalizeAI Platform
+Articles, stock picks and other items that can be recommended to subscribers
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON
+
+# Import db from main app
+from main import db
+
+class ContentItem(db.Model):
+    """A piece of newsletter content, tagged for recommendation"""
+
+    __tablename__ = 'content_items'
+
+    # Primary key
+    id = Column(Integer, primary_key=True)
+
+    # Content details
+    title = Column(String(300), nullable=False)
+    content_type = Column(String(50), nullable=False)  # market_analysis, stock_picks, education, ...
+    summary = Column(Text, nullable=True)
+    url = Column(String(500), nullable=True)
+
+    # Recommendation signals (indexed in memory by services/recommendations.py)
+    tags = Column(JSON, nullable=True)  # ['ai', 'semiconductors', 'earnings']
+    tickers = Column(JSON, nullable=True)  # ['NVDA', 'AMD']
+    risk_level = Column(String(20), nullable=True)  # conservative, moderate, aggressive
+
+    # Metadata
+    is_active = Column(Boolean, default=True)
+    published_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<ContentItem {self.id} {self.title}>'
+
+    def to_dict(self):
+        """Convert to dictionary for JSON serialization"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'content_type': self.content_type,
+            'summary': self.summary,
+            'url': self.url,
+            'tags': self.tags,
+            'tickers': self.tickers,
+            'risk_level': self.risk_level,
+            'is_active': self.is_active,
+            'published_at': self.published_at.isoformat() if self.published_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
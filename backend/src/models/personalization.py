@@ -5,11 +5,12 @@ Manages AI personalization results and A/B testing data
 
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, JSON, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 # Import db from main app
 from main import db
+from models.subscriber import SUBSCRIBER_ID_TYPE
 
 class PersonalizationResult(db.Model):
     """Store AI personalization results for tracking and optimization"""
@@ -20,7 +21,7 @@ class PersonalizationResult(db.Model):
     id = Column(Integer, primary_key=True)
     
     # Foreign key to subscriber
-    subscriber_id = Column(Integer, ForeignKey('subscribers.id'), nullable=False)
+    subscriber_id = Column(SUBSCRIBER_ID_TYPE, ForeignKey('subscribers.id'), nullable=False)
     subscriber = relationship("Subscriber", backref="personalization_results")
     
     # Personalization details
@@ -50,6 +51,7 @@ class PersonalizationResult(db.Model):
     sent_at = Column(DateTime, nullable=True)
     opened_at = Column(DateTime, nullable=True)
     clicked_at = Column(DateTime, nullable=True)
+    converted_at = Column(DateTime, nullable=True, index=True)  # Drives incremental LTV refresh
     
     def __repr__(self):
         return f'<PersonalizationResult {self.id} for {self.subscriber.email}>'
@@ -76,8 +78,14 @@ class PersonalizationResult(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'sent_at': self.sent_at.isoformat() if self.sent_at else None,
             'opened_at': self.opened_at.isoformat() if self.opened_at else None,
-            'clicked_at': self.clicked_at.isoformat() if self.clicked_at else None
+            'clicked_at': self.clicked_at.isoformat() if self.clicked_at else None,
+            'converted_at': self.converted_at.isoformat() if self.converted_at else None
         }
+    
+    def record_conversion(self, value, at=None):
+        """Record conversion value; converted_at marks the subscriber for the next LTV refresh"""
+        self.conversion_value = (self.conversion_value or 0.0) + value
+        self.converted_at = at or datetime.utcnow()
 
 class ABTest(db.Model):
     """A/B testing framework for personalization optimization"""
@@ -96,6 +104,8 @@ class ABTest(db.Model):
     variants = Column(JSON, nullable=False)  # List of variants being tested
     traffic_split = Column(JSON, nullable=False)  # Percentage split for each variant
     target_metric = Column(String(50), default='open_rate')  # open_rate, click_rate, conversion_rate
+    allocation_mode = Column(String(20), default='static')  # static, thompson
+    bandit_state = Column(JSON, nullable=True)  # Persisted Beta posteriors for adaptive allocation
     
     # Test status
     status = Column(String(20), default='draft')  # draft, running, paused, completed, cancelled
@@ -112,6 +122,7 @@ class ABTest(db.Model):
     # Results summary
     total_participants = Column(Integer, default=0)
     results_summary = Column(JSON, nullable=True)  # Detailed results for each variant
+    sequential_results = Column(JSON, nullable=True)  # Always-valid p-values per variant (services/sequential_testing.py)
     
     # Metadata
     created_by = Column(String(100), nullable=True)
@@ -134,6 +145,8 @@ class ABTest(db.Model):
             'variants': self.variants,
             'traffic_split': self.traffic_split,
             'target_metric': self.target_metric,
+            'allocation_mode': self.allocation_mode,
+            'bandit_state': self.bandit_state,
             'status': self.status,
             'start_date': self.start_date.isoformat() if self.start_date else None,
             'end_date': self.end_date.isoformat() if self.end_date else None,
@@ -144,6 +157,7 @@ class ABTest(db.Model):
             'winning_variant': self.winning_variant,
             'total_participants': self.total_participants,
             'results_summary': self.results_summary,
+            'sequential_results': self.sequential_results,
             'created_by': self.created_by,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
@@ -151,30 +165,12 @@ class ABTest(db.Model):
     
     def calculate_results(self):
         """Calculate A/B test results and statistical significance"""
-        if not self.personalization_results:
-            return None
+        # Includes results the retention job has moved out of the hot table
+        from services.sequential_testing import load_variant_counts
         
-        # Group results by variant
-        variant_results = {}
-        for result in self.personalization_results:
-            variant = result.ab_test_variant
-            if variant not in variant_results:
-                variant_results[variant] = {
-                    'participants': 0,
-                    'opens': 0,
-                    'clicks': 0,
-                    'conversions': 0,
-                    'total_value': 0.0
-                }
-            
-            variant_results[variant]['participants'] += 1
-            if result.was_opened:
-                variant_results[variant]['opens'] += 1
-            if result.was_clicked:
-                variant_results[variant]['clicks'] += 1
-            if result.conversion_value > 0:
-                variant_results[variant]['conversions'] += 1
-                variant_results[variant]['total_value'] += result.conversion_value
+        variant_results = {variant: dict(counts) for (_, variant), counts in load_variant_counts([self.id]).items()}
+        if not variant_results:
+            return None
         
         # Calculate rates for each variant
         for variant, data in variant_results.items():
@@ -195,8 +191,13 @@ class ABTest(db.Model):
         # Store results
         self.results_summary = variant_results
         
-        # Determine winner (simplified - in production would use proper statistical tests)
-        if self.total_participants >= self.minimum_sample_size:
+        # Determine winner: a sequential evaluator decision (services/sequential_testing.py)
+        # takes precedence over the simplified threshold check
+        sequential_decision = (self.sequential_results or {}).get('decision')
+        if sequential_decision:
+            self.winning_variant = sequential_decision['winning_variant']
+            self.statistical_significance_reached = True
+        elif self.total_participants >= self.minimum_sample_size:
             target_rates = {}
             for variant, data in variant_results.items():
                 if self.target_metric == 'open_rate':
@@ -218,6 +219,57 @@ class ABTest(db.Model):
         
         return variant_results
     
+    def variant_labels(self):
+        """Variant labels as stored on PersonalizationResult.ab_test_variant (A, B, C, ...)"""
+        return [chr(ord('A') + i) for i in range(len(self.variants or []))]
+    
+    def assign_variant(self, subscriber_id):
+        """Assign a subscriber to a variant (deterministic for a given subscriber)"""
+        from services.bandit import allocator
+        from services.hashing import stable_hash
+        
+        if self.allocation_mode == 'thompson':
+            return allocator.assign(self, subscriber_id)
+        
+        # Static split: hash the subscriber into a bucket of the cumulative traffic split
+        labels = self.variant_labels()
+        if isinstance(self.traffic_split, dict):
+            weights = [float(self.traffic_split.get(label, 0)) for label in labels]
+        else:
+            weights = [float(w) for w in (self.traffic_split or [])]
+        if len(weights) != len(labels) or sum(weights) <= 0:
+            weights = [1.0] * len(labels)
+        
+        bucket = (stable_hash(self.id, subscriber_id) % 10000) / 10000 * sum(weights)
+        cumulative = 0.0
+        for label, weight in zip(labels, weights):
+            cumulative += weight
+            if bucket < cumulative:
+                return label
+        return labels[-1]
+    
+    def record_engagement(self, variant, event):
+        """
+        Feed a send/open/click/conversion event into the adaptive allocator.
+        
+        Call after the request's transaction has committed: the allocator
+        periodically persists its counts on a connection of its own.
+        """
+        if self.allocation_mode != 'thompson':
+            return
+        from services.bandit import allocator
+        
+        success_event = {
+            'open_rate': 'open',
+            'click_rate': 'click',
+            'conversion_rate': 'conversion'
+        }.get(self.target_metric, 'conversion')
+        
+        if event == 'send':
+            allocator.record_send(self, variant)
+        elif event == success_event:
+            allocator.record_success(self, variant)
+    
     def start_test(self):
         """Start the A/B test"""
         self.status = 'running'
@@ -226,9 +278,28 @@ class ABTest(db.Model):
     
     def stop_test(self):
         """Stop the A/B test"""
+        if self.allocation_mode == 'thompson':
+            # Final merge in the caller's transaction, so it commits together with the status change
+            from services.bandit import allocator
+            allocator.persist(self, in_transaction=True)
+            allocator.forget(self.id)
         self.status = 'completed'
         self.end_date = datetime.utcnow()
         self.calculate_results()
+        
+        from services.activity_feed import activity_feed
+        activity_feed.record('ab_test.completed', 'A/B test completed', test=self.test_name,
+                             test_id=self.id, winner=self.winning_variant)
+        
+        from services.webhooks import enqueue_webhook
+        enqueue_webhook('ab_test.completed', {
+            'test_id': self.id,
+            'test_name': self.test_name,
+            'winning_variant': self.winning_variant,
+            'statistical_significance_reached': self.statistical_significance_reached,
+            'total_participants': self.total_participants,
+            'ended_at': self.end_date.isoformat() + 'Z'
+        })
         return True
     
     @classmethod
@@ -241,6 +312,34 @@ class ABTest(db.Model):
         """Get recently completed tests"""
         return cls.query.filter(cls.status == 'completed').order_by(cls.end_date.desc()).limit(limit).all()
 
+class ABTestAssignment(db.Model):
+    """
+    The variant a subscriber was given in an adaptively allocated test.
+
+    Shared by every worker, so a subscriber keeps the same variant whichever
+    worker serves them; the unique constraint settles concurrent first
+    assignments.
+    """
+    
+    __tablename__ = 'ab_test_assignments'
+    __table_args__ = (
+        UniqueConstraint('ab_test_id', 'subscriber_id', name='uq_ab_test_assignment'),
+    )
+    
+    # Primary key
+    id = Column(Integer, primary_key=True)
+    
+    # Assignment
+    ab_test_id = Column(Integer, ForeignKey('ab_tests.id'), nullable=False)
+    subscriber_id = Column(SUBSCRIBER_ID_TYPE, nullable=False)  # No FK: subscribers may live on other shards
+    variant = Column(String(10), nullable=False)
+    
+    # Metadata
+    assigned_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ABTestAssignment test={self.ab_test_id} subscriber={self.subscriber_id} {self.variant}>'
+
 class ContentTemplate(db.Model):
     """Store content templates for personalization"""
     
@@ -0,0 +1,46 @@
+"""
+Pipeline State Model for PersonalizeAI Platform
+Tracks watermarks and state for incremental background jobs
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, String, DateTime, JSON
+
+# Import db from main app
+from main import db
+
+class PipelineState(db.Model):
+    """Watermark and free-form state for an incremental pipeline (LTV refresh, etc.)"""
+
+    __tablename__ = 'pipeline_states'
+
+    # Pipeline name is the primary key
+    name = Column(String(100), primary_key=True)
+
+    # Everything up to this point has been processed
+    watermark = Column(DateTime, nullable=True)
+    state = Column(JSON, nullable=True)
+
+    # Metadata
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<PipelineState {self.name} @ {self.watermark}>'
+
+    def to_dict(self):
+        """Convert to dictionary for JSON serialization"""
+        return {
+            'name': self.name,
+            'watermark': self.watermark.isoformat() if self.watermark else None,
+            'state': self.state,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    @classmethod
+    def get(cls, name):
+        """Get the state row for a pipeline, creating it if needed"""
+        state = db.session.get(cls, name)
+        if state is None:
+            state = cls(name=name)
+            db.session.add(state)
+        return state
@@ -3,20 +3,45 @@ Subscriber Model for PersonalizeAI Platform
 Manages subscriber data and preferences for personalization
 """
 
+import math
+import os
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Boolean, Text, JSON
 
 # Import db from main app (will be initialized there)
 from main import db
 
+# Engagement scoring mode: 'bucketed' (recomputed from totals and recency) or
+# 'decayed' (exponentially decayed value updated in O(1) per event)
+ENGAGEMENT_SCORING_MODE = os.getenv('ENGAGEMENT_SCORING_MODE', 'bucketed')
+
+# Decayed engagement: an event's contribution halves every ENGAGEMENT_HALF_LIFE_DAYS
+ENGAGEMENT_HALF_LIFE_DAYS = float(os.getenv('ENGAGEMENT_HALF_LIFE_DAYS', 14))
+ENGAGEMENT_DECAY_RATE = math.log(2) / (ENGAGEMENT_HALF_LIFE_DAYS * 86400)  # per second
+ENGAGEMENT_EVENT_WEIGHTS = {'opened': 1.0, 'clicked': 3.0, 'converted': 5.0}
+ENGAGEMENT_DECAY_EPOCH = datetime(2024, 1, 1)  # Landmark for decay keys
+ENGAGEMENT_SCORE_SCALE = 10.0  # Decayed value that maps to ~63/100
+
+# Sharded subscriber ids are ~50-bit (see services.sharding.allocate_subscriber_id).
+# SQLite keeps INTEGER so the single-database primary key stays an autoincrementing rowid.
+SUBSCRIBER_ID_TYPE = BigInteger().with_variant(Integer, 'sqlite')
+
+def engagement_score_from_key(decay_key, now=None):
+    """Current 0-100 decayed engagement score from a stored decay key"""
+    if decay_key is None:
+        return 0.0
+    elapsed = ((now or datetime.utcnow()) - ENGAGEMENT_DECAY_EPOCH).total_seconds()
+    current = math.exp(min(decay_key - ENGAGEMENT_DECAY_RATE * elapsed, 700.0))
+    return round(100 * (1 - math.exp(-current / ENGAGEMENT_SCORE_SCALE)), 1)
+
 class Subscriber(db.Model):
     """Subscriber model for storing subscriber information and preferences"""
     
     __tablename__ = 'subscribers'
     
     # Primary key
-    id = Column(Integer, primary_key=True)
+    id = Column(SUBSCRIBER_ID_TYPE, primary_key=True)
     
     # Basic information
     email = Column(String(255), unique=True, nullable=False, index=True)
@@ -34,6 +59,11 @@ class Subscriber(db.Model):
     total_clicks = Column(Integer, default=0)
     last_engagement_date = Column(DateTime, nullable=True)
     engagement_score = Column(Float, default=0.0)  # 0-100 score
+    decayed_engagement = Column(Float, default=0.0)  # Decayed event value as of decayed_engagement_at
+    decayed_engagement_at = Column(DateTime, nullable=True)
+    # log(decayed value) + decay_rate * (t - landmark): same order as the current decayed
+    # value for every subscriber at any read time, so rankings never need rescoring
+    engagement_decay_key = Column(Float, nullable=True, index=True)
     
     # Personalization preferences
     preferred_content_types = Column(JSON, nullable=True)  # ['market_analysis', 'stock_picks', 'education']
@@ -50,11 +80,11 @@ class Subscriber(db.Model):
     ai_persona = Column(String(50), nullable=True)  # conservative_investor, growth_seeker, etc.
     content_preferences = Column(JSON, nullable=True)  # AI-learned preferences
     churn_risk_score = Column(Float, default=0.0)  # 0-1 probability of churning
-    lifetime_value = Column(Float, default=0.0)  # Calculated LTV
+    lifetime_value = Column(Float, default=0.0, index=True)  # Calculated LTV (services/ltv.py)
     
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Polled by in-memory indexes
     
     def __repr__(self):
         return f'<Subscriber {self.email}>'
@@ -73,7 +103,8 @@ class Subscriber(db.Model):
             'total_emails_opened': self.total_emails_opened,
             'total_clicks': self.total_clicks,
             'last_engagement_date': self.last_engagement_date.isoformat() if self.last_engagement_date else None,
-            'engagement_score': self.engagement_score,
+            'engagement_score': self.current_engagement_score(),
+            'current_engagement': round(self.current_engagement(), 4),
             'preferred_content_types': self.preferred_content_types,
             'risk_tolerance': self.risk_tolerance,
             'investment_experience': self.investment_experience,
@@ -115,8 +146,19 @@ class Subscriber(db.Model):
         else:
             return self.email.split('@')[0]
     
+    @property
+    def short_name(self):
+        """Abbreviated name for display in the activity feed ("John D.")"""
+        if self.first_name and self.last_name:
+            return f"{self.first_name} {self.last_name[0]}."
+        return self.full_name
+    
     def update_engagement_score(self):
         """Calculate and update engagement score based on recent activity"""
+        if ENGAGEMENT_SCORING_MODE == 'decayed':
+            self.engagement_score = self.decayed_engagement_score()
+            return self.engagement_score
+        
         # Simple engagement scoring algorithm
         # In production, this would be more sophisticated
         
@@ -165,6 +207,99 @@ class Subscriber(db.Model):
         self.engagement_score = min(base_score, 100)  # Cap at 100
         return self.engagement_score
     
+    def record_engagement_event(self, event_type, at=None):
+        """
+        Apply a sent/opened/clicked/converted event in O(1), updating totals
+        and decayed engagement. Webhooks and the activity feed are the
+        caller's job (see routes/personalization.py).
+        """
+        at = at or datetime.utcnow()
+        
+        if event_type == 'sent':
+            self.total_emails_sent = (self.total_emails_sent or 0) + 1
+            return self.engagement_score
+        if event_type == 'opened':
+            self.total_emails_opened = (self.total_emails_opened or 0) + 1
+        elif event_type == 'clicked':
+            self.total_clicks = (self.total_clicks or 0) + 1
+        
+        if not self.last_engagement_date or at > self.last_engagement_date:
+            self.last_engagement_date = at
+        
+        self._add_decayed_event(ENGAGEMENT_EVENT_WEIGHTS.get(event_type, 0.0), at)
+        
+        if ENGAGEMENT_SCORING_MODE == 'decayed':
+            self.engagement_score = self.decayed_engagement_score(at)
+        return self.engagement_score
+    
+    def _add_decayed_event(self, weight, at):
+        """Add an event's weight to the decayed value and refresh the decay key"""
+        # Decay the stored value to the event time, then add the event's weight.
+        # Late (out-of-order) events are decayed forward instead.
+        anchor = self.decayed_engagement_at
+        if anchor is None:
+            self.decayed_engagement = weight
+            self.decayed_engagement_at = at
+        elif at >= anchor:
+            self.decayed_engagement = self.current_engagement(at) + weight
+            self.decayed_engagement_at = at
+        else:
+            self.decayed_engagement = (self.decayed_engagement or 0.0) + \
+                weight * math.exp(-ENGAGEMENT_DECAY_RATE * (anchor - at).total_seconds())
+        self._refresh_decay_key()
+    
+    def _refresh_decay_key(self):
+        if self.decayed_engagement and self.decayed_engagement > 0:
+            elapsed = (self.decayed_engagement_at - ENGAGEMENT_DECAY_EPOCH).total_seconds()
+            self.engagement_decay_key = math.log(self.decayed_engagement) + ENGAGEMENT_DECAY_RATE * elapsed
+    
+    def seed_decayed_engagement(self, events=(), decayed=None):
+        """
+        Rebuild the decayed engagement without touching the totals, for
+        subscribers that predate decayed scoring: from past (event_type, at)
+        pairs, or from a (value, as_of) pair already summed over them.
+        
+        Without either the stored open and click totals are counted as of
+        last_engagement_date.
+        """
+        self.decayed_engagement, self.decayed_engagement_at, self.engagement_decay_key = 0.0, None, None
+        events = [(event_type, at) for event_type, at in events
+                  if at and ENGAGEMENT_EVENT_WEIGHTS.get(event_type)]
+        if decayed is not None:
+            self.decayed_engagement, self.decayed_engagement_at = decayed
+            self._refresh_decay_key()
+        elif not events and self.last_engagement_date:
+            events = [('opened', self.last_engagement_date)] * (self.total_emails_opened or 0) + \
+                     [('clicked', self.last_engagement_date)] * (self.total_clicks or 0)
+        for event_type, at in sorted(events, key=lambda event: event[1]):
+            self._add_decayed_event(ENGAGEMENT_EVENT_WEIGHTS[event_type], at)
+        if ENGAGEMENT_SCORING_MODE == 'decayed':
+            self.engagement_score = self.decayed_engagement_score()
+    
+    def current_engagement(self, now=None):
+        """Decayed engagement value at read time (no stored state changes)"""
+        if not self.decayed_engagement or self.decayed_engagement_at is None:
+            return 0.0
+        elapsed = ((now or datetime.utcnow()) - self.decayed_engagement_at).total_seconds()
+        return self.decayed_engagement * math.exp(-ENGAGEMENT_DECAY_RATE * max(elapsed, 0.0))
+    
+    def decayed_engagement_score(self, now=None):
+        """Map the current decayed value onto the 0-100 engagement score scale"""
+        return round(100 * (1 - math.exp(-self.current_engagement(now) / ENGAGEMENT_SCORE_SCALE)), 1)
+    
+    def current_engagement_score(self, now=None):
+        """Engagement score as of now; the stored score goes stale in decayed mode"""
+        if ENGAGEMENT_SCORING_MODE == 'decayed':
+            return self.decayed_engagement_score(now)
+        return self.engagement_score or 0.0
+    
+    @classmethod
+    def sort_attribute(cls, sort_by):
+        """Column to order by for a list sort_by; decay keys order like current decayed scores"""
+        if sort_by == 'engagement_score' and ENGAGEMENT_SCORING_MODE == 'decayed':
+            return 'engagement_decay_key'
+        return sort_by
+    
     def calculate_churn_risk(self):
         """Calculate churn risk score using simple heuristics"""
         # In production, this would use ML models
@@ -172,9 +307,10 @@ class Subscriber(db.Model):
         risk_score = 0.0
         
         # Low engagement increases churn risk
-        if self.engagement_score < 20:
+        engagement_score = self.current_engagement_score()
+        if engagement_score < 20:
             risk_score += 0.4
-        elif self.engagement_score < 40:
+        elif engagement_score < 40:
             risk_score += 0.2
         
         # No recent engagement increases risk
@@ -196,23 +332,88 @@ class Subscriber(db.Model):
         self.churn_risk_score = min(risk_score, 1.0)  # Cap at 1.0
         return self.churn_risk_score
     
+    @classmethod
+    def apply_filters(cls, query, search='', status='', tier='', ids=None):
+        """Apply the standard subscriber list filters (search, status, tier, ids) to a query"""
+        if search:
+            query = query.filter(
+                cls.email.contains(search) |
+                cls.first_name.contains(search) |
+                cls.last_name.contains(search)
+            )
+        
+        if status:
+            query = query.filter(cls.subscription_status == status)
+        
+        if tier:
+            query = query.filter(cls.subscription_tier == tier)
+        
+        if ids:
+            query = query.filter(cls.id.in_(ids))
+        
+        return query
+    
     @classmethod
     def get_high_value_subscribers(cls, limit=10):
         """Get subscribers with highest engagement scores"""
+        from services.sharding import get_shard_router
+        router = get_shard_router()
+        if router:
+            return router.top('engagement_score', limit)
+        if ENGAGEMENT_SCORING_MODE == 'decayed':
+            # Decay keys rank identically to current decayed values, at any time;
+            # subscribers that never engaged have no key and rank last
+            return cls.query.order_by(cls.engagement_decay_key.desc().nullslast()).limit(limit).all()
         return cls.query.order_by(cls.engagement_score.desc()).limit(limit).all()
     
+    @classmethod
+    def get_top_by_lifetime_value(cls, limit=10):
+        """Get subscribers with the highest lifetime value"""
+        from services.sharding import get_shard_router
+        router = get_shard_router()
+        if router:
+            return router.top('lifetime_value', limit)
+        return cls.query.order_by(cls.lifetime_value.desc()).limit(limit).all()
+    
     @classmethod
     def get_at_risk_subscribers(cls, threshold=0.7, limit=10):
         """Get subscribers at risk of churning"""
+        from services.sharding import get_shard_router
+        router = get_shard_router()
+        if router:
+            return router.collect(
+                lambda query: query.filter(cls.churn_risk_score >= threshold),
+                order_by='churn_risk_score', limit=limit
+            )
         return cls.query.filter(cls.churn_risk_score >= threshold).order_by(cls.churn_risk_score.desc()).limit(limit).all()
     
     @classmethod
     def get_by_persona(cls, persona):
         """Get subscribers by AI persona"""
+        from services.sharding import get_shard_router
+        router = get_shard_router()
+        if router:
+            return router.collect(lambda query: query.filter(cls.ai_persona == persona))
         return cls.query.filter(cls.ai_persona == persona).all()
     
     @classmethod
     def search_by_email(cls, email_pattern):
         """Search subscribers by email pattern"""
+        from services.sharding import get_shard_router
+        router = get_shard_router()
+        if router:
+            return router.collect(lambda query: query.filter(cls.email.like(f'%{email_pattern}%')))
         return cls.query.filter(cls.email.like(f'%{email_pattern}%')).all()
 
+class SubscriberEmail(db.Model):
+    """Email -> subscriber id registry in the main database, for sharded storage"""
+    
+    __tablename__ = 'subscriber_emails'
+    
+    # The primary key makes claiming an email atomic across shards
+    email = Column(String(255), primary_key=True)
+    subscriber_id = Column(SUBSCRIBER_ID_TYPE, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SubscriberEmail {self.email} -> {self.subscriber_id}>'
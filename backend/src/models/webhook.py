@@ -0,0 +1,109 @@
+"""
+Webhook Models for PersonalizeAI Platform
+Registered webhook endpoints and the durable outbox of events to deliver
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, ForeignKey, Index
+from sqlalchemy.orm import relationship
+
+# Import db from main app
+from main import db
+
+class WebhookEndpoint(db.Model):
+    """A customer URL that receives webhook events"""
+
+    __tablename__ = 'webhook_endpoints'
+
+    # Primary key
+    id = Column(Integer, primary_key=True)
+
+    # Delivery target
+    url = Column(String(500), nullable=False)
+    secret = Column(String(100), nullable=False)  # HMAC-SHA256 signing key
+    event_types = Column(JSON, nullable=True)  # ['subscriber.created', ...]; null = all events
+    is_active = Column(Boolean, default=True)
+
+    # Delivery limits
+    max_batch_size = Column(Integer, default=50)  # Events per request
+    max_concurrency = Column(Integer, default=4)  # Requests in flight at once
+
+    # Metadata
+    description = Column(String(200), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<WebhookEndpoint {self.id} {self.url}>'
+
+    def to_dict(self):
+        """Convert to dictionary for JSON serialization (the secret is never returned)"""
+        return {
+            'id': self.id,
+            'url': self.url,
+            'event_types': self.event_types,
+            'is_active': self.is_active,
+            'max_batch_size': self.max_batch_size,
+            'max_concurrency': self.max_concurrency,
+            'description': self.description,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class WebhookOutbox(db.Model):
+    """
+    One event waiting for (or finished with) delivery to one endpoint.
+
+    Rows are inserted in the same transaction as the change that caused the
+    event, so an event exists exactly when the change was committed.
+    Delivered rows are kept briefly for auditing; rows that exhaust their
+    retries stay with status 'dead' (the dead-letter queue) until replayed.
+    """
+
+    __tablename__ = 'webhook_outbox'
+    __table_args__ = (
+        Index('ix_webhook_outbox_due', 'status', 'endpoint_id', 'next_attempt_at'),
+    )
+
+    # Primary key (delivery order within an endpoint)
+    id = Column(Integer, primary_key=True)
+
+    # Event
+    event_id = Column(String(36), nullable=False)  # Shared by all endpoints receiving the event
+    event_type = Column(String(50), nullable=False)
+    payload = Column(JSON, nullable=False)  # {'event', 'timestamp', 'data'} as documented in docs/API.md
+
+    # Destination
+    endpoint_id = Column(Integer, ForeignKey('webhook_endpoints.id'), nullable=False)
+    endpoint = relationship("WebhookEndpoint", backref="outbox")
+
+    # Delivery state
+    status = Column(String(20), default='pending')  # pending, delivering, delivered, dead
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    locked_by = Column(String(64), nullable=True)  # Dispatcher claim token while status is delivering
+    locked_until = Column(DateTime, nullable=True)  # Claim expiry
+    last_error = Column(Text, nullable=True)
+
+    # Metadata
+    created_at = Column(DateTime, default=datetime.utcnow)
+    delivered_at = Column(DateTime, nullable=True, index=True)
+
+    def __repr__(self):
+        return f'<WebhookOutbox {self.id} {self.event_type} ({self.status})>'
+
+    def to_dict(self):
+        """Convert to dictionary for JSON serialization"""
+        return {
+            'id': self.id,
+            'event_id': self.event_id,
+            'event_type': self.event_type,
+            'payload': self.payload,
+            'endpoint_id': self.endpoint_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'delivered_at': self.delivered_at.isoformat() if self.delivered_at else None
+        }
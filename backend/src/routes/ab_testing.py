@@ -0,0 +1,136 @@
+"""
+A/B Testing API Routes for PersonalizeAI Platform
+Create A/B tests and read their results
+"""
+
+from datetime import datetime, timedelta
+
+from flask import Blueprint, request, jsonify
+from models.personalization import ABTest
+from services.sequential_testing import METRIC_EVENTS
+from main import db
+
+ab_testing_bp = Blueprint('ab_testing', __name__)
+
+ALLOCATION_MODES = ('static', 'thompson')
+MAX_VARIANTS = 26  # Labelled A-Z on personalization results
+
+def _change(value, baseline):
+    if not baseline:
+        return None
+    return f'{(value - baseline) / baseline * 100:+.1f}%'
+
+@ab_testing_bp.route('', methods=['POST'])
+def create_ab_test():
+    """Create and start an A/B test"""
+    try:
+        data = request.get_json() or {}
+        variants = data.get('variants')
+        if not data.get('name') or not data.get('type'):
+            return jsonify({'error': 'name and type are required', 'status': 'error'}), 400
+        if not isinstance(variants, list) or not 2 <= len(variants) <= MAX_VARIANTS:
+            return jsonify({'error': f'variants must be a list of 2 to {MAX_VARIANTS} variants',
+                            'status': 'error'}), 400
+
+        traffic_split = data.get('traffic_split') or [100 / len(variants)] * len(variants)
+        if (not isinstance(traffic_split, list) or len(traffic_split) != len(variants) or
+                not all(isinstance(w, (int, float)) and not isinstance(w, bool) and w >= 0 for w in traffic_split) or
+                sum(traffic_split) <= 0):
+            return jsonify({'error': 'traffic_split must give a non-negative weight for each variant',
+                            'status': 'error'}), 400
+
+        allocation_mode = data.get('allocation_mode', 'static')
+        if allocation_mode not in ALLOCATION_MODES:
+            return jsonify({'error': f'allocation_mode must be one of {", ".join(ALLOCATION_MODES)}',
+                            'status': 'error'}), 400
+        target_metric = data.get('target_metric', 'open_rate')
+        if target_metric not in METRIC_EVENTS:
+            return jsonify({'error': f'target_metric must be one of {", ".join(METRIC_EVENTS)}',
+                            'status': 'error'}), 400
+        duration_days = data.get('duration_days', 7)
+        if isinstance(duration_days, bool) or not isinstance(duration_days, int) or not 1 <= duration_days <= 365:
+            return jsonify({'error': 'duration_days must be an integer from 1 to 365', 'status': 'error'}), 400
+
+        start = datetime.utcnow()
+        test = ABTest(
+            test_name=data['name'],
+            test_description=data.get('description'),
+            test_type=data['type'],
+            variants=variants,
+            traffic_split=traffic_split,
+            target_metric=target_metric,
+            allocation_mode=allocation_mode,
+            status='running',
+            start_date=start,
+            end_date=start + timedelta(days=duration_days),
+            planned_duration_days=duration_days,
+            minimum_sample_size=data.get('minimum_sample_size', 100),
+            created_by=data.get('created_by')
+        )
+        db.session.add(test)
+        db.session.commit()
+
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'test_id': test.id,
+                'status': test.status,
+                'variants': test.variant_labels(),
+                'start_date': test.start_date.isoformat() + 'Z',
+                'end_date': test.end_date.isoformat() + 'Z'
+            }
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@ab_testing_bp.route('/<int:test_id>/results', methods=['GET'])
+def get_ab_test_results(test_id):
+    """Per-variant results, the winner and its improvement over the control (the first variant)"""
+    try:
+        test = db.session.get(ABTest, test_id)
+        if test is None:
+            return jsonify({'error': 'A/B test not found', 'status': 'error'}), 404
+        variant_results = test.calculate_results() or {}
+        db.session.commit()  # calculate_results() stores the summary on the test
+
+        labels = test.variant_labels()
+        results = {}
+        for label, variant in zip(labels, test.variants or []):
+            data = variant_results.get(label, {})
+            results[label] = {
+                'name': variant.get('name') if isinstance(variant, dict) else None,
+                'emails_sent': data.get('participants', 0),
+                'opens': data.get('opens', 0),
+                'clicks': data.get('clicks', 0),
+                'conversions': data.get('conversions', 0),
+                'open_rate': round(data.get('open_rate', 0.0), 1),
+                'click_rate': round(data.get('click_rate', 0.0), 1),
+                'conversion_rate': round(data.get('conversion_rate', 0.0), 1)
+            }
+
+        winner = test.winning_variant
+        improvement = None
+        if winner in results and labels and winner != labels[0]:
+            control = results[labels[0]]
+            improvement = {metric: _change(results[winner][metric], control[metric])
+                           for metric in ('open_rate', 'click_rate', 'conversion_rate')}
+
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'test_id': test.id,
+                'status': test.status,
+                'target_metric': test.target_metric,
+                'results': results,
+                'statistical_significance': test.confidence_level if test.statistical_significance_reached else None,
+                'winner': winner,
+                'improvement': improvement,
+                'sequential_results': test.sequential_results
+            }
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'status': 'error'}), 500
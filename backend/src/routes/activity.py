@@ -0,0 +1,84 @@
+"""
+Activity Feed API Routes for PersonalizeAI Platform
+Recent activity as JSON and as a Server-Sent Events stream
+"""
+
+import json
+import os
+import threading
+import time
+
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+
+from services.activity_feed import activity_feed
+from main import db
+
+activity_bp = Blueprint('activity', __name__)
+
+# Streams are recycled periodically; EventSource reconnects automatically and
+# resumes from Last-Event-ID
+STREAM_MAX_SECONDS = 55
+HEARTBEAT_SECONDS = 15
+STREAM_RETRY_MS = 1000
+BUSY_RETRY_MS = 5000
+
+# Each open stream holds one gunicorn thread (gthread workers); cap them per
+# process so API requests always have threads left
+stream_slots = threading.BoundedSemaphore(int(os.getenv('ACTIVITY_MAX_STREAMS_PER_WORKER', '8')))
+
+@activity_bp.route('/', methods=['GET'])
+def get_activity():
+    """Get activity newer than the `since` cursor (event id)"""
+    try:
+        since = request.args.get('since', 0, type=int)
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        
+        events = activity_feed.since(since, limit=limit)
+        return jsonify({
+            'activity': events,
+            'cursor': events[-1]['id'] if events else since,
+            'status': 'success'
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@activity_bp.route('/stream', methods=['GET'])
+def stream_activity():
+    """
+    Push new activity to the dashboard as Server-Sent Events.
+
+    When the worker already holds its maximum number of streams, the
+    response only tells the client to reconnect after BUSY_RETRY_MS.
+    """
+    cursor = request.headers.get('Last-Event-ID', type=int)
+    if cursor is None:
+        cursor = request.args.get('since', type=int)
+    if cursor is None:
+        # New clients start from the current head and only receive deltas
+        activity_feed.sync()
+        cursor = activity_feed.head
+    
+    def generate(cursor):
+        started = last_sent = time.monotonic()
+        yield f'retry: {STREAM_RETRY_MS}\n\n'
+        while time.monotonic() - started < STREAM_MAX_SECONDS:
+            events = activity_feed.since(cursor, limit=100)
+            db.session.rollback()  # Don't hold a transaction open between polls
+            for item in events:
+                cursor = item['id']
+                yield f"id: {cursor}\nevent: activity\ndata: {json.dumps(item)}\n\n"
+                last_sent = time.monotonic()
+            if not events:
+                if time.monotonic() - last_sent >= HEARTBEAT_SECONDS:
+                    yield ': keep-alive\n\n'
+                    last_sent = time.monotonic()
+                activity_feed.wait(cursor, timeout=activity_feed.sync_interval)
+    
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if not stream_slots.acquire(blocking=False):
+        return Response(f'retry: {BUSY_RETRY_MS}\n\n', mimetype='text/event-stream', headers=headers)
+    response = Response(stream_with_context(generate(cursor)), mimetype='text/event-stream', headers=headers)
+    # The server closes the response when the stream ends or the client goes away
+    response.call_on_close(stream_slots.release)
+    return response
@@ -0,0 +1,119 @@
+"""
+Analytics API Routes for PersonalizeAI Platform
+Engagement metrics from the event store and revenue impact reporting
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import Blueprint, request, jsonify
+
+from services.event_store import EVENT_TYPES, get_event_store
+from services.sharding import get_shard_router
+
+analytics_bp = Blueprint('analytics', __name__)
+
+MAX_PERIOD_DAYS = 366
+
+def _parse_date(value, default):
+    return datetime.strptime(value, '%Y-%m-%d') if value else default
+
+def _rates(events):
+    """Event counts and rates for one scanned period"""
+    counts = np.bincount(events['event_type'].astype('<i8'), minlength=len(EVENT_TYPES))
+    sent, opened, clicked = (int(counts[EVENT_TYPES[name]]) for name in ('sent', 'opened', 'clicked'))
+    unsubscribed = int(counts[EVENT_TYPES['unsubscribed']])
+    active = len(np.unique(events['subscriber_id']))
+    return {
+        'total_emails_sent': sent,
+        'total_opens': opened,
+        'total_clicks': clicked,
+        'open_rate': round(opened / sent * 100, 1) if sent else 0.0,
+        'click_rate': round(clicked / sent * 100, 1) if sent else 0.0,
+        'unsubscribe_rate': round(unsubscribed / active * 100, 1) if active else 0.0
+    }
+
+def _change(current, previous):
+    if not previous:
+        return None
+    return f'{(current - previous) / previous * 100:+.1f}%'
+
+def _tier_subscriber_ids(tier):
+    from models.subscriber import Subscriber
+
+    router = get_shard_router()
+    if router:
+        return [s.id for s in router.collect(lambda query: query.filter(Subscriber.subscription_tier == tier))]
+    return [row[0] for row in Subscriber.query.with_entities(Subscriber.id).filter(
+        Subscriber.subscription_tier == tier
+    )]
+
+@analytics_bp.route('/engagement', methods=['GET'])
+def get_engagement_analytics():
+    """
+    Sends, opens, clicks and unsubscribes between start_date and end_date
+    (default: the last 30 days), compared with the preceding period of the
+    same length.
+    """
+    try:
+        try:
+            end = _parse_date(request.args.get('end_date'), datetime.utcnow())
+            start = _parse_date(request.args.get('start_date'), end - timedelta(days=30))
+        except ValueError:
+            return jsonify({'error': 'start_date and end_date must be YYYY-MM-DD', 'status': 'error'}), 400
+        if start >= end or (end - start).days > MAX_PERIOD_DAYS:
+            return jsonify({'error': f'start_date must be before end_date and at most {MAX_PERIOD_DAYS} days earlier',
+                            'status': 'error'}), 400
+
+        tier = request.args.get('subscriber_tier')
+        subscriber_ids = _tier_subscriber_ids(tier) if tier else None
+
+        store = get_event_store()
+        current = _rates(store.scan(start, end, subscriber_ids=subscriber_ids))
+        previous = _rates(store.scan(start - (end - start), start, subscriber_ids=subscriber_ids))
+
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'period': {
+                    'start_date': start.strftime('%Y-%m-%d'),
+                    'end_date': end.strftime('%Y-%m-%d')
+                },
+                'metrics': current,
+                'trends': {
+                    'open_rate_change': _change(current['open_rate'], previous['open_rate']),
+                    'click_rate_change': _change(current['click_rate'], previous['click_rate']),
+                    'unsubscribe_rate_change': _change(current['unsubscribe_rate'], previous['unsubscribe_rate'])
+                }
+            }
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@analytics_bp.route('/revenue-impact', methods=['GET'])
+def get_revenue_impact():
+    """Get revenue impact analysis from personalization"""
+    try:
+        # Mock attribution data for demo (matches the dashboard's revenue figure)
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'current_period': {
+                    'revenue_lift': 285000,
+                    'percentage_increase': 23.4,
+                    'attribution': {
+                        'subject_line_personalization': 0.45,
+                        'content_personalization': 0.35,
+                        'send_time_optimization': 0.20
+                    }
+                },
+                'projections': {
+                    'annual_revenue_lift': 3420000,
+                    'roi_on_personalization': 8.7
+                }
+            }
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 500
@@ -0,0 +1,259 @@
+"""
+Content API Routes for PersonalizeAI Platform
+Content catalogue and per-subscriber recommendations
+"""
+
+from datetime import datetime, timezone
+
+from flask import Blueprint, request, jsonify
+from models.content import ContentItem
+from services.recommendations import get_recommendation_engine
+from services.sharding import ShardingNotSupported
+from services.subscriber_events import IndexNotReady
+from main import db
+
+content_bp = Blueprint('content', __name__)
+
+RISK_LEVELS = ('conservative', 'moderate', 'aggressive')
+
+# Subscribers scored per POST /recommendations request
+DEFAULT_SEGMENT_PAGE = 1000
+MAX_SEGMENT_PAGE = 10000
+
+def _parse_timestamp(value):
+    """ISO 8601 timestamp as naive UTC (how timestamps are stored); 'Z' and offsets are converted"""
+    if not isinstance(value, str):
+        raise ValueError('published_at must be an ISO 8601 string')
+    try:
+        parsed = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith(('Z', 'z')) else value)
+    except ValueError:
+        raise ValueError(f'published_at is not an ISO 8601 timestamp: {value!r}') from None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _segment_options(data):
+    """k, content_types and max_age_days from a recommendations body; ValueError if malformed"""
+    k, content_types, max_age_days = data.get('k', 5), data.get('content_types'), data.get('max_age_days')
+    if isinstance(k, bool) or not isinstance(k, int) or not 1 <= k <= 50:
+        raise ValueError('k must be an integer from 1 to 50')
+    if content_types is not None and (not isinstance(content_types, list) or
+                                      not all(isinstance(t, str) for t in content_types)):
+        raise ValueError('content_types must be a list of content types')
+    if max_age_days is not None and (isinstance(max_age_days, bool) or
+                                     not isinstance(max_age_days, (int, float)) or max_age_days < 0):
+        raise ValueError('max_age_days must be a non-negative number')
+    return k, content_types, max_age_days
+
+def _recommendation_payload(recommendations):
+    """Expand (content_id, score) pairs with title/type/url from one query"""
+    content_ids = {content_id for picks in recommendations.values() for content_id, _ in picks}
+    items = {item.id: item for item in ContentItem.query.filter(ContentItem.id.in_(content_ids)).all()} if content_ids else {}
+    return {
+        str(subscriber_id): [
+            {
+                'content_id': content_id,
+                'title': items[content_id].title,
+                'content_type': items[content_id].content_type,
+                'url': items[content_id].url,
+                'score': score
+            }
+            for content_id, score in picks if content_id in items
+        ]
+        for subscriber_id, picks in recommendations.items()
+    }
+
+@content_bp.route('/', methods=['GET'])
+def get_content():
+    """List content; `tag` and `ticker` filters are answered from the inverted index"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        content_type = request.args.get('content_type', '')
+        tag = request.args.get('tag', '')
+        ticker = request.args.get('ticker', '')
+
+        query = ContentItem.query.filter(ContentItem.is_active.is_(True))
+        if content_type:
+            query = query.filter(ContentItem.content_type == content_type)
+        if tag or ticker:
+            index = get_recommendation_engine().content
+            matches = None
+            if tag:
+                matches = set(index.items_for(f'tag:{tag.strip().lower()}'))
+            if ticker:
+                by_ticker = set(index.items_for(f'ticker:{ticker.strip().upper()}'))
+                matches = by_ticker if matches is None else matches & by_ticker
+            query = query.filter(ContentItem.id.in_(matches))
+
+        paginated = query.order_by(ContentItem.published_at.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+
+        return jsonify({
+            'content': [item.to_dict() for item in paginated.items],
+            'total': paginated.total,
+            'page': page,
+            'per_page': per_page,
+            'status': 'success'
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@content_bp.route('/', methods=['POST'])
+def create_content():
+    """Add a content item to the catalogue"""
+    try:
+        data = request.get_json() or {}
+
+        if not data.get('title') or not data.get('content_type'):
+            return jsonify({'error': 'title and content_type are required', 'status': 'error'}), 400
+        if data.get('risk_level') and data['risk_level'] not in RISK_LEVELS:
+            return jsonify({'error': f'risk_level must be one of {", ".join(RISK_LEVELS)}', 'status': 'error'}), 400
+
+        item = ContentItem(
+            title=data['title'],
+            content_type=data['content_type'],
+            summary=data.get('summary'),
+            url=data.get('url'),
+            tags=[str(tag).strip().lower() for tag in data.get('tags') or []],
+            tickers=[str(ticker).strip().upper() for ticker in data.get('tickers') or []],
+            risk_level=data.get('risk_level'),
+            published_at=_parse_timestamp(data['published_at']) if data.get('published_at') else datetime.utcnow()
+        )
+        db.session.add(item)
+        db.session.commit()
+        get_recommendation_engine().content.invalidate()
+
+        return jsonify({
+            'content': item.to_dict(),
+            'status': 'success'
+        }), 201
+
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'status': 'error'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@content_bp.route('/<int:content_id>', methods=['DELETE'])
+def delete_content(content_id):
+    """Retire a content item so it is no longer recommended"""
+    try:
+        item = ContentItem.query.get_or_404(content_id)
+        item.is_active = False
+        db.session.commit()
+        get_recommendation_engine().content.invalidate()
+
+        return jsonify({
+            'message': 'Content retired',
+            'status': 'success'
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@content_bp.route('/recommendations', methods=['POST'])
+def recommend_for_segment():
+    """
+    Recommend content for a segment in one batched pass.
+
+    Body: subscriber_ids or filters (search, status, tier), plus optional k,
+    content_types and max_age_days. At most `limit` subscribers are scored per
+    request; pass the returned next_after_id as after_id for the next page.
+    """
+    try:
+        data = request.get_json() or {}
+        try:
+            k, content_types, max_age_days = _segment_options(data)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'status': 'error'}), 400
+        subscriber_ids, filters = data.get('subscriber_ids'), data.get('filters') or {}
+        if not isinstance(filters, dict):
+            return jsonify({'error': 'filters must be an object', 'status': 'error'}), 400
+        filters = {key: value for key, value in filters.items() if key in ('search', 'status', 'tier')}
+
+        if subscriber_ids is not None:
+            if not isinstance(subscriber_ids, list) or not all(
+                    isinstance(i, int) and not isinstance(i, bool) for i in subscriber_ids):
+                return jsonify({'error': 'subscriber_ids must be a list of integers', 'status': 'error'}), 400
+            if len(subscriber_ids) > MAX_SEGMENT_PAGE:
+                return jsonify({'error': f'At most {MAX_SEGMENT_PAGE} subscriber_ids per request',
+                                'status': 'error'}), 400
+        limit, after_id = data.get('limit', DEFAULT_SEGMENT_PAGE), data.get('after_id', 0)
+        if isinstance(limit, bool) or not isinstance(limit, int) or not 1 <= limit <= MAX_SEGMENT_PAGE:
+            return jsonify({'error': f'limit must be an integer from 1 to {MAX_SEGMENT_PAGE}',
+                            'status': 'error'}), 400
+        if isinstance(after_id, bool) or not isinstance(after_id, int) or after_id < 0:
+            return jsonify({'error': 'after_id must be a non-negative integer', 'status': 'error'}), 400
+
+        recommendations = get_recommendation_engine().recommend_for_segment(
+            subscriber_ids=subscriber_ids,
+            filters=filters,
+            k=k,
+            content_types=content_types,
+            max_age_days=max_age_days,
+            limit=limit,
+            after_id=after_id
+        )
+
+        return jsonify({
+            'recommendations': _recommendation_payload(recommendations),
+            'subscribers': len(recommendations),
+            'next_after_id': max(recommendations) if len(recommendations) == limit else None,
+            'status': 'success'
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@content_bp.route('/recommendations/<int:subscriber_id>', methods=['GET'])
+def recommend_for_subscriber(subscriber_id):
+    """Top content for one subscriber"""
+    try:
+        k = max(1, min(request.args.get('k', 5, type=int), 50))
+        content_types = request.args.getlist('content_type') or None
+        max_age_days = request.args.get('max_age_days', type=float)
+        if max_age_days is not None and not max_age_days >= 0:
+            return jsonify({'error': 'max_age_days must be a non-negative number', 'status': 'error'}), 400
+
+        recommendations = get_recommendation_engine().recommend_for_segment(
+            subscriber_ids=[subscriber_id], k=k, content_types=content_types, max_age_days=max_age_days
+        )
+        if subscriber_id not in recommendations:
+            return jsonify({'error': 'Subscriber not found', 'status': 'error'}), 404
+
+        return jsonify({
+            'subscriber_id': subscriber_id,
+            'recommendations': _recommendation_payload(recommendations)[str(subscriber_id)],
+            'status': 'success'
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@content_bp.route('/<int:content_id>/audience', methods=['GET'])
+def get_audience(content_id):
+    """Subscribers most interested in a content item, from the tag -> subscriber index"""
+    try:
+        limit = max(1, min(request.args.get('limit', 100, type=int), 10000))
+        item = ContentItem.query.get_or_404(content_id)
+
+        try:
+            audience = get_recommendation_engine().audience_for_content(item, limit=limit)
+        except IndexNotReady as e:
+            return jsonify({'error': str(e), 'status': 'error'}), 503, {'Retry-After': '10'}
+        except ShardingNotSupported as e:
+            return jsonify({'error': str(e), 'status': 'error'}), 501
+
+        return jsonify({
+            'content_id': content_id,
+            'audience': [{'subscriber_id': subscriber_id, 'score': score} for subscriber_id, score in audience],
+            'status': 'success'
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 500
@@ -0,0 +1,226 @@
+"""
+Personalization API Routes for PersonalizeAI Platform
+Personalized subject lines within a per-request latency budget
+"""
+
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify, current_app
+from models.subscriber import Subscriber
+from models.personalization import PersonalizationResult, ABTest
+from services.activity_feed import activity_feed
+from services.event_store import get_event_store
+from services.sharding import get_shard_router
+from services.subject_lines import PLACEHOLDER, get_subject_line_service, subject_line_context
+from services.webhooks import enqueue_webhook
+from main import db
+
+personalization_bp = Blueprint('personalization', __name__)
+
+MAX_LATENCY_BUDGET_MS = 30000
+
+# Email event -> (flag column, timestamp column, A/B allocator event)
+RESULT_EVENTS = {
+    'sent': ('was_sent', 'sent_at', None),  # The allocator counts the trial when the variant is assigned
+    'opened': ('was_opened', 'opened_at', 'open'),
+    'clicked': ('was_clicked', 'clicked_at', 'click'),
+    'converted': (None, 'converted_at', 'conversion')  # Carries a value; repeats add to it
+}
+
+def _subject_line_test(ab_test_id):
+    """The requested running test, or the newest running subject_line test"""
+    query = ABTest.query.filter(ABTest.status == 'running')
+    if ab_test_id:
+        return query.filter(ABTest.id == ab_test_id).first()
+    return query.filter(ABTest.test_type == 'subject_line').order_by(ABTest.start_date.desc()).first()
+
+@personalization_bp.route('/subject-line', methods=['POST'])
+def personalize_subject_line():
+    """
+    Generate a personalized subject line for a subscriber.
+
+    The upstream model is given `latency_budget_ms` (default
+    PERSONALIZE_LATENCY_BUDGET_MS); if it has not answered by then, the
+    deterministic local generator's line is returned instead. The source is
+    stored in PersonalizationResult.ai_model_used.
+    """
+    try:
+        data = request.get_json() or {}
+        subscriber_id = data.get('subscriber_id')
+        if not subscriber_id:
+            return jsonify({'error': 'subscriber_id is required', 'status': 'error'}), 400
+
+        budget_ms = data.get('latency_budget_ms')
+        if budget_ms is not None:
+            if not isinstance(budget_ms, (int, float)) or budget_ms < 0:
+                return jsonify({'error': 'latency_budget_ms must be a non-negative number', 'status': 'error'}), 400
+            budget_ms = min(budget_ms, MAX_LATENCY_BUDGET_MS)
+
+        router = get_shard_router()
+        subscriber = router.get(subscriber_id) if router else db.session.get(Subscriber, subscriber_id)
+        if subscriber is None:
+            return jsonify({'error': 'Subscriber not found', 'status': 'error'}), 404
+
+        content_type = data.get('content_type', 'market_update')
+        base_subject = data.get('base_subject', '')
+        context = subject_line_context(subscriber, content_type, base_subject, data.get('market_context'))
+
+        # A/B test: the variant's content is the template; a variant without
+        # placeholders is a fixed control line and is sent as-is
+        test = _subject_line_test(data.get('ab_test_id'))
+        variant, template = None, None
+        if test:
+            variant = test.assign_variant(subscriber.id)
+            config = (test.variants or [])[test.variant_labels().index(variant)]
+            template = config.get('content') if isinstance(config, dict) else str(config)
+
+        if template is not None and not PLACEHOLDER.search(template):
+            generated = {'subject': template, 'score': 0.0, 'reasoning': 'A/B test control variant',
+                         'source': 'ab-variant', 'fallback_reason': None, 'latency_ms': 0.0}
+        else:
+            generated = get_subject_line_service().generate(context, budget_ms=budget_ms, template=template)
+
+        fields = dict(
+            content_type='subject_line',
+            original_content=base_subject or None,
+            personalized_content=generated['subject'],
+            personalization_strategy=content_type,
+            ai_model_used=generated['source'],
+            ai_confidence_score=generated['score'],
+            ab_test_id=test.id if test else None,
+            ab_test_variant=variant
+        )
+        if router:
+            result = router.add_result(subscriber.id, **fields)
+        else:
+            result = PersonalizationResult(subscriber_id=subscriber.id, **fields)
+            db.session.add(result)
+        activity_feed.record('personalization.subject_line', 'Subject line personalized',
+                             subscriber=subscriber.short_name, source=generated['source'])
+        db.session.commit()
+        if test:
+            test.record_engagement(variant, 'send')
+
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'result_id': result.id,  # For reporting sent/opened/clicked/converted events
+                'personalized_subject': generated['subject'],
+                'personalization_score': generated['score'],
+                'reasoning': generated['reasoning'],
+                'a_b_test_variant': variant,
+                'source': generated['source'],
+                'fallback_reason': generated['fallback_reason'],
+                'latency_ms': generated['latency_ms']
+            }
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+def apply_result_event(result, event, at, value=None):
+    """
+    Mark a result sent/opened/clicked; False if it already was (events are
+    counted once). Every conversion adds its value, but only the first counts.
+    """
+    flag, timestamp, _ = RESULT_EVENTS[event]
+    if event == 'converted':
+        first = result.converted_at is None
+        result.record_conversion(value, at)
+        return first
+    if getattr(result, flag):
+        return False
+    setattr(result, flag, True)
+    setattr(result, timestamp, at)
+    return True
+
+def announce_engagement_event(subscriber, event, at):
+    """Queue the email.* webhook and add the activity entry for a counted event (main database session)"""
+    if event in ('sent', 'opened', 'clicked'):
+        enqueue_webhook(f'email.{event}', {'subscriber_id': subscriber.id, f'{event}_at': at.isoformat() + 'Z'})
+    if event != 'sent':
+        activity_feed.record(f'email.{event}', f'Email {event}',
+                             subscriber=subscriber.short_name, subscriber_id=subscriber.id)
+
+@personalization_bp.route('/results/<int:result_id>/events', methods=['POST'])
+def record_result_event(result_id):
+    """
+    Record what happened to a personalized email (sent, opened, clicked or
+    converted, with the conversion's value).
+
+    Meant for the email platform's delivery and tracking webhooks. Each new
+    event updates the subscriber's totals and engagement score; opens, clicks
+    and conversions of A/B test results also update the test's adaptive
+    allocation. Conversions mark the subscriber for the next LTV refresh.
+
+    Results are only updated in the hot table; `flask results-retention`
+    keeps them there until their attribution window has passed.
+    """
+    try:
+        data = request.get_json() or {}
+        event = data.get('event')
+        if event not in RESULT_EVENTS:
+            return jsonify({'error': f'event must be one of {", ".join(RESULT_EVENTS)}', 'status': 'error'}), 400
+        try:
+            at = datetime.fromisoformat(data['occurred_at'].rstrip('Z')) if data.get('occurred_at') else datetime.utcnow()
+        except (AttributeError, ValueError):
+            return jsonify({'error': 'occurred_at must be an ISO 8601 timestamp', 'status': 'error'}), 400
+        value = data.get('value')
+        if event == 'converted' and (isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0):
+            return jsonify({'error': 'value must be a non-negative number for converted events', 'status': 'error'}), 400
+
+        router = get_shard_router()
+        if router:
+            # Results live on their subscriber's shard
+            subscriber_id = data.get('subscriber_id')
+            if not isinstance(subscriber_id, int):
+                return jsonify({'error': 'subscriber_id is required with sharded storage', 'status': 'error'}), 400
+            with router.session(router.shard_for(subscriber_id)) as session:
+                result = session.get(PersonalizationResult, result_id)
+                if result is None or result.subscriber_id != subscriber_id:
+                    return jsonify({'error': 'Result not found', 'status': 'error'}), 404
+                counted = apply_result_event(result, event, at, value)
+                if counted:
+                    subscriber = session.get(Subscriber, subscriber_id)
+                    if subscriber:
+                        subscriber.record_engagement_event(event, at)
+                        announce_engagement_event(subscriber, event, at)
+                session.commit()
+            # Activity and webhook rows live in the main database
+            db.session.commit()
+        else:
+            result = db.session.get(PersonalizationResult, result_id)
+            if result is None:
+                return jsonify({'error': 'Result not found', 'status': 'error'}), 404
+            counted = apply_result_event(result, event, at, value)
+            if counted:
+                subscriber = db.session.get(Subscriber, result.subscriber_id)
+                if subscriber:
+                    subscriber.record_engagement_event(event, at)
+                    announce_engagement_event(subscriber, event, at)
+            db.session.commit()
+
+        if counted:
+            try:
+                get_event_store().record(result.subscriber_id, event, ts=at, result_id=result_id)
+            except OSError as e:
+                # Already committed; the event store can be rebuilt with `flask events-backfill`
+                current_app.logger.warning('Could not append %s event for result %s: %s', event, result_id, e)
+
+        allocator_event = RESULT_EVENTS[event][2]
+        if counted and allocator_event and result.ab_test_id:
+            test = db.session.get(ABTest, result.ab_test_id)
+            if test:
+                test.record_engagement(result.ab_test_variant, allocator_event)
+
+        return jsonify({
+            'result_id': result_id,
+            'event': event,
+            'counted': counted,
+            'status': 'success'
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'status': 'error'}), 500
@@ -0,0 +1,66 @@
+"""
+Profiling Admin API Routes for PersonalizeAI Platform
+List and download request profiles captured by the profiling middleware
+"""
+
+import hmac
+
+from flask import Blueprint, request, jsonify, Response, current_app
+
+from middleware.profiler import PROFILE_HEADER
+
+profiles_bp = Blueprint('profiles', __name__)
+
+PROFILE_FORMATS = {
+    'collapsed': ('.collapsed', 'text/plain; charset=utf-8'),
+    'speedscope': ('.speedscope.json', 'application/json'),
+    'summary': ('.json', 'application/json')
+}
+
+@profiles_bp.before_request
+def require_profiling_token():
+    """Profiles expose SQL and code paths: only callers with the profiling token may read them"""
+    profiler = current_app.extensions.get('profiler')
+    if profiler is None:
+        return jsonify({'error': 'Profiling is not enabled', 'status': 'error'}), 404
+    supplied = request.headers.get(PROFILE_HEADER, '')
+    if not profiler['token'] or not hmac.compare_digest(supplied, profiler['token']):
+        return jsonify({'error': 'Invalid or missing profiling token', 'status': 'error'}), 403
+    return None
+
+@profiles_bp.route('/', methods=['GET'])
+def list_profiles():
+    """Most recent request profiles, newest first"""
+    try:
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        path = request.args.get('path', '')
+
+        profiles = current_app.extensions['profiler']['store'].list(limit=limit)
+        if path:
+            profiles = [p for p in profiles if p['path'].startswith(path)]
+
+        return jsonify({
+            'profiles': profiles,
+            'status': 'success'
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@profiles_bp.route('/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Download a profile as collapsed stacks, speedscope JSON or its summary"""
+    fmt = request.args.get('format', 'summary')
+    if fmt not in PROFILE_FORMATS:
+        return jsonify({'error': f'format must be one of: {", ".join(PROFILE_FORMATS)}',
+                        'status': 'error'}), 400
+
+    suffix, mimetype = PROFILE_FORMATS[fmt]
+    content = current_app.extensions['profiler']['store'].load(profile_id, suffix)
+    if content is None:
+        return jsonify({'error': 'Profile not found', 'status': 'error'}), 404
+
+    response = Response(content, mimetype=mimetype)
+    if fmt != 'summary':
+        response.headers['Content-Disposition'] = f'attachment; filename={profile_id}{suffix}'
+    return response
@@ -7,6 +7,14 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta
 import random
 
+from services.event_store import get_event_store
+from services.retention import ResultsRetention
+from services.subscriber_events import notify_subscribers_changed
+from services.activity_feed import activity_feed
+from services.sharding import get_shard_router
+from services.subscriber_features import TIERS, RISK_LEVELS, EXPERIENCE_LEVELS, PORTFOLIO_SIZES, CONTENT_TYPES
+from services.webhooks import enqueue_webhook, enqueue_webhooks
+
 # Import models (will be properly imported when integrated)
 try:
     from models.subscriber import Subscriber
@@ -18,6 +26,154 @@ except ImportError:
 
 subscribers_bp = Blueprint('subscribers', __name__)
 
+# Fields that may be changed through the update endpoints
+UPDATABLE_FIELDS = ['first_name', 'last_name', 'subscription_status', 'subscription_tier',
+                    'risk_tolerance', 'investment_experience', 'portfolio_size',
+                    'preferred_content_types', 'preferred_frequency', 'device_preference']
+
+# Allowed values for the enumerated updatable fields
+FIELD_CHOICES = {
+    'subscription_status': ['active', 'paused', 'cancelled'],
+    'subscription_tier': TIERS,
+    'risk_tolerance': RISK_LEVELS,
+    'investment_experience': EXPERIENCE_LEVELS,
+    'portfolio_size': PORTFOLIO_SIZES,
+    'preferred_frequency': ['daily', 'weekly', 'bi-weekly'],
+    'device_preference': ['mobile', 'desktop', 'tablet']
+}
+
+# Rows per UPDATE/DELETE statement (and per commit) for bulk operations
+BULK_CHUNK_SIZE = 1000
+
+# Lookalike search limits
+MAX_LOOKALIKES = 1000
+MAX_LOOKALIKE_SEEDS = 10000
+
+def apply_subscriber_filters(query, **filters):
+    """Apply the standard subscriber list filters to a query"""
+    return Subscriber.apply_filters(query, **filters)
+
+def parse_subscriber_ids(values):
+    """Subscriber ids as ints; ValueError if any is not an integer"""
+    ids = []
+    for value in values:
+        try:
+            if isinstance(value, bool) or not isinstance(value, (int, str)):
+                raise ValueError
+            ids.append(int(value))
+        except ValueError:
+            raise ValueError(f'ids must be integers (got {value!r})') from None
+    return ids
+
+def get_changes(data):
+    """Updatable fields present in data; ValueError if data is not an object or a value is invalid"""
+    if not isinstance(data, dict):
+        raise ValueError('updates must be an object')
+    changes = {field: data[field] for field in UPDATABLE_FIELDS if field in data}
+    for field, value in changes.items():
+        if field in FIELD_CHOICES:
+            if value not in FIELD_CHOICES[field] and not (field == 'portfolio_size' and value is None):
+                raise ValueError(f'{field} must be one of: {", ".join(FIELD_CHOICES[field])}')
+        elif field == 'preferred_content_types':
+            if value is not None and (not isinstance(value, list) or
+                                      any(v not in CONTENT_TYPES for v in value)):
+                raise ValueError(f'preferred_content_types must be a list of: {", ".join(CONTENT_TYPES)}')
+        elif value is not None and (not isinstance(value, str) or len(value) > 100):
+            raise ValueError(f'{field} must be a string of at most 100 characters')
+    return changes
+
+def get_bulk_filters(data):
+    """
+    Read bulk operation filters from the request body (falling back to query
+    parameters); ValueError if they are malformed.
+    """
+    filters = data.get('filters') or {}
+    if not isinstance(filters, dict):
+        raise ValueError('filters must be an object')
+    filters = dict(filters)
+    for key in ('search', 'status', 'tier'):
+        if key not in filters and request.args.get(key):
+            filters[key] = request.args.get(key)
+    if 'ids' in filters and filters['ids'] is not None:
+        if not isinstance(filters['ids'], list):
+            raise ValueError('filters.ids must be a list of integers')
+        filters['ids'] = parse_subscriber_ids(filters['ids'])
+    elif request.args.get('ids'):
+        filters['ids'] = parse_subscriber_ids(i for i in request.args.get('ids').split(',') if i)
+    return {key: filters.get(key) for key in ('search', 'status', 'tier', 'ids') if filters.get(key)}
+
+def get_bulk_chunk_size(data):
+    """chunk_size from the request body, capped at 10000; ValueError unless it is a positive integer"""
+    chunk_size = data.get('chunk_size', BULK_CHUNK_SIZE)
+    if isinstance(chunk_size, bool) or not isinstance(chunk_size, int) or chunk_size < 1:
+        raise ValueError('chunk_size must be a positive integer')
+    return min(chunk_size, 10000)
+
+def bulk_sessions():
+    """Sessions bulk operations run on: db.session, or each shard's session in turn"""
+    router = get_shard_router()
+    if router is None:
+        yield db.session
+        return
+    for shard in range(len(router)):
+        with router.session(shard) as session:
+            yield session
+
+def count_matching(filters):
+    """Subscribers matching the bulk filters (across every shard with sharded storage)"""
+    router = get_shard_router()
+    if router:
+        return router.count(**filters)
+    return apply_subscriber_filters(Subscriber.query, **filters).count()
+
+def iter_matching_id_chunks(filters, chunk_size, session=None):
+    """Yield matching subscriber ids in bounded, id-ordered chunks (keyset pagination)"""
+    session = session or db.session
+    last_id = 0
+    while True:
+        chunk = [row[0] for row in apply_subscriber_filters(
+            session.query(Subscriber.id), **filters
+        ).filter(Subscriber.id > last_id).order_by(Subscriber.id).limit(chunk_size)]
+        if not chunk:
+            break
+        yield chunk
+        last_id = chunk[-1]
+
+def queue_update_webhooks(subscriber_ids, changes, unsubscribed=()):
+    """
+    Queue subscriber.updated webhooks, and subscriber.unsubscribed for the ids
+    in `unsubscribed` (those whose status changed to cancelled), in the current transaction
+    """
+    changes = {field: value for field, value in changes.items() if field in UPDATABLE_FIELDS}
+    enqueue_webhooks('subscriber.updated', [{'subscriber_id': i, 'changes': changes} for i in subscriber_ids])
+    if unsubscribed:
+        now = datetime.utcnow().isoformat() + 'Z'
+        enqueue_webhooks('subscriber.unsubscribed', [{'subscriber_id': i, 'unsubscribed_at': now}
+                                                     for i in unsubscribed])
+
+def queue_delete_webhooks(subscriber_ids):
+    """Queue subscriber.deleted webhooks in the current transaction"""
+    now = datetime.utcnow().isoformat() + 'Z'
+    enqueue_webhooks('subscriber.deleted', [{'subscriber_id': i, 'deleted_at': now} for i in subscriber_ids])
+
+def purge_subscriber_history(subscriber_ids):
+    """
+    Remove deleted subscribers' warm and archived personalization results and
+    their engagement events (after the delete has committed). Their lifetime
+    value lives on the deleted row, and the lookalike and interest indexes
+    drop them on the 'deleted' change notification.
+    """
+    if get_shard_router() is None:  # Retention tiers exist only with unsharded storage
+        ResultsRetention().delete_subscribers(subscriber_ids)
+    get_event_store().delete_subscribers(subscriber_ids)
+
+def record_unsubscribe_events(subscriber_ids):
+    """Append unsubscribed events to the engagement event store (after the change has committed)"""
+    if subscriber_ids:
+        now = datetime.utcnow()
+        get_event_store().append(subscriber_ids, [now] * len(subscriber_ids),
+                                 ['unsubscribed'] * len(subscriber_ids))
+
 @subscribers_bp.route('/', methods=['GET'])
 def get_subscribers():
     """Get all subscribers with optional filtering and pagination"""
@@ -42,28 +198,29 @@ def get_subscribers():
                 'status': 'success'
             })
         
-        # Build query
-        query = Subscriber.query
-        
-        # Apply filters
-        if search:
-            query = query.filter(
-                Subscriber.email.contains(search) |
-                Subscriber.first_name.contains(search) |
-                Subscriber.last_name.contains(search)
-            )
-        
-        if status:
-            query = query.filter(Subscriber.subscription_status == status)
+        # Sharded storage: fan out to every shard and merge the sorted pages
+        router = get_shard_router()
+        if router:
+            subscribers, total = router.list(page=page, per_page=per_page, sort_by=sort_by,
+                                             sort_order=sort_order, search=search, status=status, tier=tier)
+            return jsonify({
+                'subscribers': [sub.to_dict() for sub in subscribers],
+                'total': total,
+                'page': page,
+                'per_page': per_page,
+                'total_pages': (total + per_page - 1) // per_page,
+                'status': 'success'
+            })
         
-        if tier:
-            query = query.filter(Subscriber.subscription_tier == tier)
+        # Build query
+        query = apply_subscriber_filters(Subscriber.query, search=search, status=status, tier=tier)
         
-        # Apply sorting
+        # Apply sorting (NULLs first ascending / last descending on every backend)
+        column = getattr(Subscriber, Subscriber.sort_attribute(sort_by))
         if sort_order == 'desc':
-            query = query.order_by(getattr(Subscriber, sort_by).desc())
+            query = query.order_by(column.desc().nullslast())
         else:
-            query = query.order_by(getattr(Subscriber, sort_by).asc())
+            query = query.order_by(column.asc().nullsfirst())
         
         # Paginate
         paginated = query.paginate(
@@ -95,7 +252,13 @@ def get_subscriber(subscriber_id):
                 'status': 'success'
             })
         
-        subscriber = Subscriber.query.get_or_404(subscriber_id)
+        router = get_shard_router()
+        if router:
+            subscriber = router.get(subscriber_id)
+            if subscriber is None:
+                return jsonify({'error': 'Subscriber not found', 'status': 'error'}), 404
+        else:
+            subscriber = Subscriber.query.get_or_404(subscriber_id)
         return jsonify({
             'subscriber': subscriber.to_dict(),
             'status': 'success'
@@ -129,13 +292,7 @@ def create_subscriber():
                 'status': 'success'
             }), 201
         
-        # Check if subscriber already exists
-        existing = Subscriber.query.filter_by(email=data['email']).first()
-        if existing:
-            return jsonify({'error': 'Subscriber with this email already exists', 'status': 'error'}), 409
-        
-        # Create new subscriber
-        subscriber = Subscriber(
+        fields = dict(
             email=data['email'],
             first_name=data.get('first_name'),
             last_name=data.get('last_name'),
@@ -147,8 +304,32 @@ def create_subscriber():
             preferred_frequency=data.get('preferred_frequency', 'daily')
         )
         
-        db.session.add(subscriber)
+        # Nearest persona centroid; constant time per insert
+        from services.personas import assign_persona
+        fields['ai_persona'] = assign_persona(Subscriber(**fields))
+        
+        router = get_shard_router()
+        if router:
+            # Sharded storage: the router claims the email in the main database's registry
+            subscriber = router.create(**fields)
+            if subscriber is None:
+                return jsonify({'error': 'Subscriber with this email already exists', 'status': 'error'}), 409
+        else:
+            # Check if subscriber already exists
+            existing = Subscriber.query.filter_by(email=data['email']).first()
+            if existing:
+                return jsonify({'error': 'Subscriber with this email already exists', 'status': 'error'}), 409
+            
+            # Create new subscriber
+            subscriber = Subscriber(**fields)
+            db.session.add(subscriber)
+        
+        db.session.flush()  # Assign the id before it goes into the webhook payload
+        activity_feed.record('subscriber.created', 'New subscriber added',
+                             subscriber=subscriber.short_name)
+        enqueue_webhook('subscriber.created', {'subscriber_id': subscriber.id, 'subscriber': subscriber.to_dict()})
         db.session.commit()
+        notify_subscribers_changed([subscriber.id], 'created')
         
         return jsonify({
             'subscriber': subscriber.to_dict(),
@@ -175,17 +356,32 @@ def update_subscriber(subscriber_id):
                 'status': 'success'
             })
         
-        subscriber = Subscriber.query.get_or_404(subscriber_id)
-        
-        # Update fields
-        for field in ['first_name', 'last_name', 'subscription_status', 'subscription_tier',
-                     'risk_tolerance', 'investment_experience', 'portfolio_size',
-                     'preferred_content_types', 'preferred_frequency', 'device_preference']:
-            if field in data:
-                setattr(subscriber, field, data[field])
-        
-        subscriber.updated_at = datetime.utcnow()
+        try:
+            changes = get_changes(data)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'status': 'error'}), 400
+        router = get_shard_router()
+        if router:
+            previous = router.get(subscriber_id) if changes.get('subscription_status') == 'cancelled' else None
+            subscriber = router.update(subscriber_id, changes)
+            if subscriber is None:
+                return jsonify({'error': 'Subscriber not found', 'status': 'error'}), 404
+            unsubscribed = previous is not None and previous.subscription_status != 'cancelled'
+        else:
+            subscriber = Subscriber.query.get_or_404(subscriber_id)
+            unsubscribed = (changes.get('subscription_status') == 'cancelled' and
+                            subscriber.subscription_status != 'cancelled')
+            
+            # Update fields
+            for field, value in changes.items():
+                setattr(subscriber, field, value)
+            
+            subscriber.updated_at = datetime.utcnow()
+        queue_update_webhooks([subscriber.id], changes, [subscriber.id] if unsubscribed else [])
         db.session.commit()
+        notify_subscribers_changed([subscriber.id], 'updated')
+        if unsubscribed:
+            record_unsubscribe_events([subscriber.id])
         
         return jsonify({
             'subscriber': subscriber.to_dict(),
@@ -209,9 +405,20 @@ def delete_subscriber(subscriber_id):
                 'status': 'success'
             })
         
-        subscriber = Subscriber.query.get_or_404(subscriber_id)
-        db.session.delete(subscriber)
+        from models.personalization import PersonalizationResult
+        
+        router = get_shard_router()
+        if router:
+            if not router.delete(subscriber_id):
+                return jsonify({'error': 'Subscriber not found', 'status': 'error'}), 404
+        else:
+            subscriber = Subscriber.query.get_or_404(subscriber_id)
+            PersonalizationResult.query.filter_by(subscriber_id=subscriber_id).delete(synchronize_session=False)
+            db.session.delete(subscriber)
+        queue_delete_webhooks([subscriber_id])
         db.session.commit()
+        notify_subscribers_changed([subscriber_id], 'deleted')
+        purge_subscriber_history([subscriber_id])
         
         return jsonify({
             'message': 'Subscriber deleted successfully',
@@ -223,6 +430,194 @@ def delete_subscriber(subscriber_id):
             db.session.rollback()
         return jsonify({'error': str(e), 'status': 'error'}), 500
 
+@subscribers_bp.route('/', methods=['PATCH'])
+def bulk_update_subscribers():
+    """Update every subscriber matching the filters with set-based UPDATEs in chunks"""
+    try:
+        data = request.get_json() or {}
+        try:
+            filters = get_bulk_filters(data)
+            chunk_size = get_bulk_chunk_size(data)
+            updates = get_changes(data.get('updates') or {})
+        except ValueError as e:
+            return jsonify({'error': str(e), 'status': 'error'}), 400
+        dry_run = bool(data.get('dry_run', False))
+        
+        if not updates:
+            return jsonify({'error': f'No updatable fields given (allowed: {", ".join(UPDATABLE_FIELDS)})',
+                            'status': 'error'}), 400
+        if not filters and not data.get('all'):
+            return jsonify({'error': 'Filters are required (pass "all": true to update every subscriber)',
+                            'status': 'error'}), 400
+        
+        if not Subscriber or not db:
+            # Return mock response for demo
+            return jsonify({'matched': 0, 'affected': 0, 'chunks': 0, 'dry_run': dry_run, 'status': 'success'})
+        
+        matched = count_matching(filters)
+        if dry_run:
+            return jsonify({'matched': matched, 'affected': 0, 'chunks': 0, 'dry_run': True, 'status': 'success'})
+        
+        updates['updated_at'] = datetime.utcnow()
+        affected, chunks = 0, 0
+        for session in bulk_sessions():
+            for chunk in iter_matching_id_chunks(filters, chunk_size, session):
+                unsubscribed = []
+                if updates.get('subscription_status') == 'cancelled':
+                    unsubscribed = [row[0] for row in session.query(Subscriber.id).filter(
+                        Subscriber.id.in_(chunk), Subscriber.subscription_status != 'cancelled'
+                    )]
+                affected += session.query(Subscriber).filter(Subscriber.id.in_(chunk)).update(
+                    updates, synchronize_session=False
+                )
+                if session is not db.session:
+                    session.commit()  # Shard first; webhook rows live in the main database
+                queue_update_webhooks(chunk, updates, unsubscribed)
+                db.session.commit()
+                notify_subscribers_changed(chunk, 'updated')
+                record_unsubscribe_events(unsubscribed)
+                chunks += 1
+        
+        return jsonify({
+            'matched': matched,
+            'affected': affected,
+            'chunks': chunks,
+            'dry_run': False,
+            'message': f'Updated {affected} subscribers',
+            'status': 'success'
+        })
+        
+    except Exception as e:
+        if db:
+            db.session.rollback()
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@subscribers_bp.route('/', methods=['DELETE'])
+def bulk_delete_subscribers():
+    """
+    Delete every subscriber matching the filters in chunks, with their
+    personalization results in every retention tier and their engagement events
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            filters = get_bulk_filters(data)
+            chunk_size = get_bulk_chunk_size(data)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'status': 'error'}), 400
+        dry_run = bool(data.get('dry_run', request.args.get('dry_run') == 'true'))
+        
+        if not filters and not data.get('all'):
+            return jsonify({'error': 'Filters are required (pass "all": true to delete every subscriber)',
+                            'status': 'error'}), 400
+        
+        if not Subscriber or not db:
+            # Return mock response for demo
+            return jsonify({'matched': 0, 'affected': 0, 'chunks': 0, 'dry_run': dry_run, 'status': 'success'})
+        
+        from models.personalization import PersonalizationResult
+        
+        matched = count_matching(filters)
+        if dry_run:
+            return jsonify({'matched': matched, 'affected': 0, 'chunks': 0, 'dry_run': True, 'status': 'success'})
+        
+        router = get_shard_router()
+        affected, chunks, deleted = 0, 0, []
+        for session in bulk_sessions():
+            for chunk in iter_matching_id_chunks(filters, chunk_size, session):
+                session.query(PersonalizationResult).filter(PersonalizationResult.subscriber_id.in_(chunk)).delete(
+                    synchronize_session=False
+                )
+                affected += session.query(Subscriber).filter(Subscriber.id.in_(chunk)).delete(
+                    synchronize_session=False
+                )
+                if session is not db.session:
+                    session.commit()  # Shard first; webhook rows live in the main database
+                queue_delete_webhooks(chunk)
+                db.session.commit()
+                if router:
+                    router.release_emails(chunk)
+                notify_subscribers_changed(chunk, 'deleted')
+                deleted.extend(chunk)
+                chunks += 1
+        # One pass over the archives and event partitions for the whole purge
+        purge_subscriber_history(deleted)
+        
+        return jsonify({
+            'matched': matched,
+            'affected': affected,
+            'chunks': chunks,
+            'dry_run': False,
+            'message': f'Deleted {affected} subscribers',
+            'status': 'success'
+        })
+        
+    except Exception as e:
+        if db:
+            db.session.rollback()
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@subscribers_bp.route('/lookalikes', methods=['POST'])
+def find_lookalike_subscribers():
+    """Find the subscribers most similar to a seed set (explicit ids or top LTV percentile)"""
+    try:
+        data = request.get_json() or {}
+        k, percent = data.get('k', 50), data.get('top_ltv_percent', 1.0)
+        if isinstance(k, bool) or not isinstance(k, int) or not 1 <= k <= MAX_LOOKALIKES:
+            return jsonify({'error': f'k must be an integer from 1 to {MAX_LOOKALIKES}', 'status': 'error'}), 400
+        if isinstance(percent, bool) or not isinstance(percent, (int, float)) or not 0 < percent <= 100:
+            return jsonify({'error': 'top_ltv_percent must be a number above 0 and at most 100',
+                            'status': 'error'}), 400
+        seed_ids = data.get('seed_ids')
+        if seed_ids:
+            try:
+                if not isinstance(seed_ids, list):
+                    raise ValueError('seed_ids must be a list of integers')
+                seed_ids = parse_subscriber_ids(seed_ids)
+            except ValueError as e:
+                return jsonify({'error': str(e), 'status': 'error'}), 400
+            if len(seed_ids) > MAX_LOOKALIKE_SEEDS:
+                return jsonify({'error': f'At most {MAX_LOOKALIKE_SEEDS} seed_ids per request',
+                                'status': 'error'}), 400
+        
+        if not Subscriber or not db:
+            return jsonify({'lookalikes': [], 'seed_count': 0, 'status': 'success'})
+        
+        from services.lookalike import get_lookalike_index
+        from services.sharding import ShardingNotSupported
+        from services.subscriber_events import IndexNotReady
+        try:
+            index = get_lookalike_index()
+        except IndexNotReady as e:
+            return jsonify({'error': str(e), 'status': 'error'}), 503, {'Retry-After': '10'}
+        except ShardingNotSupported as e:
+            return jsonify({'error': str(e), 'status': 'error'}), 501
+        
+        if not seed_ids:
+            # Default seed: top 1% of subscribers by lifetime value (served by the LTV index)
+            seed_count = min(max(1, int(index.size * percent / 100)), MAX_LOOKALIKE_SEEDS)
+            seed_ids = [row[0] for row in db.session.query(Subscriber.id).order_by(
+                Subscriber.lifetime_value.desc()
+            ).limit(seed_count)]
+        
+        matches = index.query(seed_ids, k=k)
+        subscribers = {}
+        if data.get('include_subscribers', True) and matches:
+            subscribers = {sub.id: sub.to_dict() for sub in Subscriber.query.filter(
+                Subscriber.id.in_([m['subscriber_id'] for m in matches])
+            )}
+        for match in matches:
+            match['subscriber'] = subscribers.get(match['subscriber_id'])
+        
+        return jsonify({
+            'lookalikes': matches,
+            'seed_count': len(seed_ids),
+            'status': 'success'
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
 @subscribers_bp.route('/analytics', methods=['GET'])
 def get_subscriber_analytics():
     """Get subscriber analytics and insights"""
@@ -263,6 +658,15 @@ def get_subscriber_analytics():
             }
         }
         
+        # Replace mock trends with real per-month figures once events have been recorded
+        store = get_event_store()
+        if not store.is_empty():
+            monthly = store.monthly_aggregates(months=6)
+            analytics['recent_trends']['engagement_trend'] = [m['open_rate'] for m in monthly]
+            analytics['recent_trends']['churn_trend'] = [m['unsubscribe_rate'] for m in monthly]
+            analytics['recent_trends']['active_trend'] = [m['active_subscribers'] for m in monthly]
+            analytics['recent_trends']['periods'] = [m['period'] for m in monthly]
+        
         return jsonify({
             'analytics': analytics,
             'status': 'success'
@@ -0,0 +1,157 @@
+"""
+Webhook API Routes for PersonalizeAI Platform
+Manage webhook endpoints and the dead-letter queue
+"""
+
+import hmac
+import os
+import secrets
+
+from flask import Blueprint, request, jsonify
+from models.webhook import WebhookEndpoint, WebhookOutbox
+from services.webhooks import WEBHOOK_EVENTS, check_webhook_url, endpoint_cache, replay_dead_letters
+from main import db
+
+webhooks_bp = Blueprint('webhooks', __name__)
+
+ADMIN_TOKEN_HEADER = 'X-Admin-Token'
+
+# Accepted ranges for an endpoint's delivery limits
+ENDPOINT_LIMITS = {'max_batch_size': (50, 500), 'max_concurrency': (4, 32)}  # field -> (default, max)
+
+@webhooks_bp.before_request
+def require_admin_token():
+    """Endpoints receive signed event data and their URLs are fetched by the server: admin token only"""
+    token = os.getenv('WEBHOOK_ADMIN_TOKEN', '')
+    if not token:
+        return jsonify({'error': 'Webhook administration is disabled (WEBHOOK_ADMIN_TOKEN is not set)',
+                        'status': 'error'}), 404
+    supplied = request.headers.get(ADMIN_TOKEN_HEADER, '')
+    if not hmac.compare_digest(supplied, token):
+        return jsonify({'error': 'Invalid or missing admin token', 'status': 'error'}), 403
+    return None
+
+@webhooks_bp.route('/endpoints', methods=['GET'])
+def get_endpoints():
+    """List webhook endpoints with their queue depth"""
+    try:
+        endpoints = WebhookEndpoint.query.order_by(WebhookEndpoint.id).all()
+        depth = dict(db.session.query(WebhookOutbox.endpoint_id, db.func.count(WebhookOutbox.id)).filter(
+            WebhookOutbox.status.in_(['pending', 'delivering'])
+        ).group_by(WebhookOutbox.endpoint_id).all())
+        dead = dict(db.session.query(WebhookOutbox.endpoint_id, db.func.count(WebhookOutbox.id)).filter(
+            WebhookOutbox.status == 'dead'
+        ).group_by(WebhookOutbox.endpoint_id).all())
+
+        return jsonify({
+            'endpoints': [dict(e.to_dict(), queued=depth.get(e.id, 0), dead=dead.get(e.id, 0))
+                          for e in endpoints],
+            'status': 'success'
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@webhooks_bp.route('/endpoints', methods=['POST'])
+def create_endpoint():
+    """Register a webhook endpoint; the signing secret is only returned here"""
+    try:
+        data = request.get_json() or {}
+
+        try:
+            check_webhook_url(data.get('url'))
+        except ValueError as e:
+            return jsonify({'error': str(e), 'status': 'error'}), 400
+        event_types = data.get('event_types') or []
+        if not isinstance(event_types, list) or not all(isinstance(t, str) for t in event_types):
+            return jsonify({'error': 'event_types must be a list of event names', 'status': 'error'}), 400
+        unknown = sorted(set(event_types) - set(WEBHOOK_EVENTS))
+        if unknown:
+            return jsonify({'error': f'Unknown event types: {", ".join(unknown)}', 'status': 'error'}), 400
+        limits = {}
+        for field, (default, maximum) in ENDPOINT_LIMITS.items():
+            value = data.get(field, default)
+            if isinstance(value, bool) or not isinstance(value, int) or not 1 <= value <= maximum:
+                return jsonify({'error': f'{field} must be an integer from 1 to {maximum}', 'status': 'error'}), 400
+            limits[field] = value
+
+        endpoint = WebhookEndpoint(
+            url=data['url'],
+            secret=data.get('secret') or secrets.token_hex(24),
+            event_types=event_types or None,
+            max_batch_size=limits['max_batch_size'],
+            max_concurrency=limits['max_concurrency'],
+            description=data.get('description')
+        )
+        db.session.add(endpoint)
+        db.session.commit()
+        endpoint_cache.invalidate()
+
+        return jsonify({
+            'endpoint': dict(endpoint.to_dict(), secret=endpoint.secret),
+            'status': 'success'
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@webhooks_bp.route('/endpoints/<int:endpoint_id>', methods=['DELETE'])
+def delete_endpoint(endpoint_id):
+    """Deactivate an endpoint; queued events for it are no longer delivered"""
+    try:
+        endpoint = WebhookEndpoint.query.get_or_404(endpoint_id)
+        endpoint.is_active = False
+        db.session.commit()
+        endpoint_cache.invalidate()
+
+        return jsonify({
+            'message': 'Webhook endpoint deactivated',
+            'status': 'success'
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@webhooks_bp.route('/dead-letters', methods=['GET'])
+def get_dead_letters():
+    """Events that exhausted their delivery attempts"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 50, type=int), 500)
+        endpoint_id = request.args.get('endpoint_id', type=int)
+
+        query = WebhookOutbox.query.filter(WebhookOutbox.status == 'dead')
+        if endpoint_id:
+            query = query.filter(WebhookOutbox.endpoint_id == endpoint_id)
+        paginated = query.order_by(WebhookOutbox.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
+
+        return jsonify({
+            'dead_letters': [row.to_dict() for row in paginated.items],
+            'total': paginated.total,
+            'page': page,
+            'per_page': per_page,
+            'status': 'success'
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@webhooks_bp.route('/dead-letters/replay', methods=['POST'])
+def replay():
+    """Queue dead-lettered events again (all, by endpoint, or by id)"""
+    try:
+        data = request.get_json() or {}
+        if not data.get('ids') and not data.get('endpoint_id') and not data.get('all'):
+            return jsonify({'error': 'Pass ids, endpoint_id or "all": true', 'status': 'error'}), 400
+
+        replayed = replay_dead_letters(endpoint_id=data.get('endpoint_id'), ids=data.get('ids'))
+        return jsonify({
+            'replayed': replayed,
+            'status': 'success'
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'status': 'error'}), 500
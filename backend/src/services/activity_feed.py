@@ -0,0 +1,169 @@
+"""
+Activity Feed for PersonalizeAI Platform
+Bounded in-memory ring buffer of recent activity, backed by the activity_events table
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Import db from main app
+from main import db
+
+PENDING_KEY = 'activity_feed_pending'
+
+
+def time_ago(created_at, now=None):
+    """Humanize a timestamp the way the dashboard displays it ("2 minutes ago")"""
+    if not created_at:
+        return None
+    seconds = int(((now or datetime.utcnow()) - created_at).total_seconds())
+    for unit, size in (('day', 86400), ('hour', 3600), ('minute', 60)):
+        if seconds >= size:
+            count = seconds // size
+            return f"{count} {unit}{'s' if count != 1 else ''} ago"
+    return 'just now'
+
+
+class ActivityFeed:
+    """
+    Ring buffer of the most recent activity events, ordered by id.
+
+    Rows are written in the caller's transaction and enter the buffer only
+    when that transaction commits. Events committed by other worker
+    processes are picked up by sync(), which reads anything newer than the
+    buffer's head from the table at most once per sync_interval.
+    """
+
+    def __init__(self, capacity=1000, sync_interval=1.0):
+        self.capacity = capacity
+        self.sync_interval = sync_interval
+        self._buffer = deque(maxlen=capacity)
+        self._ids = set()
+        self._condition = threading.Condition()
+        self._last_sync = 0.0
+        self._loaded = False
+
+    @property
+    def head(self):
+        """Id of the newest buffered event (0 if empty)"""
+        return self._buffer[-1]['id'] if self._buffer else 0
+
+    def _push(self, entries):
+        with self._condition:
+            for entry in sorted(entries, key=lambda e: e['id']):
+                if entry['id'] in self._ids:
+                    continue
+                if len(self._buffer) == self._buffer.maxlen:
+                    self._ids.discard(self._buffer[0]['id'])
+                if self._buffer and entry['id'] < self._buffer[-1]['id']:
+                    # Late commit from another worker: keep the buffer sorted by id
+                    items = sorted(list(self._buffer) + [entry], key=lambda e: e['id'])
+                    self._buffer = deque(items[-self.capacity:], maxlen=self.capacity)
+                    self._ids = {e['id'] for e in self._buffer}
+                else:
+                    self._buffer.append(entry)
+                    self._ids.add(entry['id'])
+            self._condition.notify_all()
+
+    def record(self, event_type, action, **details):
+        """Add an activity event to the current transaction; it is published on commit"""
+        from models.activity import ActivityEvent
+
+        activity = ActivityEvent(event_type=event_type, action=action, details=details or None,
+                                 created_at=datetime.utcnow())
+        db.session.add(activity)
+        return activity
+
+    def sync(self, force=False):
+        """Pull events committed by other workers into the buffer"""
+        from models.activity import ActivityEvent
+
+        now = time.monotonic()
+        if not force and now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+
+        query = ActivityEvent.query
+        if self._loaded:
+            # Look a little behind the head so late commits from other workers are not skipped
+            query = query.filter(ActivityEvent.id > max(self.head - self.capacity // 10, 0))
+        rows = query.order_by(ActivityEvent.id.desc()).limit(self.capacity).all()
+        self._loaded = True
+        self._push([row.to_dict() for row in rows])
+
+    def since(self, cursor=0, limit=50):
+        """Events newer than `cursor`, oldest first; falls back to the table if the cursor is too old"""
+        from models.activity import ActivityEvent
+
+        self.sync()
+        with self._condition:
+            buffered = list(self._buffer)
+        if buffered and cursor < buffered[0]['id'] - 1 and len(buffered) == self.capacity:
+            rows = ActivityEvent.query.filter(ActivityEvent.id > cursor).order_by(
+                ActivityEvent.id
+            ).limit(limit).all()
+            entries = [row.to_dict() for row in rows]
+        else:
+            entries = [e for e in buffered if e['id'] > cursor][:limit]
+        return [self._present(e) for e in entries]
+
+    def latest(self, limit=10):
+        """The most recent events, newest first"""
+        self.sync()
+        with self._condition:
+            entries = list(self._buffer)[-limit:]
+        return [self._present(e) for e in reversed(entries)]
+
+    def wait(self, cursor, timeout):
+        """Block until an event newer than `cursor` is buffered locally, or the timeout passes"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.head > cursor, timeout=timeout)
+
+    @staticmethod
+    def _present(entry):
+        entry = dict(entry)
+        created_at = entry.get('created_at')
+        entry['time'] = time_ago(datetime.fromisoformat(created_at)) if created_at else None
+        return entry
+
+    def prune(self, keep_days=30):
+        """Delete persisted events older than keep_days"""
+        from models.activity import ActivityEvent
+
+        cutoff = datetime.utcnow() - timedelta(days=keep_days)
+        deleted = ActivityEvent.query.filter(ActivityEvent.created_at < cutoff).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+        return deleted
+
+
+# Shared feed for this worker process
+activity_feed = ActivityFeed()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_activity(session, flush_context):
+    from models.activity import ActivityEvent
+
+    pending = session.info.setdefault(PENDING_KEY, [])
+    for obj in session.new:
+        if isinstance(obj, ActivityEvent):
+            pending.append(obj.to_dict())
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_committed_activity(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending:
+        activity_feed._push(pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back_activity(session):
+    session.info.pop(PENDING_KEY, None)
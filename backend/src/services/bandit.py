@@ -0,0 +1,349 @@
+"""
+Adaptive Traffic Allocation for PersonalizeAI Platform
+Thompson-sampling bandit that shifts A/B test traffic towards winning variants
+"""
+
+import bisect
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from services.hashing import stable_hash
+
+# Import db from main app
+from main import db
+
+# Posterior draws used to estimate each variant's probability of being best
+ALLOCATION_DRAWS = 10000
+
+# Sticky assignments cached per test and worker (least recently used are evicted)
+MAX_EXPOSURES = int(os.getenv('BANDIT_MAX_EXPOSURES', 100000))
+
+# Assignment rows per INSERT / read-back when persisting
+ASSIGNMENT_BATCH_SIZE = 1000
+
+
+def _insert_ignoring_conflicts(table, dialect):
+    """INSERT that skips rows violating the (ab_test_id, subscriber_id) unique constraint"""
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return insert(table).prefix_with('IGNORE')  # MySQL
+    return dialect_insert(table).on_conflict_do_nothing(index_elements=['ab_test_id', 'subscriber_id'])
+
+
+class VariantPosterior:
+    """Beta posterior for a single variant's success rate"""
+
+    __slots__ = ('trials', 'successes', 'pending_trials', 'pending_successes')
+
+    def __init__(self, trials=0, successes=0):
+        self.trials = trials
+        self.successes = successes
+        # Updates not yet persisted to the database
+        self.pending_trials = 0
+        self.pending_successes = 0
+
+    @property
+    def alpha(self):
+        return 1 + self.successes
+
+    @property
+    def beta(self):
+        return 1 + max(self.trials - self.successes, 0)
+
+    @property
+    def mean(self):
+        return self.alpha / (self.alpha + self.beta)
+
+
+class BanditState:
+    """In-memory posteriors and sticky assignments for one A/B test"""
+
+    def __init__(self, test_id, labels, max_exposures=MAX_EXPOSURES):
+        self.test_id = test_id
+        self.labels = list(labels)
+        self.posteriors = {label: VariantPosterior() for label in self.labels}
+        self.cumulative = []  # Cumulative probability of each variant being best
+        self.exposures = OrderedDict()  # subscriber_id -> variant label, least recently used first
+        self.max_exposures = max_exposures
+        self.pending_assignments = {}  # subscriber_id -> (variant, assigned_at), not yet stored
+        self.last_persisted = time.monotonic()
+        self.pending_updates = 0
+        self.lock = threading.Lock()
+        self.update_allocation()
+
+    def load(self, persisted):
+        """Restore counts from the JSON blob stored on the ABTest row"""
+        for label, counts in (persisted or {}).get('variants', {}).items():
+            if label in self.posteriors:
+                posterior = self.posteriors[label]
+                posterior.trials = counts.get('trials', 0) + posterior.pending_trials
+                posterior.successes = counts.get('successes', 0) + posterior.pending_successes
+        self.update_allocation()
+
+    def update_allocation(self):
+        """
+        Recompute each variant's probability of being best from the posteriors.
+
+        The draws are seeded per test, so workers holding the same counts
+        (right after a merge) split traffic identically.
+        """
+        alphas = [self.posteriors[label].alpha for label in self.labels]
+        betas = [self.posteriors[label].beta for label in self.labels]
+        rng = np.random.default_rng(stable_hash('bandit', self.test_id))
+        draws = rng.beta(alphas, betas, size=(ALLOCATION_DRAWS, len(self.labels)))
+        wins = np.bincount(draws.argmax(axis=1), minlength=len(self.labels))
+        self.cumulative = np.cumsum(wins / ALLOCATION_DRAWS).tolist()
+
+    def choose(self, subscriber_id):
+        """Hash the subscriber into the cumulative allocation (Thompson sampling by probability matching)"""
+        bucket = (stable_hash(self.test_id, subscriber_id) % 10000) / 10000
+        return self.labels[min(bisect.bisect_right(self.cumulative, bucket), len(self.labels) - 1)]
+
+    def remember(self, subscriber_id, variant):
+        """Cache an assignment, evicting the least recently used beyond max_exposures"""
+        self.exposures[subscriber_id] = variant
+        self.exposures.move_to_end(subscriber_id)
+        while len(self.exposures) > self.max_exposures:
+            self.exposures.popitem(last=False)
+
+    def snapshot(self):
+        """Serialize posterior counts for persistence"""
+        return {
+            'variants': {
+                label: {
+                    'trials': p.trials,
+                    'successes': p.successes,
+                    'alpha': p.alpha,
+                    'beta': p.beta,
+                    'mean': round(p.mean, 6)
+                }
+                for label, p in self.posteriors.items()
+            }
+        }
+
+
+class ThompsonSamplingAllocator:
+    """
+    Process-wide Thompson-sampling allocator.
+
+    Posteriors live in memory and are updated as sends, opens and clicks
+    arrive. Each worker accumulates deltas and periodically merges them into
+    ABTest.bandit_state under a row lock, on a connection of its own so the
+    caller's transaction is never committed early; the merge also picks up
+    the other workers' counts.
+
+    Assignment needs no database access: a subscriber is hashed into the
+    variants' probabilities of being best, which only change when a merge
+    loads new counts, and the result is cached in a bounded LRU. New
+    assignments are written to ab_test_assignments in batches with each
+    merge; where another worker stored a different variant first, the stored
+    one replaces the cached one. A subscriber evicted from the cache, or
+    first seen by another worker since the last merge, is hashed again and
+    keeps their variant unless the allocation has moved past their bucket.
+    """
+
+    def __init__(self, persist_interval=30.0, persist_every=500, max_exposures=MAX_EXPOSURES):
+        self.persist_interval = persist_interval
+        self.persist_every = persist_every
+        self.max_exposures = max_exposures
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _state_for(self, test):
+        state = self._states.get(test.id)
+        if state is not None:
+            return state
+        with self._lock:
+            state = self._states.get(test.id)
+            if state is None:
+                state = BanditState(test.id, test.variant_labels(), self.max_exposures)
+                state.load(test.bandit_state)
+                self._states[test.id] = state
+        return state
+
+    def assign(self, test, subscriber_id):
+        """Assign a variant to a subscriber; repeat calls return the same variant"""
+        state = self._state_for(test)
+        with state.lock:
+            variant = state.exposures.get(subscriber_id)
+            if variant is not None:
+                state.exposures.move_to_end(subscriber_id)
+                return variant
+            variant = state.choose(subscriber_id)
+            state.remember(subscriber_id, variant)
+            state.pending_assignments[subscriber_id] = (variant, datetime.utcnow())
+            due = (len(state.pending_assignments) >= self.persist_every or
+                   time.monotonic() - state.last_persisted >= self.persist_interval)
+        if due:
+            self._persist_logged(test)  # Also refreshes the allocation with other workers' counts
+        return variant
+
+    def record_send(self, test, variant):
+        """Count a send (one trial) for a variant"""
+        self._update(test, variant, trials=1, successes=0)
+
+    def record_success(self, test, variant):
+        """Count a success (open/click/conversion, per the test's target metric)"""
+        self._update(test, variant, trials=0, successes=1)
+
+    def _update(self, test, variant, trials, successes):
+        state = self._state_for(test)
+        posterior = state.posteriors.get(variant)
+        if posterior is None:
+            return
+        with state.lock:
+            posterior.trials += trials
+            posterior.successes += successes
+            posterior.pending_trials += trials
+            posterior.pending_successes += successes
+            state.pending_updates += 1
+            due = (state.pending_updates >= self.persist_every or
+                   time.monotonic() - state.last_persisted >= self.persist_interval)
+        if due:
+            self._persist_logged(test)
+
+    def _persist_logged(self, test):
+        """Persist, logging failures: the deltas and assignments were kept and the next merge retries them"""
+        try:
+            self.persist(test)
+        except Exception as e:
+            current_app.logger.warning('Could not persist bandit state for A/B test %s: %s', test.id, e)
+
+    def _take_deltas(self, state):
+        with state.lock:
+            deltas = {
+                label: (p.pending_trials, p.pending_successes)
+                for label, p in state.posteriors.items()
+            }
+            for p in state.posteriors.values():
+                p.pending_trials = 0
+                p.pending_successes = 0
+            assignments, state.pending_assignments = state.pending_assignments, {}
+            state.pending_updates = 0
+            state.last_persisted = time.monotonic()
+        return deltas, assignments
+
+    def _restore_deltas(self, state, deltas, assignments):
+        """Put deltas and assignments back after a failed merge so they are retried next time"""
+        with state.lock:
+            for label, (trials, successes) in deltas.items():
+                state.posteriors[label].pending_trials += trials
+                state.posteriors[label].pending_successes += successes
+                state.pending_updates += 1
+            for subscriber_id, assignment in assignments.items():
+                state.pending_assignments.setdefault(subscriber_id, assignment)
+
+    @staticmethod
+    def _store_assignments(executor, test_id, assignments):
+        """
+        Insert new assignments in batches, keeping rows another worker stored
+        first; returns {subscriber_id: stored variant} for every one of them
+        """
+        from models.personalization import ABTestAssignment
+
+        if not assignments:
+            return {}
+        table = ABTestAssignment.__table__
+        statement = _insert_ignoring_conflicts(table, db.engine.dialect.name)
+        subscriber_ids = list(assignments)
+        stored = {}
+        for i in range(0, len(subscriber_ids), ASSIGNMENT_BATCH_SIZE):
+            chunk = subscriber_ids[i:i + ASSIGNMENT_BATCH_SIZE]
+            executor.execute(statement, [
+                {'ab_test_id': test_id, 'subscriber_id': subscriber_id,
+                 'variant': assignments[subscriber_id][0], 'assigned_at': assignments[subscriber_id][1]}
+                for subscriber_id in chunk
+            ])
+            stored.update(executor.execute(
+                select(table.c.subscriber_id, table.c.variant).where(
+                    table.c.ab_test_id == test_id, table.c.subscriber_id.in_(chunk)
+                )
+            ).all())
+        return stored
+
+    @staticmethod
+    def _adopt_stored(state, assignments, stored):
+        """Replace cached variants that lost to an assignment another worker stored first"""
+        with state.lock:
+            for subscriber_id, variant in stored.items():
+                if variant != assignments[subscriber_id][0] and subscriber_id in state.exposures:
+                    state.exposures[subscriber_id] = variant
+
+    @staticmethod
+    def _load_merged(state, stored, deltas):
+        """Add deltas to the stored counts, load the result into memory and return its snapshot"""
+        variants = dict((stored or {}).get('variants', {}))
+        for label, (trials, successes) in deltas.items():
+            counts = variants.get(label, {})
+            variants[label] = {
+                'trials': counts.get('trials', 0) + trials,
+                'successes': counts.get('successes', 0) + successes
+            }
+        with state.lock:
+            state.load({'variants': variants})
+            return state.snapshot()
+
+    def persist(self, test, in_transaction=False):
+        """
+        Merge this worker's pending deltas into ABTest.bandit_state and
+        store its new assignments.
+
+        By default the merge runs and commits on its own connection, holding
+        the row lock (SELECT ... FOR UPDATE) only for the merge. With
+        in_transaction=True it runs in the caller's session and is committed
+        by the caller (used when completing a test).
+        """
+        from models.personalization import ABTest
+
+        state = self._states.get(test.id)
+        if state is None:
+            return None
+
+        deltas, assignments = self._take_deltas(state)
+        locked = select(ABTest.bandit_state).where(ABTest.id == test.id).with_for_update()
+        try:
+            if in_transaction:
+                snapshot = self._load_merged(state, db.session.execute(locked).scalar(), deltas)
+                test.bandit_state = snapshot
+                stored = self._store_assignments(db.session, test.id, assignments)
+            else:
+                with db.engine.begin() as connection:
+                    snapshot = self._load_merged(state, connection.execute(locked).scalar(), deltas)
+                    connection.execute(update(ABTest).where(ABTest.id == test.id).values(bandit_state=snapshot))
+                    stored = self._store_assignments(connection, test.id, assignments)
+                # Already committed: update the loaded object without marking it dirty
+                set_committed_value(test, 'bandit_state', snapshot)
+        except Exception:
+            self._restore_deltas(state, deltas, assignments)
+            raise
+        self._adopt_stored(state, assignments, stored)
+        return snapshot
+
+    def flush_all(self):
+        """Persist pending deltas for every test tracked by this worker"""
+        from models.personalization import ABTest
+
+        for test_id in list(self._states):
+            test = db.session.get(ABTest, test_id)
+            if test is not None:
+                self.persist(test)
+
+    def forget(self, test_id):
+        """Drop in-memory state for a test (e.g. once it completes)"""
+        with self._lock:
+            self._states.pop(test_id, None)
+
+
+# Shared allocator for this worker process
+allocator = ThompsonSamplingAllocator()
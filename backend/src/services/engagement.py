@@ -0,0 +1,99 @@
+"""
+Engagement Backfill for PersonalizeAI Platform
+Seeds decayed engagement for subscribers that predate decayed scoring
+"""
+
+import numpy as np
+import pandas as pd
+
+# Import db from main app
+from main import db
+
+EVENT_COLUMNS = {'opened': 'opened_at', 'clicked': 'clicked_at', 'converted': 'converted_at'}
+HISTORY_COLUMNS = ['subscriber_id'] + list(EVENT_COLUMNS.values())
+
+
+def _fold_events(history, frame):
+    """
+    Add a frame of results to per-subscriber decayed engagement.
+
+    history has one row per subscriber: `weight`, its decayed value as of
+    `at`, its latest event. Both the frame's events and the history rows are
+    decayed to each subscriber's latest time and summed, so frames can come
+    in any order (opens and clicks land after the result's month).
+    """
+    from models.subscriber import ENGAGEMENT_DECAY_RATE, ENGAGEMENT_EVENT_WEIGHTS
+
+    parts = [history]
+    for event_type, column in EVENT_COLUMNS.items():
+        present = frame[frame[column].notna()]
+        parts.append(pd.DataFrame({'subscriber_id': present['subscriber_id'].astype('int64'),
+                                   'at': pd.to_datetime(present[column]),
+                                   'weight': ENGAGEMENT_EVENT_WEIGHTS[event_type]}))
+    events = pd.concat([part for part in parts if len(part)] or [history], ignore_index=True)
+    if events.empty:
+        return history
+    latest = events.groupby('subscriber_id')['at'].transform('max')
+    events['weight'] = events['weight'] * np.exp(-ENGAGEMENT_DECAY_RATE * (latest - events['at']).dt.total_seconds())
+    return events.groupby('subscriber_id').agg(weight=('weight', 'sum'), at=('at', 'max')).reset_index()
+
+
+def _decayed_history(frames):
+    """{subscriber_id: (value, as_of)} over result frames from any tier"""
+    history = pd.DataFrame({'subscriber_id': pd.Series(dtype='int64'), 'at': pd.Series(dtype='datetime64[ns]'),
+                            'weight': pd.Series(dtype='float64')})
+    for frame in frames:
+        history = _fold_events(history, frame)
+    return {int(subscriber_id): (float(weight), at.to_pydatetime())
+            for subscriber_id, weight, at in zip(history['subscriber_id'], history['weight'], history['at'])}
+
+
+def _seed_session(session, chunk_size, force, history):
+    from models.subscriber import Subscriber
+
+    seeded, last_id = 0, 0
+    while True:
+        query = session.query(Subscriber).filter(Subscriber.id > last_id)
+        if not force:
+            query = query.filter(Subscriber.decayed_engagement_at.is_(None))
+        subscribers = query.order_by(Subscriber.id).limit(chunk_size).all()
+        if not subscribers:
+            return seeded
+
+        for subscriber in subscribers:
+            subscriber.seed_decayed_engagement(decayed=history.get(subscriber.id))
+        session.commit()
+        seeded += len(subscribers)
+        last_id = subscribers[-1].id
+
+
+def _hot_frames(session, chunk_size):
+    from models.personalization import PersonalizationResult
+
+    columns = [getattr(PersonalizationResult, column) for column in HISTORY_COLUMNS]
+    query = session.query(*columns).filter(db.or_(*(column.isnot(None) for column in columns[1:])))
+    return pd.read_sql(query.statement, session.connection(), chunksize=chunk_size * 100)
+
+
+def backfill_decayed_engagement(chunk_size=1000, force=False):
+    """
+    Rebuild decayed engagement from personalization result history.
+
+    Results are read one month at a time across the hot, warm and archived
+    tiers (ResultsRetention; with sharded storage, each shard's results
+    table). Only subscribers that have never had an engagement event applied
+    are seeded unless force=True. Subscribers without result history are
+    seeded from their open and click totals. Returns the number of
+    subscribers seeded.
+    """
+    from services.retention import ResultsRetention
+    from services.sharding import get_shard_router
+
+    router = get_shard_router()
+    if router:
+        # Retention tiers are single-database only: shards keep every result hot
+        return sum(router.fan_out(lambda session, shard: _seed_session(
+            session, chunk_size, force, _decayed_history(_hot_frames(session, chunk_size))
+        )))
+    months = ResultsRetention().iter_months(columns=HISTORY_COLUMNS)
+    return _seed_session(db.session, chunk_size, force, _decayed_history(frame for _, frame in months))
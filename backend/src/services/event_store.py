@@ -0,0 +1,399 @@
+"""
+Engagement Event Store for PersonalizeAI Platform
+Append-only, month-partitioned columnar storage for send/open/click events
+"""
+
+import fcntl
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+# Event type codes stored in the event_type column
+EVENT_TYPES = {
+    'sent': 0,
+    'opened': 1,
+    'clicked': 2,
+    'converted': 3,
+    'unsubscribed': 4
+}
+
+# Column name -> numpy dtype; every segment stores one file per column
+COLUMNS = {
+    'subscriber_id': np.dtype('<i8'),
+    'ts': np.dtype('<i8'),  # epoch seconds, UTC
+    'event_type': np.dtype('u1'),
+    'result_id': np.dtype('<i8')  # PersonalizationResult id, -1 if none
+}
+
+ACTIVE_SEGMENT = 'active'
+COMPACTION_JOURNAL = '.compaction'
+
+
+def _epoch(value):
+    """Convert a naive UTC datetime (or epoch number) to epoch seconds"""
+    if value is None:
+        return int(time.time())
+    if isinstance(value, datetime):
+        return int((value - datetime(1970, 1, 1)).total_seconds())
+    return int(value)
+
+
+def _month_start(year, month):
+    return _epoch(datetime(year, month, 1))
+
+
+def _add_months(year, month, delta):
+    index = year * 12 + (month - 1) + delta
+    return index // 12, index % 12 + 1
+
+
+class EngagementEventStore:
+    """
+    Columnar event log on local disk.
+
+    Layout: <root>/<YYYY-MM>/<segment>/<column>.bin. New events are appended
+    to the partition's 'active' segment; compaction merges every segment of a
+    partition into a single ts-sorted segment so range scans can binary search.
+    Reads memory-map the column files and aggregate with numpy.
+
+    Crash safety: a torn append (some columns written, others not) is cut
+    back to the last complete row before the next append, so columns stay
+    aligned. Compaction records the segments it replaces in a journal before
+    swapping in the merged one; an interrupted compaction is rolled forward
+    or back the next time the partition is written.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Locking / layout helpers
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _partition_lock(self, partition, exclusive):
+        path = os.path.join(self.root, partition)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield path
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def partitions(self):
+        """Sorted list of partition names (YYYY-MM)"""
+        return sorted(
+            name for name in os.listdir(self.root)
+            if len(name) == 7 and name[4] == '-' and os.path.isdir(os.path.join(self.root, name))
+        )
+
+    @staticmethod
+    def _read_journal(partition_path):
+        try:
+            with open(os.path.join(partition_path, COMPACTION_JOURNAL)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @classmethod
+    def _segments(cls, partition_path):
+        names = sorted(
+            name for name in os.listdir(partition_path)
+            if not name.startswith('.') and os.path.isdir(os.path.join(partition_path, name))
+        )
+        journal = cls._read_journal(partition_path)
+        if journal and journal['new'] in names:
+            # Compaction swapped in its result but did not finish removing the inputs
+            names = [name for name in names if name not in journal['replaced']]
+        return names
+
+    @classmethod
+    def _recover(cls, partition_path):
+        """Finish or undo an interrupted compaction (caller holds the exclusive lock)"""
+        journal_path = os.path.join(partition_path, COMPACTION_JOURNAL)
+        if not os.path.exists(journal_path):
+            return
+        journal = cls._read_journal(partition_path)
+        if journal and os.path.isdir(os.path.join(partition_path, journal['new'])):
+            for segment in journal['replaced']:
+                shutil.rmtree(os.path.join(partition_path, segment), ignore_errors=True)
+        elif journal:
+            shutil.rmtree(os.path.join(partition_path, f".tmp-{journal['new']}"), ignore_errors=True)
+        os.remove(journal_path)
+
+    @staticmethod
+    def _repair_torn_append(segment_path):
+        """Truncate every column to the number of complete rows (caller holds the exclusive lock)"""
+        sizes = {}
+        for column, dtype in COLUMNS.items():
+            path = os.path.join(segment_path, f'{column}.bin')
+            sizes[column] = os.path.getsize(path) if os.path.exists(path) else 0
+        rows = min(size // COLUMNS[column].itemsize for column, size in sizes.items())
+        for column, size in sizes.items():
+            if size != rows * COLUMNS[column].itemsize:
+                with open(os.path.join(segment_path, f'{column}.bin'), 'ab') as f:
+                    f.truncate(rows * COLUMNS[column].itemsize)
+
+    @staticmethod
+    def _read_segment(segment_path):
+        """Memory-map a segment's columns, trimming any torn trailing append"""
+        lengths = []
+        for column, dtype in COLUMNS.items():
+            path = os.path.join(segment_path, f'{column}.bin')
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            lengths.append(size // dtype.itemsize)
+        rows = min(lengths)
+        data = {}
+        for column, dtype in COLUMNS.items():
+            if rows == 0:
+                data[column] = np.empty(0, dtype=dtype)
+            else:
+                data[column] = np.memmap(os.path.join(segment_path, f'{column}.bin'),
+                                         dtype=dtype, mode='r', shape=(rows,))
+        return data
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def append(self, subscriber_ids, timestamps, event_types, result_ids=None):
+        """
+        Append a batch of events.
+
+        `event_types` may be names ('opened') or codes; `timestamps` may be
+        datetimes or epoch seconds. Events are routed to their month partition.
+        """
+        subscriber_ids = np.asarray(subscriber_ids, dtype=COLUMNS['subscriber_id'])
+        ts = np.asarray(timestamps)
+        if ts.dtype.kind not in 'iu':
+            ts = np.asarray([_epoch(t) for t in timestamps])
+        ts = ts.astype(COLUMNS['ts'])
+        codes = np.asarray(event_types)
+        if codes.dtype.kind not in 'iu':
+            codes = np.asarray([EVENT_TYPES.get(e, e) for e in event_types])
+        codes = codes.astype(COLUMNS['event_type'])
+        if result_ids is None:
+            result_ids = np.full(len(subscriber_ids), -1, dtype=COLUMNS['result_id'])
+        else:
+            result_ids = np.asarray([-1 if r is None else r for r in result_ids],
+                                    dtype=COLUMNS['result_id'])
+
+        months = ts.astype('datetime64[s]').astype('datetime64[M]')
+        for month in np.unique(months):
+            mask = months == month
+            self._append_partition(str(month), {
+                'subscriber_id': subscriber_ids[mask],
+                'ts': ts[mask],
+                'event_type': codes[mask],
+                'result_id': result_ids[mask]
+            })
+        return len(subscriber_ids)
+
+    def record(self, subscriber_id, event_type, ts=None, result_id=None):
+        """Append a single event"""
+        return self.append([subscriber_id], [ts], [event_type], [result_id])
+
+    def _append_partition(self, partition, columns):
+        with self._partition_lock(partition, exclusive=True) as path:
+            self._recover(path)
+            segment_path = os.path.join(path, ACTIVE_SEGMENT)
+            os.makedirs(segment_path, exist_ok=True)
+            self._repair_torn_append(segment_path)
+            for column, values in columns.items():
+                with open(os.path.join(segment_path, f'{column}.bin'), 'ab') as f:
+                    f.write(np.ascontiguousarray(values).tobytes())
+
+    def compact(self, partition=None):
+        """Merge all segments of a partition (or every partition) into one ts-sorted segment"""
+        targets = [p for p in self.partitions() if partition in (None, p)]
+        compacted = 0
+        for name in targets:
+            with self._partition_lock(name, exclusive=True) as path:
+                self._recover(path)
+                segments = self._segments(path)
+                if not segments or (len(segments) == 1 and segments[0] != ACTIVE_SEGMENT):
+                    continue
+                self._replace_segments(path, segments, self._merge_segments(path, segments))
+                compacted += 1
+        return compacted
+
+    def delete_subscribers(self, subscriber_ids):
+        """
+        Remove every event of the given subscribers; partitions holding any of
+        them are rewritten as one compacted segment. Returns the number removed.
+        """
+        wanted = np.asarray(sorted({int(i) for i in subscriber_ids}), dtype='<i8')
+        removed = 0
+        if not len(wanted):
+            return removed
+        for name in self.partitions():
+            with self._partition_lock(name, exclusive=True) as path:
+                self._recover(path)
+                segments = self._segments(path)
+                merged = self._merge_segments(path, segments)
+                matches = np.isin(merged['subscriber_id'], wanted)
+                if not matches.any():
+                    continue
+                self._replace_segments(path, segments, {c: v[~matches] for c, v in merged.items()})
+                removed += int(matches.sum())
+        return removed
+
+    def _merge_segments(self, path, segments):
+        """Every row of the segments, sorted by ts"""
+        parts = [self._read_segment(os.path.join(path, s)) for s in segments]
+        merged = {c: np.concatenate([p[c] for p in parts]) if parts else np.empty(0, d)
+                  for c, d in COLUMNS.items()}
+        order = np.argsort(merged['ts'], kind='stable')
+        return {c: v[order] for c, v in merged.items()}
+
+    def _replace_segments(self, path, segments, columns):
+        """Swap in one new segment for `segments` through the compaction journal (caller holds the lock)"""
+        new_name = f'c{int(time.time() * 1000)}'
+        tmp_path = os.path.join(path, f'.tmp-{new_name}')
+        os.makedirs(tmp_path)
+        for column, values in columns.items():
+            values.tofile(os.path.join(tmp_path, f'{column}.bin'))
+
+        journal_path = os.path.join(path, COMPACTION_JOURNAL)
+        with open(journal_path + '.tmp', 'w') as f:
+            json.dump({'new': new_name, 'replaced': segments}, f)
+        os.replace(journal_path + '.tmp', journal_path)
+        os.rename(tmp_path, os.path.join(path, new_name))
+        self._recover(path)  # Removes the replaced segments and the journal
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def scan(self, start=None, end=None, subscriber_ids=None):
+        """
+        Return the columns of every event with start <= ts < end.
+
+        Compacted segments are sorted by ts and sliced with a binary search;
+        the active segment is filtered with a vectorized mask.
+        """
+        start_ts = _epoch(start) if start is not None else None
+        end_ts = _epoch(end) if end is not None else None
+        first = str(np.datetime64(start_ts, 's').astype('datetime64[M]')) if start_ts is not None else None
+        last = str(np.datetime64(end_ts - 1, 's').astype('datetime64[M]')) if end_ts is not None else None
+
+        chunks = {c: [] for c in COLUMNS}
+        for partition in self.partitions():
+            if (first and partition < first) or (last and partition > last):
+                continue
+            with self._partition_lock(partition, exclusive=False) as path:
+                segments = [(s, self._read_segment(os.path.join(path, s))) for s in self._segments(path)]
+            for name, data in segments:
+                ts = data['ts']
+                if name == ACTIVE_SEGMENT:
+                    mask = np.ones(len(ts), dtype=bool)
+                    if start_ts is not None:
+                        mask &= ts >= start_ts
+                    if end_ts is not None:
+                        mask &= ts < end_ts
+                    selection = mask
+                else:
+                    lo = np.searchsorted(ts, start_ts, 'left') if start_ts is not None else 0
+                    hi = np.searchsorted(ts, end_ts, 'left') if end_ts is not None else len(ts)
+                    selection = slice(lo, hi)
+                for column in COLUMNS:
+                    chunks[column].append(np.asarray(data[column][selection]))
+
+        result = {c: np.concatenate(v) if v else np.empty(0, COLUMNS[c]) for c, v in chunks.items()}
+        if subscriber_ids is not None:
+            keep = np.isin(result['subscriber_id'], np.asarray(list(subscriber_ids), dtype='<i8'))
+            result = {c: v[keep] for c, v in result.items()}
+        return result
+
+    def monthly_aggregates(self, months=6, now=None, subscriber_ids=None):
+        """
+        Per-month event counts, rates and active subscribers for the last `months` months.
+
+        Returns a list ordered oldest -> newest.
+        """
+        now = now or datetime.utcnow()
+        first_year, first_month = _add_months(now.year, now.month, -(months - 1))
+        boundaries = np.array(
+            [_month_start(*_add_months(first_year, first_month, i)) for i in range(months + 1)],
+            dtype='<i8'
+        )
+        events = self.scan(boundaries[0], boundaries[-1], subscriber_ids=subscriber_ids)
+
+        period = np.searchsorted(boundaries, events['ts'], side='right') - 1
+        counts = np.bincount(
+            period * len(EVENT_TYPES) + events['event_type'].astype('<i8'),
+            minlength=months * len(EVENT_TYPES)
+        ).reshape(months, len(EVENT_TYPES))
+
+        # Distinct subscribers per month: unique (period, subscriber) pairs
+        active = np.zeros(months, dtype='<i8')
+        if len(period):
+            stride = int(events['subscriber_id'].max()) + 1
+            if months * stride <= 64_000_000:
+                seen = np.zeros((months, stride), dtype=bool)
+                seen[period, events['subscriber_id']] = True
+                active = seen.sum(axis=1)
+            else:
+                pairs = np.unique(period * stride + events['subscriber_id'])
+                active = np.bincount(pairs // stride, minlength=months)
+
+        results = []
+        for i in range(months):
+            year, month = _add_months(first_year, first_month, i)
+            row = {name: int(counts[i, code]) for name, code in EVENT_TYPES.items()}
+            sent = row['sent']
+            row.update({
+                'period': f'{year:04d}-{month:02d}',
+                'active_subscribers': int(active[i]),
+                'open_rate': round(row['opened'] / sent * 100, 2) if sent else 0.0,
+                'click_rate': round(row['clicked'] / sent * 100, 2) if sent else 0.0,
+                'unsubscribe_rate': round(float(row['unsubscribed'] / active[i]) * 100, 2) if active[i] else 0.0
+            })
+            results.append(row)
+        return results
+
+    def is_empty(self):
+        return not self.partitions()
+
+    def backfill_from_results(self, batch_size=10000):
+        """
+        Seed the store from sent/opened/clicked timestamps on personalization
+        results, one month at a time across the hot, warm and archived tiers.
+        """
+        from services.retention import ResultsRetention
+        from services.sharding import require_unsharded
+
+        require_unsharded('Event store backfill')
+        total = 0
+        columns = ['id', 'subscriber_id', 'created_at', 'sent_at', 'opened_at', 'clicked_at']
+        for _, frame in ResultsRetention().iter_months(columns=columns):
+            for start in range(0, len(frame), batch_size):
+                batch = frame.iloc[start:start + batch_size]
+                subscriber_ids, timestamps, event_types, result_ids = [], [], [], []
+                for event_type, column in (('sent', 'sent_at'), ('opened', 'opened_at'), ('clicked', 'clicked_at')):
+                    present = batch[batch[column].notna()]
+                    subscriber_ids.extend(present['subscriber_id'].astype('int64').tolist())
+                    timestamps.extend(present[column].dt.to_pydatetime().tolist())
+                    event_types.extend([event_type] * len(present))
+                    result_ids.extend(present['id'].astype('int64').tolist())
+                if subscriber_ids:
+                    total += self.append(subscriber_ids, timestamps, event_types, result_ids)
+        return total
+
+
+_store = None
+
+
+def get_event_store():
+    """Process-wide event store rooted at EVENT_STORE_PATH"""
+    global _store
+    if _store is None:
+        _store = EngagementEventStore(os.getenv('EVENT_STORE_PATH', 'data/events'))
+    return _store
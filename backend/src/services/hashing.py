@@ -0,0 +1,27 @@
+"""
+Stable Hashing Helpers for PersonalizeAI Platform
+Process-independent hashes for deterministic assignment and routing
+"""
+
+import hashlib
+
+
+def stable_hash(*parts):
+    """Stable 64-bit hash of the given parts (unlike hash(), identical across processes)"""
+    key = ':'.join(str(part) for part in parts).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'big')
+
+
+def jump_hash(key, buckets):
+    """
+    Jump consistent hash (Lamping & Veach) of a 64-bit key into [0, buckets).
+
+    Growing from n to n + 1 buckets only moves about 1 / (n + 1) of the keys,
+    all of them into the new bucket.
+    """
+    bucket, j = -1, 0
+    while j < buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
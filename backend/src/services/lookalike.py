@@ -0,0 +1,240 @@
+"""
+Lookalike Search for PersonalizeAI Platform
+Nearest-neighbour index over encoded subscriber attributes
+"""
+
+import threading
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from services.sharding import require_unsharded
+from services.subscriber_events import BackgroundIndex, SubscriberChangeFeed, on_subscribers_changed
+from services.subscriber_features import load_features, iter_feature_chunks
+
+
+class LookalikeIndex:
+    """
+    BallTree over subscriber feature vectors, maintained incrementally.
+
+    The tree is built once from a streamed pass over the table. Afterwards,
+    changed or new subscribers are re-encoded into a small delta set that is
+    searched by brute force, and their stale tree entries are masked out.
+    The tree is rebuilt only when the delta grows past rebuild_ratio, on the
+    `background` BackgroundIndex's thread when one is given; queries keep
+    using the old tree and the delta until the new tree is swapped in.
+    Writes from other worker processes are picked up from the table by a
+    SubscriberChangeFeed.
+    """
+
+    def __init__(self, rebuild_ratio=0.1, max_delta=5000, leaf_size=40, changes=None, background=None):
+        self.rebuild_ratio = rebuild_ratio
+        self.max_delta = max_delta
+        self.leaf_size = leaf_size
+        self.changes = changes or SubscriberChangeFeed()
+        self.background = background
+        self._lock = threading.RLock()
+        self._tree = None
+        self._tree_ids = np.empty(0, dtype=np.int64)
+        self._tree_vectors = None
+        self._stale = set()  # tree ids superseded by the delta or deleted
+        self._delta = {}  # subscriber_id -> vector
+        self._dirty = set()  # changed ids not yet re-encoded
+        self._deleted = set()
+        self._changed_during_rebuild = None  # ids changed since a running rebuild took its snapshot
+
+    @property
+    def size(self):
+        return len(self._tree_ids) - len(self._stale) + len(self._delta)
+
+    def build(self, chunk_size=10000):
+        """Full rebuild from the subscribers table"""
+        self.changes.reset()
+        ids, chunks = [], []
+        for chunk_ids, chunk_vectors in iter_feature_chunks(chunk_size):
+            ids.append(chunk_ids)
+            chunks.append(chunk_vectors)
+        tree_ids = np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+        vectors = np.vstack(chunks) if chunks else None
+
+        with self._lock:
+            self._tree_ids = tree_ids
+            self._tree_vectors = vectors
+            self._tree = BallTree(vectors, leaf_size=self.leaf_size) if vectors is not None else None
+            self._stale.clear()
+            self._delta.clear()
+            self._dirty.clear()
+            self._deleted.clear()
+
+    def mark_changed(self, subscriber_ids, action='updated'):
+        """Queue subscribers for re-encoding (called on every subscriber write)"""
+        with self._lock:
+            if action == 'deleted':
+                self._deleted.update(subscriber_ids)
+                self._dirty.difference_update(subscriber_ids)
+                for subscriber_id in subscriber_ids:
+                    self._delta.pop(subscriber_id, None)
+            else:
+                self._dirty.update(subscriber_ids)
+
+    def _live_ids(self):
+        with self._lock:
+            stale = np.fromiter(self._stale, dtype=np.int64, count=len(self._stale))
+            return self._tree_ids[~np.isin(self._tree_ids, stale)].tolist() + list(self._delta)
+
+    def _apply_changes(self):
+        """Fold writes from this and other processes into the index"""
+        changed = self.changes.poll()
+        if changed:
+            self.mark_changed(changed)
+        self._apply_pending()
+        if changed is not None:
+            missing, deleted = self.changes.reconcile(self.size, self._live_ids)
+            if missing or deleted:
+                self.mark_changed(missing)
+                self.mark_changed(deleted, 'deleted')
+                self._apply_pending()
+
+    def _apply_pending(self):
+        """Re-encode dirty subscribers in one query and fold them into the delta"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            deleted, self._deleted = self._deleted, set()
+        if dirty:
+            ids, vectors = load_features(dirty)
+            with self._lock:
+                for subscriber_id, vector in zip(ids.tolist(), vectors):
+                    self._delta[subscriber_id] = vector
+                for subscriber_id in dirty.difference(ids.tolist()):
+                    self._delta.pop(subscriber_id, None)  # Deleted before it was re-encoded
+        with self._lock:
+            changed = np.fromiter(dirty | deleted, dtype=np.int64, count=len(dirty | deleted))
+            self._stale.update(self._tree_ids[np.isin(self._tree_ids, changed)].tolist())
+            if self._changed_during_rebuild is not None:
+                self._changed_during_rebuild.update(dirty | deleted)
+            limit = min(self.rebuild_ratio * max(len(self._tree_ids), 1), self.max_delta)
+            needs_rebuild = (self._tree is None and self._delta) or len(self._delta) > limit
+        if needs_rebuild:
+            if self.background is not None:
+                self.background.run(self._rebuild_from_memory)
+            else:
+                self._rebuild_from_memory()
+
+    def _rebuild_from_memory(self):
+        """Merge the delta into a fresh tree without re-reading the table"""
+        with self._lock:
+            keep = ~np.isin(self._tree_ids, np.fromiter(self._stale, dtype=np.int64, count=len(self._stale)))
+            parts_ids = [self._tree_ids[keep]]
+            parts_vectors = [self._tree_vectors[keep]] if self._tree_vectors is not None else []
+            delta = dict(self._delta)
+            if delta:
+                parts_ids.append(np.fromiter(delta.keys(), dtype=np.int64, count=len(delta)))
+                parts_vectors.append(np.vstack(list(delta.values())))
+            self._changed_during_rebuild = set()
+
+        # The tree is built outside the lock, so queries are served meanwhile
+        tree_ids = np.concatenate(parts_ids)
+        tree_vectors = np.vstack(parts_vectors) if parts_vectors else None
+        tree = (BallTree(tree_vectors, leaf_size=self.leaf_size)
+                if tree_vectors is not None and len(tree_vectors) else None)
+
+        with self._lock:
+            # Subscribers changed during the build keep their delta entry and shadow their new tree entry
+            changed, self._changed_during_rebuild = self._changed_during_rebuild, None
+            changed_ids = np.fromiter(changed, dtype=np.int64, count=len(changed))
+            self._tree_ids, self._tree_vectors, self._tree = tree_ids, tree_vectors, tree
+            self._stale = set(tree_ids[np.isin(tree_ids, changed_ids)].tolist())
+            self._delta = {i: v for i, v in self._delta.items() if i not in delta or i in changed}
+
+    def vectors_for(self, subscriber_ids):
+        """Current vectors for the given ids (ids not in the index are skipped)"""
+        self._apply_changes()
+        with self._lock:
+            wanted = set(subscriber_ids)
+            found = {i: v for i, v in self._delta.items() if i in wanted}
+            if self._tree_ids.size:
+                positions = np.nonzero(np.isin(self._tree_ids, list(wanted - set(found))))[0]
+                for position in positions:
+                    subscriber_id = int(self._tree_ids[position])
+                    if subscriber_id not in self._stale:
+                        found[subscriber_id] = self._tree_vectors[position]
+        ids = list(found)
+        return ids, (np.vstack([found[i] for i in ids]) if ids else None)
+
+    def query(self, seed_ids, k=50):
+        """
+        Top-k subscribers most similar to the seed set (seeds excluded).
+
+        Every seed's neighbourhood is searched in one batched tree query; a
+        candidate's distance is its distance to the nearest seed.
+        """
+        seed_ids, seed_vectors = self.vectors_for(seed_ids)
+        if seed_vectors is None:
+            return []
+        seeds = set(seed_ids)
+
+        with self._lock:
+            best = {}
+            if self._tree is not None:
+                # Seeds and stale entries crowd the neighbourhoods: re-query the seeds whose
+                # neighbourhood holds fewer than k other subscribers with twice as many
+                # neighbours. Anyone missed is farther than k found ones, so not in the top k.
+                fetch = min(len(self._tree_ids), k + min(len(self._stale), k) + min(len(seeds), k))
+                pending = np.arange(len(seed_vectors))
+                while len(pending):
+                    distances, positions = self._tree.query(seed_vectors[pending], k=fetch)
+                    candidate_ids = self._tree_ids[positions]
+                    short = []
+                    for row, row_ids, row_distances in zip(pending, candidate_ids, distances):
+                        found = 0
+                        for subscriber_id, distance in zip(row_ids.tolist(), row_distances.tolist()):
+                            if subscriber_id in seeds or subscriber_id in self._stale:
+                                continue
+                            found += 1
+                            if distance < best.get(subscriber_id, np.inf):
+                                best[subscriber_id] = distance
+                        if found < k:
+                            short.append(row)
+                    if fetch >= len(self._tree_ids):
+                        break
+                    pending = np.asarray(short, dtype=np.int64)
+                    fetch = min(len(self._tree_ids), fetch * 2)
+            if self._delta:
+                delta_ids = list(self._delta)
+                delta_vectors = np.vstack([self._delta[i] for i in delta_ids])
+                # |a - b|^2 = |a|^2 + |b|^2 - 2ab, without materializing the pairwise differences
+                squared = ((delta_vectors ** 2).sum(axis=1)[:, None] + (seed_vectors ** 2).sum(axis=1)[None, :]
+                           - 2.0 * delta_vectors @ seed_vectors.T)
+                distances = np.sqrt(np.maximum(squared, 0.0))
+                for subscriber_id, distance in zip(delta_ids, distances.min(axis=1).tolist()):
+                    if subscriber_id not in seeds and distance < best.get(subscriber_id, np.inf):
+                        best[subscriber_id] = distance
+
+        ranked = sorted(best.items(), key=lambda item: item[1])[:k]
+        return [{'subscriber_id': subscriber_id, 'distance': round(distance, 6),
+                 'similarity': round(1.0 / (1.0 + distance), 6)}
+                for subscriber_id, distance in ranked]
+
+
+def _build_index():
+    index = LookalikeIndex(background=_index)
+    index.build()
+    return index
+
+
+_index = BackgroundIndex('lookalike', _build_index)
+
+
+def get_lookalike_index(wait=False):
+    """
+    Process-wide lookalike index; raises IndexNotReady while the first build
+    runs and ShardingNotSupported with sharded storage.
+    """
+    require_unsharded('Lookalike search')
+    return _index.get(wait=wait)
+
+
+@on_subscribers_changed
+def _track_subscriber_changes(subscriber_ids, action):
+    if _index.index is not None:
+        _index.index.mark_changed(subscriber_ids, action)
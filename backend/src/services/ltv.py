@@ -0,0 +1,148 @@
+"""
+Lifetime Value Engine for PersonalizeAI Platform
+Incrementally computes Subscriber.lifetime_value from conversion history
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, update
+
+# Import db from main app
+from main import db
+
+PIPELINE_NAME = 'lifetime_value'
+LATE_CONVERSION_WINDOW = timedelta(hours=1)  # Rescanned each run for late-committed conversions
+
+
+class LTVModel:
+    """
+    Historical plus projected lifetime value.
+
+    historical = sum of conversion_value to date
+    projected  = monthly value rate * sum over the tier's horizon of
+                 (monthly retention / (1 + monthly discount rate)) ** month
+    where the monthly value rate is historical / tenure and monthly retention
+    is derived from churn_risk_score.
+    """
+
+    def __init__(self, horizon_months=None, monthly_discount_rate=0.01,
+                 churn_horizon_months=12, include_projection=True):
+        self.horizon_months = horizon_months or {'basic': 12, 'premium': 24, 'enterprise': 36}
+        self.monthly_discount_rate = monthly_discount_rate
+        self.churn_horizon_months = churn_horizon_months
+        self.include_projection = include_projection
+
+    def compute(self, frame, now=None):
+        """Vectorized LTV for a DataFrame with historical, subscription_date, tier and churn risk"""
+        historical = frame['historical'].to_numpy(dtype=float)
+        if not self.include_projection:
+            return historical
+
+        now = now or datetime.utcnow()
+        start = pd.to_datetime(frame['subscription_date']).fillna(pd.Timestamp(now))
+        tenure_months = np.maximum((pd.Timestamp(now) - start).dt.days.to_numpy() / 30.44, 1.0)
+        monthly_rate = historical / tenure_months
+
+        churn = np.clip(frame['churn_risk_score'].fillna(0.0).to_numpy(dtype=float), 0.0, 1.0)
+        retention = 1.0 - churn / self.churn_horizon_months
+        ratio = retention / (1.0 + self.monthly_discount_rate)
+        horizon = frame['subscription_tier'].map(self.horizon_months).fillna(
+            self.horizon_months.get('basic', 12)
+        ).to_numpy(dtype=float)
+
+        # Closed-form geometric series: sum_{m=1..H} ratio^m
+        annuity = np.where(
+            np.isclose(ratio, 1.0),
+            horizon,
+            ratio * (1.0 - ratio ** horizon) / (1.0 - ratio)
+        )
+        return historical + monthly_rate * annuity
+
+
+def refresh_lifetime_values(model=None, chunk_size=5000, full=False):
+    """
+    Recompute LTV for subscribers with conversions since the last watermark.
+
+    Only affected subscribers are aggregated (one GROUP BY per chunk) and
+    written back with a single bulk UPDATE per chunk. Pass full=True to
+    recompute every subscriber, with or without conversion history.
+
+    The watermark is the latest converted_at processed, not the wall clock,
+    and each run rescans LATE_CONVERSION_WINDOW before it, so conversions
+    committed after a run with slightly earlier timestamps are still picked
+    up (recomputing a subscriber twice is harmless).
+    """
+    from models.subscriber import Subscriber
+    from models.personalization import PersonalizationResult
+    from models.pipeline import PipelineState
+    from services.sharding import require_unsharded
+
+    require_unsharded('LTV refresh')
+
+    model = model or LTVModel()
+    state = PipelineState.get(PIPELINE_NAME)
+    now = datetime.utcnow()
+    new_watermark = state.watermark
+
+    if full:
+        subscriber_ids = [row[0] for row in db.session.query(Subscriber.id).order_by(Subscriber.id)]
+        latest = db.session.query(func.max(PersonalizationResult.converted_at)).scalar()
+    else:
+        affected = db.session.query(PersonalizationResult.subscriber_id).filter(
+            PersonalizationResult.converted_at.isnot(None)
+        )
+        if state.watermark is not None:
+            affected = affected.filter(
+                PersonalizationResult.converted_at > state.watermark - LATE_CONVERSION_WINDOW
+            )
+        latest = affected.with_entities(func.max(PersonalizationResult.converted_at)).scalar()
+        subscriber_ids = sorted({row[0] for row in affected.distinct()})
+    if latest is not None and (new_watermark is None or latest > new_watermark):
+        new_watermark = latest
+
+    # Conversions already moved out of the hot table by the retention job
+    from services.retention import ResultsRetention
+    retention = ResultsRetention()
+
+    updated = 0
+    for i in range(0, len(subscriber_ids), chunk_size):
+        chunk = subscriber_ids[i:i + chunk_size]
+        archived_totals = retention.archived_conversion_totals(chunk)
+        totals = db.session.query(
+            PersonalizationResult.subscriber_id,
+            func.coalesce(func.sum(PersonalizationResult.conversion_value), 0.0)
+        ).filter(
+            PersonalizationResult.subscriber_id.in_(chunk)
+        ).group_by(PersonalizationResult.subscriber_id).subquery()
+
+        rows = db.session.query(
+            Subscriber.id,
+            Subscriber.subscription_tier,
+            Subscriber.subscription_date,
+            Subscriber.churn_risk_score,
+            func.coalesce(totals.c[1], 0.0)
+        ).filter(Subscriber.id.in_(chunk)).outerjoin(totals, totals.c.subscriber_id == Subscriber.id).all()
+        if not rows:
+            continue
+
+        frame = pd.DataFrame(rows, columns=[
+            'id', 'subscription_tier', 'subscription_date', 'churn_risk_score', 'historical'
+        ])
+        frame['historical'] = frame['historical'] + archived_totals.reindex(frame['id']).to_numpy()
+        frame['lifetime_value'] = np.round(model.compute(frame, now=now), 2)
+
+        db.session.execute(
+            update(Subscriber),
+            [{'id': int(r.id), 'lifetime_value': float(r.lifetime_value)}
+             for r in frame.itertuples(index=False)]
+        )
+        db.session.commit()
+        updated += len(frame)
+
+    state = PipelineState.get(PIPELINE_NAME)
+    state.watermark = new_watermark
+    state.state = {'last_run_updated': updated}
+    db.session.commit()
+    return updated
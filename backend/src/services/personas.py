@@ -0,0 +1,190 @@
+"""
+Persona Clustering for PersonalizeAI Platform
+Mini-batch k-means over subscriber features to populate Subscriber.ai_persona
+"""
+
+import threading
+from datetime import datetime
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import MiniBatchKMeans
+from sqlalchemy import update
+
+from services.subscriber_features import (
+    FEATURE_NAMES, encode_subscriber, iter_feature_chunks
+)
+
+# Import db from main app
+from main import db
+
+PIPELINE_NAME = 'personas'
+
+# Centroids further apart than this are treated as a new cluster rather than
+# a refit of an existing persona
+MATCH_DISTANCE = 0.75
+
+_F = {name: i for i, name in enumerate(FEATURE_NAMES)}
+
+
+def describe_centroid(centroid):
+    """Rule-based persona name for a cluster centre"""
+    def share(prefix, values):
+        return {v: centroid[_F[f'{prefix}={v}']] for v in values}
+
+    risk = share('risk', ['conservative', 'moderate', 'aggressive'])
+    experience = share('experience', ['beginner', 'intermediate', 'advanced'])
+    income_interest = centroid[_F['content=dividend_stocks']] + centroid[_F['content=retirement']]
+
+    if centroid[_F['churn_risk']] > 0.6:
+        return 'at_risk_reader'
+    if max(experience, key=experience.get) == 'beginner':
+        return 'new_investor'
+    dominant_risk = max(risk, key=risk.get)
+    if dominant_risk == 'aggressive':
+        return 'active_trader' if experience['advanced'] > 0.5 else 'growth_seeker'
+    if dominant_risk == 'conservative':
+        return 'income_focused' if income_interest > 0.5 else 'conservative_investor'
+    if centroid[_F['portfolio_size']] >= 0.66:
+        return 'wealth_builder'
+    return 'balanced_investor'
+
+
+def name_clusters(centroids, previous=None):
+    """
+    Give each centroid a persona name that is stable across refits.
+
+    New centroids are matched one-to-one to the previous model's centroids
+    (Hungarian assignment on Euclidean distance) and inherit their names;
+    unmatched clusters get a rule-based name, suffixed if already taken.
+    """
+    names = [None] * len(centroids)
+    if previous and previous.get('centroids'):
+        old = np.asarray(previous['centroids'], dtype=np.float64)
+        if old.shape[1] == centroids.shape[1]:
+            cost = np.linalg.norm(centroids[:, None, :] - old[None, :, :], axis=2)
+            rows, cols = linear_sum_assignment(cost)
+            for row, col in zip(rows, cols):
+                if cost[row, col] <= MATCH_DISTANCE:
+                    names[row] = previous['names'][col]
+
+    taken = {name for name in names if name}
+    for i, centroid in enumerate(centroids):
+        if names[i]:
+            continue
+        base = describe_centroid(centroid)
+        name, suffix = base, 2
+        while name in taken:
+            name, suffix = f'{base}_{suffix}', suffix + 1
+        names[i] = name
+        taken.add(name)
+    return names
+
+
+class PersonaModel:
+    """Fitted centroids and persona names; assignment is O(k) = O(1) per subscriber"""
+
+    def __init__(self, centroids, names):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.names = list(names)
+
+    def predict(self, vectors):
+        squared = ((vectors ** 2).sum(axis=1)[:, None] + (self.centroids ** 2).sum(axis=1)[None, :]
+                   - 2.0 * vectors @ self.centroids.T)
+        return squared.argmin(axis=1)
+
+    def assign(self, subscriber):
+        """Persona for a single subscriber (e.g. on insert)"""
+        return self.names[int(self.predict(encode_subscriber(subscriber)[None, :])[0])]
+
+    def to_state(self):
+        return {'centroids': self.centroids.tolist(), 'names': self.names}
+
+    @classmethod
+    def from_state(cls, state):
+        if not state or not state.get('centroids'):
+            return None
+        return cls(state['centroids'], state['names'])
+
+
+_model = None
+_model_loaded_at = None
+_model_lock = threading.Lock()
+
+
+def get_persona_model(max_age_seconds=300):
+    """The current persona model, reloaded from pipeline state every few minutes"""
+    global _model, _model_loaded_at
+    from models.pipeline import PipelineState
+
+    now = datetime.utcnow()
+    if _model_loaded_at is None or (now - _model_loaded_at).total_seconds() > max_age_seconds:
+        with _model_lock:
+            state = db.session.get(PipelineState, PIPELINE_NAME)
+            _model = PersonaModel.from_state(state.state if state else None)
+            _model_loaded_at = now
+    return _model
+
+
+def assign_persona(subscriber):
+    """Persona for a new subscriber, or None until a model has been fitted"""
+    model = get_persona_model()
+    return model.assign(subscriber) if model else None
+
+
+def refit_personas(n_clusters=6, epochs=2, chunk_size=10000, random_state=42):
+    """
+    Fit mini-batch k-means over streamed feature chunks and relabel every subscriber.
+
+    Only one chunk is in memory at a time. Labels are written back with one
+    UPDATE per persona per chunk.
+    """
+    global _model, _model_loaded_at
+    from models.subscriber import Subscriber
+    from models.pipeline import PipelineState
+    from services.sharding import require_unsharded
+
+    require_unsharded('Persona refit')
+
+    state = PipelineState.get(PIPELINE_NAME)
+    previous = state.state or {}
+
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state,
+                             batch_size=min(chunk_size, 4096), n_init=3)
+    if previous.get('centroids') and len(previous['centroids']) == n_clusters:
+        # Warm start from the previous centres keeps clusters (and names) stable
+        kmeans.set_params(init=np.asarray(previous['centroids'], dtype=np.float64), n_init=1)
+
+    fitted = False
+    for _ in range(epochs):
+        for _ids, vectors in iter_feature_chunks(chunk_size):
+            if not fitted and len(vectors) < n_clusters:
+                continue
+            kmeans.partial_fit(vectors)
+            fitted = True
+    if not fitted:
+        return {'subscribers': 0, 'personas': {}}
+
+    centroids = kmeans.cluster_centers_
+    model = PersonaModel(centroids, name_clusters(centroids, previous))
+
+    counts = {name: 0 for name in model.names}
+    for ids, vectors in iter_feature_chunks(chunk_size):
+        labels = model.predict(vectors)
+        for cluster, name in enumerate(model.names):
+            member_ids = ids[labels == cluster].tolist()
+            if member_ids:
+                db.session.execute(
+                    update(Subscriber).where(Subscriber.id.in_(member_ids)).values(ai_persona=name)
+                )
+                counts[name] += len(member_ids)
+        db.session.commit()
+
+    state = PipelineState.get(PIPELINE_NAME)
+    state.state = dict(model.to_state(), counts=counts, fitted_at=datetime.utcnow().isoformat())
+    state.watermark = datetime.utcnow()
+    db.session.commit()
+
+    with _model_lock:
+        _model, _model_loaded_at = model, datetime.utcnow()
+    return {'subscribers': sum(counts.values()), 'personas': counts}
@@ -0,0 +1,474 @@
+"""
+Content Recommendations for PersonalizeAI Platform
+Inverted indexes over content tags and subscriber interests, scored with sparse dot products
+"""
+
+import math
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from sqlalchemy import func
+
+from services.sharding import require_unsharded
+from services.subscriber_events import BackgroundIndex, SubscriberChangeFeed, on_subscribers_changed
+
+# Import db from main app
+from main import db
+
+# Relative weight of each kind of term on the content side
+TERM_WEIGHTS = {'type': 1.0, 'tag': 1.0, 'ticker': 1.5, 'risk': 0.5}
+
+# A recommendation's score halves for every FRESHNESS_HALF_LIFE_DAYS since publication
+FRESHNESS_HALF_LIFE_DAYS = 7.0
+
+# Subscribers scored per dense block when ranking a segment
+SCORING_BLOCK_SIZE = 2000
+
+
+def _tag(value):
+    return str(value).strip().lower()
+
+
+def _ticker(value):
+    return str(value).strip().upper()
+
+
+def content_terms(content_type, tags, tickers, risk_level):
+    """{term: weight} describing a content item"""
+    terms = {}
+    if content_type:
+        terms[f'type:{_tag(content_type)}'] = TERM_WEIGHTS['type']
+    for tag in tags or []:
+        terms[f'tag:{_tag(tag)}'] = TERM_WEIGHTS['tag']
+    for ticker in tickers or []:
+        terms[f'ticker:{_ticker(ticker)}'] = TERM_WEIGHTS['ticker']
+    if risk_level:
+        terms[f'risk:{_tag(risk_level)}'] = TERM_WEIGHTS['risk']
+    return terms
+
+
+def subscriber_terms(preferred_content_types, content_preferences, risk_tolerance):
+    """
+    {term: weight} describing a subscriber's interests.
+
+    Declared preferred_content_types count fully. content_preferences may hold
+    learned weights per content type plus 'tags' and 'tickers', each either a
+    list or a {value: weight} dict.
+    """
+    terms = {f'type:{_tag(content_type)}': 1.0 for content_type in preferred_content_types or []}
+    preferences = content_preferences if isinstance(content_preferences, dict) else {}
+    for key, value in preferences.items():
+        if key in ('tags', 'tickers'):
+            prefix, clean = ('tag', _tag) if key == 'tags' else ('ticker', _ticker)
+            if isinstance(value, dict):
+                pairs = value.items()
+            elif isinstance(value, (list, tuple)):
+                pairs = ((item, 1.0) for item in value)
+            else:
+                continue
+            for item, weight in pairs:
+                if isinstance(weight, (int, float)) and weight > 0:
+                    terms[f'{prefix}:{clean(item)}'] = float(weight)
+        elif isinstance(value, (int, float)) and value > 0:
+            terms[f'type:{_tag(key)}'] = float(value)
+    if risk_tolerance:
+        terms[f'risk:{_tag(risk_tolerance)}'] = 1.0
+    return terms
+
+
+class TermVocabulary:
+    """Term -> column id, shared by the content and subscriber matrices"""
+
+    def __init__(self):
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, term, grow=False):
+        column = self._index.get(term)
+        if column is None and grow:
+            with self._lock:
+                column = self._index.setdefault(term, len(self._index))
+        return column
+
+    def matrix(self, term_dicts, grow=False):
+        """CSR matrix with one row per {term: weight}; unknown terms are added or skipped"""
+        indptr, indices, data = [0], [], []
+        for terms in term_dicts:
+            for term, weight in terms.items():
+                column = self.get(term, grow)
+                if column is not None and weight:
+                    indices.append(column)
+                    data.append(weight)
+            indptr.append(len(indices))
+        return sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32),
+             np.asarray(indptr, dtype=np.int64)),
+            shape=(len(term_dicts), len(self))
+        )
+
+
+def _widen(matrix, columns):
+    """Same CSR matrix with `columns` columns (the vocabulary only grows)"""
+    if matrix.shape[1] == columns:
+        return matrix
+    return sparse.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], columns))
+
+
+class ContentIndex:
+    """
+    Active content items as an items x terms matrix.
+
+    Term weights are scaled by inverse document frequency (a tag on every
+    item says little) and each row is L2-normalised, so items with many tags
+    do not outscore focused ones. The CSC copy is the inverted index from
+    term to items. Reloaded when the content table changes.
+    """
+
+    def __init__(self, vocabulary, refresh_interval=30.0):
+        self.vocabulary = vocabulary
+        self.refresh_interval = refresh_interval
+        self.ids = np.empty(0, dtype=np.int64)
+        self.content_types = np.empty(0, dtype=object)
+        self.published = np.empty(0, dtype=np.float64)  # Epoch seconds
+        self.matrix = None
+        self.by_term = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current_version(self):
+        from models.content import ContentItem
+
+        return tuple(db.session.query(func.count(ContentItem.id), func.max(ContentItem.updated_at)).one())
+
+    def invalidate(self):
+        self._checked_at = 0.0
+        self._version = None
+
+    def ensure_fresh(self):
+        if time.monotonic() - self._checked_at < self.refresh_interval and self.matrix is not None:
+            return self
+        with self._lock:
+            version = self._current_version()
+            if version != self._version or self.matrix is None:
+                self.build()
+                self._version = version
+            self._checked_at = time.monotonic()
+        return self
+
+    def build(self):
+        from models.content import ContentItem
+
+        rows = db.session.query(
+            ContentItem.id, ContentItem.content_type, ContentItem.tags, ContentItem.tickers,
+            ContentItem.risk_level, ContentItem.published_at
+        ).filter(ContentItem.is_active.is_(True)).order_by(ContentItem.id).all()
+
+        raw = self.vocabulary.matrix([content_terms(r[1], r[2], r[3], r[4]) for r in rows], grow=True)
+        document_frequency = np.bincount(raw.indices, minlength=raw.shape[1])
+        idf = np.where(document_frequency > 0,
+                       np.log1p(len(rows) / np.maximum(document_frequency, 1)), 0.0).astype(np.float32)
+        weighted = raw.multiply(idf[None, :]).tocsr()
+        if rows:  # normalize() rejects a matrix with no rows
+            weighted = normalize(weighted, norm='l2', copy=False)
+
+        self.ids = np.array([r[0] for r in rows], dtype=np.int64)
+        self.content_types = np.array([r[1] for r in rows], dtype=object)
+        self.published = np.array([(r[5] or datetime.utcnow()).timestamp() for r in rows], dtype=np.float64)
+        self.matrix = weighted.astype(np.float32)
+        self.by_term = self.matrix.tocsc()
+
+    def items_for(self, term):
+        """Content ids carrying a term (e.g. 'ticker:NVDA'), via the inverted index"""
+        self.ensure_fresh()
+        column = self.vocabulary.get(term)
+        if column is None or column >= self.by_term.shape[1]:
+            return []
+        start, end = self.by_term.indptr[column], self.by_term.indptr[column + 1]
+        return sorted(self.ids[self.by_term.indices[start:end]].tolist())
+
+
+def _subscriber_term_columns():
+    from models.subscriber import Subscriber
+
+    return [Subscriber.id, Subscriber.preferred_content_types, Subscriber.content_preferences,
+            Subscriber.risk_tolerance]
+
+
+class SubscriberTermIndex:
+    """
+    Subscribers x terms matrix, held by column (CSC) so each tag or ticker
+    maps straight to the subscribers interested in it and an audience query
+    reads only the columns of its own terms.
+
+    Built from a streamed pass over the table. Changed subscribers are
+    re-encoded into a small delta that shadows their old rows; the matrix is
+    rebuilt once the delta exceeds rebuild_ratio of the index (and
+    min_delta subscribers), on the
+    `background` BackgroundIndex's thread when one is given. Writes from
+    other worker processes are picked up by a SubscriberChangeFeed.
+    """
+
+    def __init__(self, vocabulary, rebuild_ratio=0.1, min_delta=1000, chunk_size=10000, changes=None,
+                 background=None):
+        self.vocabulary = vocabulary
+        self.rebuild_ratio = rebuild_ratio
+        self.min_delta = min_delta
+        self.chunk_size = chunk_size
+        self.changes = changes or SubscriberChangeFeed()
+        self.background = background
+        self.ids = None
+        self.by_term = None
+        self._stale = set()
+        self._delta = {}  # subscriber_id -> {term: weight}
+        self._dirty = set()
+        self._changed_during_rebuild = None  # ids re-encoded since a running rebuild started reading
+        self._lock = threading.RLock()
+
+    def build(self):
+        """Full (re)build from the subscribers table; the current matrix serves queries meanwhile"""
+        from models.subscriber import Subscriber
+
+        self.changes.reset()
+        with self._lock:
+            self._changed_during_rebuild = set()
+        ids, blocks, last_id = [], [], 0
+        while True:
+            rows = db.session.query(*_subscriber_term_columns()).filter(
+                Subscriber.id > last_id
+            ).order_by(Subscriber.id).limit(self.chunk_size).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            ids.append(np.array([r[0] for r in rows], dtype=np.int64))
+            blocks.append(self.vocabulary.matrix([subscriber_terms(r[1], r[2], r[3]) for r in rows], grow=True))
+
+        width = len(self.vocabulary)
+        with self._lock:
+            # Subscribers re-encoded during the pass may have been read before their change:
+            # their delta entries stay and shadow their rows in the new matrix
+            changed, self._changed_during_rebuild = self._changed_during_rebuild, None
+            self.ids = np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+            self.by_term = (sparse.vstack([_widen(b, width) for b in blocks]).tocsc() if blocks
+                            else sparse.csc_matrix((0, width), dtype=np.float32))
+            self._stale = set(self.ids[np.isin(self.ids, list(changed))].tolist())
+            self._delta = {i: terms for i, terms in self._delta.items() if i in changed}
+
+    def mark_changed(self, subscriber_ids, action='updated'):
+        with self._lock:
+            if self.by_term is not None:
+                self._dirty.update(subscriber_ids)
+
+    @property
+    def size(self):
+        return len(self.ids) - len(self._stale) + len(self._delta)
+
+    def _live_ids(self):
+        with self._lock:
+            stale = np.fromiter(self._stale, dtype=np.int64, count=len(self._stale))
+            return self.ids[~np.isin(self.ids, stale)].tolist() + list(self._delta)
+
+    def _apply_changes(self):
+        """Fold writes from this and other processes into the index"""
+        changed = self.changes.poll()
+        if changed:
+            self.mark_changed(changed)
+        self._apply_pending()
+        if changed is not None:
+            missing, deleted = self.changes.reconcile(self.size, self._live_ids)
+            if missing or deleted:
+                self.mark_changed(missing | deleted)  # Deleted ids drop out when re-read
+                self._apply_pending()
+
+    def _apply_pending(self):
+        from models.subscriber import Subscriber
+
+        with self._lock:
+            dirty, self._dirty = list(self._dirty), set()
+        if not dirty:
+            return
+        rows = db.session.query(*_subscriber_term_columns()).filter(Subscriber.id.in_(dirty)).all()
+        found = {r[0]: subscriber_terms(r[1], r[2], r[3]) for r in rows}
+        with self._lock:
+            indexed = set(self.ids[np.isin(self.ids, dirty)].tolist())
+            self._stale.update(indexed)
+            if self._changed_during_rebuild is not None:
+                self._changed_during_rebuild.update(dirty)
+            for subscriber_id in dirty:
+                if subscriber_id in found:
+                    self._delta[subscriber_id] = found[subscriber_id]
+                else:
+                    self._delta.pop(subscriber_id, None)  # Deleted
+            needs_rebuild = len(self._delta) > max(self.rebuild_ratio * len(self.ids), self.min_delta)
+        if needs_rebuild:
+            if self.background is not None:
+                self.background.run(self.build)
+            else:
+                self.build()
+
+    def audience(self, query_terms, limit=100, min_score=0.0):
+        """Subscribers whose interests best match a term vector, as [(subscriber_id, score)]"""
+        if self.by_term is None:
+            self.build()
+        self._apply_changes()
+
+        query = self.vocabulary.matrix([query_terms])
+        with self._lock:
+            width = len(self.vocabulary)
+            query = _widen(query, width)
+            # Terms added to the vocabulary since the build have no indexed subscribers
+            present = query.indices < self.by_term.shape[1]
+            scores = self.by_term[:, query.indices[present]] @ query.data[present]
+            ids = self.ids
+            if self._stale:
+                scores[np.isin(ids, list(self._stale))] = 0.0
+            if self._delta:
+                delta_ids = np.fromiter(self._delta, dtype=np.int64, count=len(self._delta))
+                delta_matrix = _widen(self.vocabulary.matrix(list(self._delta.values())), width)
+                ids = np.concatenate([ids, delta_ids])
+                scores = np.concatenate([scores, (delta_matrix @ query.T).toarray().ravel()])
+
+        candidates = np.flatnonzero(scores > min_score)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        order = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(int(ids[i]), round(float(scores[i]), 6)) for i in order]
+
+
+class RecommendationEngine:
+    """Scores content for many subscribers at once: interests (n x terms) @ content.T (terms x items)"""
+
+    def __init__(self, freshness_half_life_days=FRESHNESS_HALF_LIFE_DAYS):
+        self.vocabulary = TermVocabulary()
+        self.content = ContentIndex(self.vocabulary)
+        self.subscribers = BackgroundIndex('subscriber interest', self._build_subscriber_index)
+        self.freshness_half_life_days = freshness_half_life_days
+
+    def _build_subscriber_index(self):
+        index = SubscriberTermIndex(self.vocabulary, background=self.subscribers)
+        index.build()
+        return index
+
+    def _candidate_columns(self, content_types=None, max_age_days=None, now=None):
+        """Indices of candidate items and their freshness multipliers"""
+        content = self.content.ensure_fresh()
+        now = (now or datetime.utcnow()).timestamp()
+        age_days = np.maximum(now - content.published, 0.0) / 86400.0
+        mask = np.ones(len(content.ids), dtype=bool)
+        if content_types:
+            mask &= np.isin(content.content_types, list(content_types))
+        if max_age_days is not None:
+            mask &= age_days <= max_age_days
+        columns = np.flatnonzero(mask)
+        freshness = np.exp(-math.log(2) * age_days[columns] / self.freshness_half_life_days)
+        return columns, freshness.astype(np.float32)
+
+    def score_rows(self, rows, k=5, content_types=None, max_age_days=None, now=None):
+        """
+        Top-k content for subscriber rows of (id, preferred_content_types,
+        content_preferences, risk_tolerance): {subscriber_id: [(content_id, score)]}.
+        """
+        columns, freshness = self._candidate_columns(content_types, max_age_days, now)
+        results = {row[0]: [] for row in rows}
+        if not len(columns) or not rows:
+            return results
+
+        width = len(self.vocabulary)
+        items = _widen(self.content.matrix, width)[columns]  # candidates x terms
+        item_ids = self.content.ids[columns]
+        k = min(k, len(columns))
+
+        for start in range(0, len(rows), SCORING_BLOCK_SIZE):
+            block = rows[start:start + SCORING_BLOCK_SIZE]
+            interests = _widen(self.vocabulary.matrix([subscriber_terms(r[1], r[2], r[3]) for r in block]), width)
+            scores = (interests @ items.T).toarray() * freshness[None, :]
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            for row, picks, picked_scores in zip(block, top, top_scores):
+                results[row[0]] = [(int(item_ids[c]), round(float(s), 6))
+                                   for c, s in zip(picks, picked_scores) if s > 0]
+        return results
+
+    def recommend_for_segment(self, subscriber_ids=None, filters=None, k=5, content_types=None,
+                              max_age_days=None, limit=None, after_id=0, chunk_size=10000):
+        """
+        Recommendations for explicit ids or every subscriber matching
+        Subscriber.apply_filters (on every shard with sharded storage).
+
+        Subscribers are taken in id order after `after_id`, at most `limit`
+        of them when set, so a large segment can be paged through.
+        """
+        from models.subscriber import Subscriber
+        from services.sharding import get_shard_router
+
+        def rows_after(session, last_id, count):
+            query = session.query(*_subscriber_term_columns())
+            if subscriber_ids is not None:
+                query = query.filter(Subscriber.id.in_(list(subscriber_ids)))
+            else:
+                query = Subscriber.apply_filters(query, **(filters or {}))
+            return query.filter(Subscriber.id > last_id).order_by(Subscriber.id).limit(count).all()
+
+        router = get_shard_router()
+
+        def next_rows(last_id, count):
+            if router is None:
+                return rows_after(db.session, last_id, count)
+            # The next `count` ids overall are among each shard's next `count`
+            rows = []
+            for shard in range(len(router)):
+                with router.session(shard) as session:
+                    rows += rows_after(session, last_id, count)
+            return sorted(rows, key=lambda row: row[0])[:count]
+
+        results, last_id, remaining = {}, after_id or 0, limit
+        while remaining is None or remaining > 0:
+            rows = next_rows(last_id, chunk_size if remaining is None else min(chunk_size, remaining))
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+            results.update(self.score_rows(rows, k=k, content_types=content_types, max_age_days=max_age_days))
+        return results
+
+    def audience_for_content(self, item, limit=100):
+        """
+        Subscribers most interested in a content item (tag -> subscriber index).
+
+        Raises IndexNotReady while the index is first being built and
+        ShardingNotSupported with sharded storage.
+        """
+        require_unsharded('Content audiences')
+        return self.subscribers.get().audience(
+            content_terms(item.content_type, item.tags, item.tickers, item.risk_level), limit=limit
+        )
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_recommendation_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RecommendationEngine()
+    return _engine
+
+
+@on_subscribers_changed
+def _mark_changed(subscriber_ids, action):
+    if _engine is not None and _engine.subscribers.index is not None:
+        _engine.subscribers.index.mark_changed(subscriber_ids, action)
@@ -0,0 +1,401 @@
+"""
+Personalization Results Retention for PersonalizeAI Platform
+Moves aging personalization_results into monthly partitions and compressed archives
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Column, MetaData, Table, text, inspect
+
+# Import db from main app
+from main import db
+
+HOT_TABLE = 'personalization_results'
+HISTORY_TABLE = 'personalization_results_history'  # PostgreSQL partitioned parent
+DATETIME_COLUMNS = ('created_at', 'sent_at', 'opened_at', 'clicked_at', 'converted_at')
+
+
+def _month_bounds(month):
+    """('2025-01') -> (datetime(2025, 1, 1), datetime(2025, 2, 1))"""
+    start = datetime.strptime(month, '%Y-%m')
+    end = datetime(start.year + (start.month == 12), start.month % 12 + 1, 1)
+    return start, end
+
+
+def _month_key(value):
+    return f'{value.year:04d}-{value.month:02d}'
+
+
+def _months_before(now, months):
+    """First day of the month `months` months before now's month"""
+    index = now.year * 12 + (now.month - 1) - months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+class ResultsRetention:
+    """
+    Three storage tiers for PersonalizationResult rows, by created_at month:
+
+    hot     personalization_results, the ORM table (the last `hot_months`)
+    warm    one partition per month: native range partitions of
+            personalization_results_history on PostgreSQL, or
+            personalization_results_YYYY_MM tables elsewhere (SQLite)
+    cold    compressed columnar archives (<archive_dir>/YYYY-MM.npz), one
+            array per column, for months older than `archive_after_months`
+
+    query() reads the tiers a date range needs and returns one DataFrame.
+
+    Sends, opens, clicks and conversions are recorded on hot rows only, so a
+    month also stays hot until `attribution_days` have passed since its end.
+    """
+
+    def __init__(self, hot_months=3, archive_after_months=12, archive_dir=None, chunk_size=10000,
+                 attribution_days=None):
+        self.hot_months = hot_months
+        self.archive_after_months = archive_after_months
+        if attribution_days is None:
+            attribution_days = int(os.getenv('RESULTS_ATTRIBUTION_DAYS', 30))
+        self.attribution_days = attribution_days
+        self.archive_dir = archive_dir or os.getenv('RESULTS_ARCHIVE_PATH', 'data/archives/personalization_results')
+        self.chunk_size = chunk_size
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+    @property
+    def native_partitions(self):
+        return db.engine.dialect.name == 'postgresql'
+
+    @staticmethod
+    def partition_name(month):
+        return f"{HOT_TABLE}_{month.replace('-', '_')}"
+
+    def _hot_columns(self):
+        from models.personalization import PersonalizationResult
+        return [column.name for column in PersonalizationResult.__table__.columns]
+
+    # ------------------------------------------------------------------
+    # Warm tier
+    # ------------------------------------------------------------------
+
+    def warm_months(self):
+        """Months that currently have a warm partition"""
+        prefix = f'{HOT_TABLE}_'
+        months = []
+        for name in inspect(db.engine).get_table_names():
+            suffix = name[len(prefix):]
+            if name.startswith(prefix) and len(suffix) == 7 and suffix[4] == '_':
+                months.append(suffix.replace('_', '-'))
+        return sorted(months)
+
+    def _ensure_partition(self, month):
+        name = self.partition_name(month)
+        if self.native_partitions:
+            start, end = _month_bounds(month)
+            db.session.execute(text(
+                f'CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} '
+                f'(LIKE {HOT_TABLE} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)'
+            ))
+            db.session.execute(text(
+                f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {HISTORY_TABLE} '
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+            db.session.commit()
+        else:
+            from models.personalization import PersonalizationResult
+            # Partitions hold history: same columns, but no foreign keys or secondary indexes
+            table = Table(name, MetaData(), *[
+                Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False)
+                for c in PersonalizationResult.__table__.columns
+            ])
+            table.create(db.engine, checkfirst=True)
+        return name
+
+    def _insert_target(self, month):
+        return HISTORY_TABLE if self.native_partitions else self.partition_name(month)
+
+    def demote_month(self, month):
+        """Move one month of rows from the hot table into its warm partition, in chunks"""
+        start, end = _month_bounds(month)
+        target = None
+        columns = ', '.join(self._hot_columns())
+        moved = 0
+        while True:
+            ids = [row[0] for row in db.session.execute(text(
+                f'SELECT id FROM {HOT_TABLE} WHERE created_at >= :start AND created_at < :end '
+                f'ORDER BY id LIMIT :limit'
+            ), {'start': start, 'end': end, 'limit': self.chunk_size})]
+            if not ids:
+                break
+            if target is None:  # Months without results get no partition
+                self._ensure_partition(month)
+                target = self._insert_target(month)
+            params = {f'id{i}': value for i, value in enumerate(ids)}
+            placeholders = ', '.join(f':id{i}' for i in range(len(ids)))
+            db.session.execute(text(
+                f'INSERT INTO {target} ({columns}) SELECT {columns} FROM {HOT_TABLE} WHERE id IN ({placeholders})'
+            ), params)
+            db.session.execute(text(f'DELETE FROM {HOT_TABLE} WHERE id IN ({placeholders})'), params)
+            db.session.commit()
+            moved += len(ids)
+        return moved
+
+    # ------------------------------------------------------------------
+    # Cold tier
+    # ------------------------------------------------------------------
+
+    def archive_path(self, month):
+        return os.path.join(self.archive_dir, f'{month}.npz')
+
+    def archived_months(self):
+        return sorted(name[:-4] for name in os.listdir(self.archive_dir) if name.endswith('.npz'))
+
+    def archive_month(self, month):
+        """Compact a warm partition into a compressed columnar archive and drop the partition"""
+        name = self.partition_name(month)
+        frame = pd.read_sql(text(f'SELECT * FROM {name} ORDER BY created_at, id'), db.engine)
+
+        path = self.archive_path(month)
+        if frame.empty:
+            self._drop_partition(name)
+            return 0
+        if os.path.exists(path):
+            # Months can be demoted more than once (late rows); merge with the existing archive
+            frame = pd.concat([self._load_archive(month), frame], ignore_index=True)
+        self._write_archive(month, frame)
+        self._drop_partition(name)
+        return len(frame)
+
+    def _write_archive(self, month, frame):
+        # Plain (non-object) arrays only, so archives load without pickle.
+        # NULL text becomes '' and nullable integers are stored as floats.
+        arrays = {}
+        for column in frame.columns:
+            kind = self._column_kind(column)
+            values = frame[column]
+            if kind == 'datetime':
+                arrays[column] = pd.to_datetime(values).to_numpy(dtype='datetime64[us]')
+            elif kind == 'bool':
+                arrays[column] = values.fillna(False).astype(bool).to_numpy()
+            elif kind == 'number':
+                numbers = pd.to_numeric(values).astype('float64')
+                if not numbers.isna().any() and (numbers % 1 == 0).all():
+                    numbers = numbers.astype('int64')
+                arrays[column] = numbers.to_numpy()
+            else:
+                arrays[column] = values.fillna('').astype(str).to_numpy(dtype=np.str_)
+        path = self.archive_path(month)
+        tmp_path = f'{path}.tmp.npz'
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    def _drop_partition(self, name):
+        if self.native_partitions:
+            db.session.execute(text(f'ALTER TABLE {HISTORY_TABLE} DETACH PARTITION {name}'))
+        db.session.execute(text(f'DROP TABLE {name}'))
+        db.session.commit()
+
+    @staticmethod
+    def _column_kind(name):
+        from models.personalization import PersonalizationResult
+        from sqlalchemy import Boolean, DateTime, Float, Integer
+
+        column = PersonalizationResult.__table__.columns.get(name)
+        if column is None:
+            return 'text'
+        if isinstance(column.type, DateTime):
+            return 'datetime'
+        if isinstance(column.type, Boolean):
+            return 'bool'
+        if isinstance(column.type, (Integer, Float)):
+            return 'number'
+        return 'text'
+
+    def _load_archive(self, month):
+        with np.load(self.archive_path(month), allow_pickle=False) as archive:
+            return pd.DataFrame({column: archive[column] for column in archive.files})
+
+    # ------------------------------------------------------------------
+    # Maintenance and queries
+    # ------------------------------------------------------------------
+
+    def run(self, now=None):
+        """
+        Demote months older than the hot window whose attribution window has
+        passed, then archive months past the warm window
+        """
+        from services.sharding import require_unsharded
+
+        require_unsharded('Results retention')
+        now = now or datetime.utcnow()
+        hot_cutoff = min(_months_before(now, self.hot_months - 1),
+                         _months_before(now - timedelta(days=self.attribution_days), 0))
+        cold_cutoff = _months_before(now, self.archive_after_months - 1)
+
+        oldest = db.session.execute(text(
+            f'SELECT MIN(created_at) FROM {HOT_TABLE} WHERE created_at < :cutoff'
+        ), {'cutoff': hot_cutoff}).scalar()
+        demoted = {}
+        if oldest is not None:
+            if isinstance(oldest, str):
+                oldest = datetime.fromisoformat(oldest)
+            month = datetime(oldest.year, oldest.month, 1)
+            while month < hot_cutoff:
+                moved = self.demote_month(_month_key(month))
+                if moved:
+                    demoted[_month_key(month)] = moved
+                month = _months_before(month, -1)
+
+        archived = {}
+        for month in self.warm_months():
+            if _month_bounds(month)[0] < cold_cutoff:
+                count = self.archive_month(month)
+                if count:
+                    archived[month] = count
+        return {'demoted': demoted, 'archived': archived}
+
+    def delete_subscribers(self, subscriber_ids):
+        """
+        Remove every warm and archived result of the given subscribers (the
+        hot rows are deleted with the subscribers themselves). Archives that
+        hold any of them are rewritten; returns the number of rows removed.
+        """
+        subscriber_ids = sorted({int(i) for i in subscriber_ids})
+        if not subscriber_ids:
+            return 0
+        removed = 0
+        for month in self.warm_months():
+            for i in range(0, len(subscriber_ids), self.chunk_size):
+                id_list = ', '.join(str(s) for s in subscriber_ids[i:i + self.chunk_size])
+                removed += db.session.execute(text(
+                    f'DELETE FROM {self.partition_name(month)} WHERE subscriber_id IN ({id_list})'
+                )).rowcount
+            db.session.commit()
+
+        wanted = np.asarray(subscriber_ids, dtype=np.int64)
+        for month in self.archived_months():
+            with np.load(self.archive_path(month), allow_pickle=False) as archive:
+                matches = np.isin(archive['subscriber_id'], wanted)
+            if not matches.any():
+                continue
+            frame = self._load_archive(month)
+            kept = frame.loc[~matches].reset_index(drop=True)
+            if kept.empty:
+                os.remove(self.archive_path(month))
+            else:
+                self._write_archive(month, kept)
+            removed += int(matches.sum())
+        return removed
+
+    def archived_conversion_totals(self, subscriber_ids):
+        """Sum of conversion_value per subscriber across the warm and cold tiers"""
+        subscriber_ids = [int(i) for i in subscriber_ids]
+        totals = pd.Series(0.0, index=pd.Index(subscriber_ids, name='subscriber_id'))
+        if not subscriber_ids:
+            return totals
+
+        id_list = ', '.join(str(i) for i in subscriber_ids)
+        tables = [HISTORY_TABLE] if self.native_partitions and self.warm_months() else \
+            [self.partition_name(m) for m in self.warm_months()]
+        for table in tables:
+            warm = pd.read_sql(text(
+                f'SELECT subscriber_id, SUM(conversion_value) AS total FROM {table} '
+                f'WHERE subscriber_id IN ({id_list}) GROUP BY subscriber_id'
+            ), db.engine)
+            totals = totals.add(warm.set_index('subscriber_id')['total'], fill_value=0.0)
+
+        wanted = np.asarray(subscriber_ids, dtype=np.int64)
+        for month in self.archived_months():
+            # Only the two needed columns are decompressed from the archive
+            with np.load(self.archive_path(month), allow_pickle=False) as archive:
+                ids = archive['subscriber_id']
+                values = archive['conversion_value']
+            mask = np.isin(ids, wanted) & (values > 0)
+            if mask.any():
+                cold = pd.Series(values[mask]).groupby(ids[mask]).sum()
+                totals = totals.add(cold, fill_value=0.0)
+        return totals.reindex(subscriber_ids, fill_value=0.0)
+
+    def query(self, start, end=None, subscriber_ids=None, ab_test_id=None, columns=None, ab_test_ids=None):
+        """
+        Every result with start <= created_at < end (end=None: no upper bound),
+        across hot, warm and cold tiers.
+
+        Only the tiers and months overlapping the range are read.
+        """
+        columns = list(columns or self._hot_columns())
+        where = ['created_at >= :start']
+        params = {'start': start}
+        if end is not None:
+            where.append('created_at < :end')
+            params['end'] = end
+        if ab_test_id is not None:
+            ab_test_ids = [ab_test_id]
+        if ab_test_ids is not None:
+            ab_test_ids = [int(i) for i in ab_test_ids]
+            where.append(f"ab_test_id IN ({', '.join(str(i) for i in ab_test_ids) or 'NULL'})")
+        if subscriber_ids is not None:
+            subscriber_ids = [int(i) for i in subscriber_ids]
+            where.append(f"subscriber_id IN ({', '.join(str(i) for i in subscriber_ids) or 'NULL'})")
+        select = f"SELECT {', '.join(columns)} FROM {{table}} WHERE {' AND '.join(where)}"
+
+        def overlaps(month):
+            month_start, month_end = _month_bounds(month)
+            return month_end > start and (end is None or month_start < end)
+
+        frames = [pd.read_sql(text(select.format(table=HOT_TABLE)), db.engine, params=params)]
+
+        warm = [m for m in self.warm_months() if overlaps(m)]
+        if warm:
+            if self.native_partitions:
+                frames.append(pd.read_sql(text(select.format(table=HISTORY_TABLE)), db.engine, params=params))
+            else:
+                for month in warm:
+                    frames.append(pd.read_sql(text(select.format(table=self.partition_name(month))),
+                                              db.engine, params=params))
+
+        for month in self.archived_months():
+            if not overlaps(month):
+                continue
+            archive = self._load_archive(month)
+            created = pd.to_datetime(archive['created_at'])
+            mask = created >= start
+            if end is not None:
+                mask &= created < end
+            if ab_test_ids is not None:
+                mask &= archive['ab_test_id'].isin(ab_test_ids)
+            if subscriber_ids is not None:
+                mask &= archive['subscriber_id'].isin(subscriber_ids)
+            frames.append(archive.loc[mask, columns])
+
+        frames = [f for f in frames if len(f)]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        result = pd.concat(frames, ignore_index=True)
+        for column in DATETIME_COLUMNS:
+            if column in result:
+                result[column] = pd.to_datetime(result[column])
+        order = [column for column in ('created_at', 'id') if column in result]
+        return result.sort_values(order).reset_index(drop=True) if order else result
+
+    def oldest_month(self):
+        """Earliest month holding results in any tier, or None"""
+        months = self.archived_months()[:1] + self.warm_months()[:1]
+        oldest = db.session.execute(text(f'SELECT MIN(created_at) FROM {HOT_TABLE}')).scalar()
+        if oldest is not None:
+            if isinstance(oldest, str):
+                oldest = datetime.fromisoformat(oldest)
+            months.append(_month_key(oldest))
+        return min(months) if months else None
+
+    def iter_months(self, columns=None, now=None):
+        """(month, DataFrame) for every month from the oldest result to now, oldest first"""
+        month = self.oldest_month()
+        if month is None:
+            return
+        last = _month_key(now or datetime.utcnow())
+        while month <= last:
+            start, end = _month_bounds(month)
+            yield month, self.query(start, end, columns=columns)
+            month = _month_key(end)
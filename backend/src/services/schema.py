@@ -0,0 +1,115 @@
+"""
+Schema Upgrades for PersonalizeAI Platform
+In-place changes to existing tables that db.create_all() does not make
+"""
+
+from datetime import datetime
+
+from sqlalchemy import inspect, select, text
+
+# Main database and every shard: (table, column) holding subscriber ids
+SUBSCRIBER_ID_COLUMNS = [
+    ('subscribers', 'id'),
+    ('personalization_results', 'subscriber_id'),
+    ('personalization_results_history', 'subscriber_id'),  # Altering the parent alters its partitions
+    ('ab_test_assignments', 'subscriber_id')
+]
+
+
+def _widen_subscriber_ids(connection):
+    """INTEGER -> BIGINT for subscriber id columns; returns the columns changed"""
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    changed = []
+    for table, column in SUBSCRIBER_ID_COLUMNS:
+        if table not in tables:
+            continue
+        current = {c['name']: c['type'] for c in inspector.get_columns(table)}.get(column)
+        if current is None or current.__visit_name__.upper() == 'BIGINT':
+            continue
+        connection.execute(text(f'ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT'))
+        changed.append(f'{table}.{column}')
+    if 'subscribers' in tables:
+        connection.execute(text('ALTER SEQUENCE IF EXISTS subscribers_id_seq AS BIGINT'))
+    return changed
+
+
+def _drop_shard_ab_test_keys(connection):
+    """Shards used to get personalization_results.ab_test_id -> ab_tests.id, which no shard can satisfy"""
+    inspector = inspect(connection)
+    if 'personalization_results' not in inspector.get_table_names():
+        return []
+    dropped = []
+    for key in inspector.get_foreign_keys('personalization_results'):
+        if key['referred_table'] == 'ab_tests' and key.get('name'):
+            connection.execute(text(f'ALTER TABLE personalization_results DROP CONSTRAINT {key["name"]}'))
+            dropped.append(key['name'])
+    return dropped
+
+
+def upgrade_engine(engine, shard=False):
+    """Apply every upgrade to one database; returns a description of each change"""
+    if engine.dialect.name != 'postgresql':
+        # SQLite stores any integer in INTEGER columns and does not enforce foreign keys by default
+        return []
+    with engine.begin() as connection:
+        changes = [f'widened {column} to BIGINT' for column in _widen_subscriber_ids(connection)]
+        if shard:
+            changes += [f'dropped foreign key {name}' for name in _drop_shard_ab_test_keys(connection)]
+        return changes
+
+
+def upgrade_schema():
+    """
+    Upgrade the main database and every subscriber shard.
+
+    Safe to run repeatedly: each step checks the current schema first.
+    Returns {database label: [changes]}.
+    """
+    from main import db
+    from services.sharding import get_shard_router
+
+    changes = {'main': upgrade_engine(db.engine)}
+    router = get_shard_router()
+    if router:
+        for shard, engine in enumerate(router.engines):
+            changes[f'shard {shard}'] = upgrade_engine(engine, shard=True)
+        registered = register_shard_emails(router)
+        if registered:
+            changes['main'].append(f'registered {registered} subscriber emails')
+    return changes
+
+
+def register_shard_emails(router, chunk_size=5000):
+    """Add sharded subscribers missing from the subscriber_emails registry; returns rows added"""
+    from main import db
+    from models.subscriber import Subscriber, SubscriberEmail
+
+    db.metadata.create_all(db.engine, tables=[SubscriberEmail.__table__])
+    now = datetime.utcnow()
+
+    def register(session):
+        added, last_id = 0, 0
+        while True:
+            rows = session.query(Subscriber.id, Subscriber.email).filter(Subscriber.id > last_id).order_by(
+                Subscriber.id
+            ).limit(chunk_size).all()
+            if not rows:
+                return added
+            last_id = rows[-1][0]
+            with db.engine.begin() as connection:
+                known = {email for (email,) in connection.execute(
+                    select(SubscriberEmail.email).where(SubscriberEmail.email.in_([email for _, email in rows]))
+                )}
+                missing = [{'email': email, 'subscriber_id': subscriber_id, 'created_at': now}
+                           for subscriber_id, email in rows if email not in known]
+                if missing:
+                    connection.execute(SubscriberEmail.__table__.insert(), missing)
+            added += len(missing)
+
+    # One shard at a time: every registry insert goes to the main database
+    added = 0
+    for shard in range(len(router)):
+        with router.session(shard) as session:
+            added += register(session)
+    return added
@@ -0,0 +1,249 @@
+"""
+Sequential Testing for PersonalizeAI Platform
+Always-valid mSPRT evaluation of every running A/B test in one batch
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+
+# Import db from main app
+from main import db
+
+# Success column counted for each target metric
+METRIC_EVENTS = {
+    'open_rate': 'opens',
+    'click_rate': 'clicks',
+    'conversion_rate': 'conversions'
+}
+
+# Standard deviation of the normal mixing distribution over the true rate
+# difference. Sized for typical newsletter effects (a few percentage points).
+DEFAULT_MIXING_SD = 0.03
+
+# The normal approximation needs a handful of successes and failures per arm
+MIN_ARM_EVENTS = 5
+
+RESULT_COLUMNS = ['id', 'created_at', 'ab_test_id', 'ab_test_variant', 'was_opened', 'was_clicked',
+                  'conversion_value']
+
+
+def _shard_result_frame(session, test_ids):
+    from models.personalization import PersonalizationResult
+
+    columns = [getattr(PersonalizationResult, name) for name in RESULT_COLUMNS]
+    rows = session.query(*columns).filter(PersonalizationResult.ab_test_id.in_(test_ids)).all()
+    return pd.DataFrame([tuple(row) for row in rows], columns=RESULT_COLUMNS)
+
+
+def load_variant_counts(test_ids):
+    """
+    {(test_id, variant): {'participants', 'opens', 'clicks', 'conversions', 'total_value'}}
+
+    Read through ResultsRetention.query(), so results already moved to the
+    warm or archived tiers still count, plus every shard's results with
+    sharded storage. Only months since the oldest test was created are scanned.
+    """
+    from models.personalization import ABTest
+    from services.retention import ResultsRetention
+    from services.sharding import get_shard_router
+
+    test_ids = list(test_ids)
+    if not test_ids:
+        return {}
+    since = db.session.query(func.min(func.coalesce(ABTest.created_at, ABTest.start_date))).filter(
+        ABTest.id.in_(test_ids)
+    ).scalar() or datetime(1970, 1, 1)
+    frame = ResultsRetention().query(since, ab_test_ids=test_ids, columns=RESULT_COLUMNS)
+    router = get_shard_router()
+    if router:
+        # Sharded results live next to their subscribers (hot tables only)
+        frames = [frame] + router.fan_out(lambda session, shard: _shard_result_frame(session, test_ids))
+        frame = pd.concat([f for f in frames if not f.empty] or [frame], ignore_index=True)
+    frame = frame[frame['ab_test_variant'].notna()]
+    if frame.empty:
+        return {}
+
+    value = pd.to_numeric(frame['conversion_value']).fillna(0.0)
+    grouped = pd.DataFrame({
+        'ab_test_id': frame['ab_test_id'].astype('int64'),
+        'variant': frame['ab_test_variant'].astype(str),
+        'opens': frame['was_opened'].fillna(False).astype(bool).astype(int),
+        'clicks': frame['was_clicked'].fillna(False).astype(bool).astype(int),
+        'conversions': (value > 0).astype(int),
+        'total_value': value
+    }).groupby(['ab_test_id', 'variant'])
+    totals = grouped.sum()
+    totals['participants'] = grouped.size()
+
+    return {
+        (int(test_id), variant): {
+            'participants': int(row.participants),
+            'opens': int(row.opens),
+            'clicks': int(row.clicks),
+            'conversions': int(row.conversions),
+            'total_value': float(row.total_value)
+        }
+        for (test_id, variant), row in totals.iterrows()
+    }
+
+
+def msprt(n_control, x_control, n_treatment, x_treatment, mixing_sd=DEFAULT_MIXING_SD):
+    """
+    Mixture sequential probability ratio test for a difference of two rates.
+
+    Works elementwise on arrays of any shape. With the difference estimate
+    theta = p_t - p_c, its variance V and a N(0, tau^2) mixture over the true
+    difference, the likelihood ratio against "no difference" is
+
+        sqrt(V / (V + tau^2)) * exp(tau^2 * theta^2 / (2 * V * (V + tau^2)))
+
+    and 1 / ratio is an always-valid p-value: it may be checked after every
+    batch of results without inflating the false positive rate, as long as
+    the running minimum is kept (Johari et al., "Always Valid Inference").
+    Returns (theta, variance, p_value).
+    """
+    n_control = np.asarray(n_control, dtype=np.float64)
+    n_treatment = np.asarray(n_treatment, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_control = np.where(n_control > 0, x_control / n_control, 0.0)
+        p_treatment = np.where(n_treatment > 0, x_treatment / n_treatment, 0.0)
+        theta = p_treatment - p_control
+        variance = (p_control * (1 - p_control) / n_control +
+                    p_treatment * (1 - p_treatment) / n_treatment)
+
+        tau2 = mixing_sd ** 2
+        log_ratio = (0.5 * np.log(variance / (variance + tau2)) +
+                     tau2 * theta ** 2 / (2 * variance * (variance + tau2)))
+        p_value = np.minimum(1.0, np.exp(-log_ratio))
+    p_value = np.where(np.isfinite(p_value), p_value, 1.0)
+    return theta, variance, p_value
+
+
+def always_valid_interval(theta, variance, alpha, mixing_sd=DEFAULT_MIXING_SD):
+    """Confidence sequence for the rate difference matching the mSPRT p-value"""
+    tau2 = mixing_sd ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        radius = np.sqrt(variance * (variance + tau2) / tau2 *
+                         (2 * np.log(1 / alpha) + np.log((variance + tau2) / variance)))
+    radius = np.where(np.isfinite(radius), radius, np.inf)
+    return theta - radius, theta + radius
+
+
+class SequentialEvaluator:
+    """
+    Evaluates every running A/B test at once.
+
+    Each variant is compared with the control (variant A) on the test's
+    target metric. The significance level, 1 - confidence_level, is
+    Bonferroni-split across the treatments. Each run intersects the current
+    always-valid interval for a treatment's difference with the intersection
+    kept in ABTest.sequential_results (max lower, min upper bound). A test
+    stops once a treatment's running interval lies above zero (best such
+    treatment wins), or every treatment's lies below zero (control wins).
+    The running minimum p-value is reported alongside.
+    """
+
+    def __init__(self, mixing_sd=DEFAULT_MIXING_SD, auto_stop=True):
+        self.mixing_sd = mixing_sd
+        self.auto_stop = auto_stop
+
+    def evaluate(self, tests=None, now=None):
+        """Evaluate tests (default: all running); returns {test_id: decision or None}"""
+        from models.personalization import ABTest
+
+        tests = [t for t in (tests if tests is not None else ABTest.get_active_tests())
+                 if t.target_metric in METRIC_EVENTS and len(t.variants or []) >= 2]
+        if not tests:
+            return {}
+        now = now or datetime.utcnow()
+
+        counts = load_variant_counts([t.id for t in tests])
+        width = max(len(t.variant_labels()) for t in tests)
+        n = np.zeros((len(tests), width))
+        x = np.zeros((len(tests), width))
+        present = np.zeros((len(tests), width), dtype=bool)
+        previous_p = np.ones((len(tests), width))
+        previous_lower = np.full((len(tests), width), -np.inf)
+        previous_upper = np.full((len(tests), width), np.inf)
+        for i, test in enumerate(tests):
+            event = METRIC_EVENTS[test.target_metric]
+            previous = ((test.sequential_results or {}).get('variants') or {})
+            for j, label in enumerate(test.variant_labels()):
+                row = counts.get((test.id, label))
+                present[i, j] = True
+                if row:
+                    n[i, j], x[i, j] = row['participants'], row[event]
+                previous_p[i, j] = (previous.get(label) or {}).get('p_value', 1.0)
+                interval = (previous.get(label) or {}).get('interval')
+                if interval:
+                    previous_lower[i, j], previous_upper[i, j] = interval
+
+        # Treatments (columns 1..) against control (column 0), for all tests at once
+        theta, variance, p_value = msprt(n[:, :1], x[:, :1], n[:, 1:], x[:, 1:], self.mixing_sd)
+        enough = ((x >= MIN_ARM_EVENTS) & (n - x >= MIN_ARM_EVENTS))
+        valid = present[:, 1:] & enough[:, 1:] & enough[:, :1]
+        p_value = np.where(valid, np.minimum(p_value, previous_p[:, 1:]), previous_p[:, 1:])
+
+        treatments = present[:, 1:].sum(axis=1)
+        alpha = np.array([1.0 - (t.confidence_level or 0.95) for t in tests]) / np.maximum(treatments, 1)
+        lower, upper = always_valid_interval(theta, variance, alpha[:, None], self.mixing_sd)
+        # Running intersection: the true difference lies in every interval at once
+        lower = np.where(valid, np.maximum(lower, previous_lower[:, 1:]), previous_lower[:, 1:])
+        upper = np.where(valid, np.minimum(upper, previous_upper[:, 1:]), previous_upper[:, 1:])
+        better = present[:, 1:] & (lower > 0)
+        worse = present[:, 1:] & (upper < 0) & ~better
+        significant = better | worse
+
+        rates = np.divide(x, n, out=np.zeros_like(x), where=n > 0)
+        decisions = {}
+        for i, test in enumerate(tests):
+            labels = test.variant_labels()
+            decision = None
+            if better[i].any():
+                best = int(np.argmax(np.where(better[i], rates[i, 1:], -np.inf))) + 1
+                decision = {'winning_variant': labels[best], 'reason': 'treatment_better'}
+            elif treatments[i] and worse[i, :treatments[i]].all():
+                decision = {'winning_variant': labels[0], 'reason': 'control_better'}
+            if decision and n[i].sum() < (test.minimum_sample_size or 0):
+                decision = None
+
+            variants = {
+                labels[0]: {'participants': int(n[i, 0]), 'successes': int(x[i, 0]),
+                            'rate': round(float(rates[i, 0]), 6), 'control': True}
+            }
+            for j in range(1, len(labels)):
+                k = j - 1
+                variants[labels[j]] = {
+                    'participants': int(n[i, j]),
+                    'successes': int(x[i, j]),
+                    'rate': round(float(rates[i, j]), 6),
+                    'difference': round(float(theta[i, k]), 6) if valid[i, k] else None,
+                    'p_value': float(p_value[i, k]),
+                    # Unrounded: the next run intersects with it
+                    'interval': ([float(lower[i, k]), float(upper[i, k])]
+                                 if np.isfinite(lower[i, k]) and np.isfinite(upper[i, k]) else None),
+                    'significant': bool(significant[i, k])
+                }
+
+            if decision:
+                decision['decided_at'] = now.isoformat()
+            test.sequential_results = {
+                'evaluated_at': now.isoformat(),
+                'metric': test.target_metric,
+                'alpha': float(alpha[i]),
+                'mixing_sd': self.mixing_sd,
+                'variants': variants,
+                'decision': decision
+            }
+            if decision:
+                test.statistical_significance_reached = True
+                test.winning_variant = decision['winning_variant']
+                if self.auto_stop:
+                    test.stop_test()
+            decisions[test.id] = decision
+
+        db.session.commit()
+        return decisions
@@ -0,0 +1,395 @@
+"""
+Subscriber Sharding for PersonalizeAI Platform
+Distributes subscribers and their personalization results across several databases
+"""
+
+import heapq
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import Column, ForeignKey, MetaData, Table, create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from services.hashing import stable_hash, jump_hash
+
+ID_EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+
+
+def allocate_subscriber_id():
+    """
+    Globally unique subscriber id: 41 bits of milliseconds since 2024 plus 12
+    random bits. Fits in 53 bits so ids stay exact in JavaScript clients.
+    """
+    millis = int(time.time() * 1000) - ID_EPOCH_MS
+    return (millis << 12) | random.getrandbits(12)
+
+
+class ShardRouter:
+    """
+    Routes subscribers to shards by jump consistent hash of their id.
+
+    PersonalizationResult rows live on their subscriber's shard. Point lookups
+    touch one shard; listings, counts and segments fan out to every shard in
+    parallel and merge the per-shard results.
+    """
+
+    def __init__(self, urls):
+        if not urls:
+            raise ValueError('At least one shard URL is required')
+        self.urls = list(urls)
+        self.engines = [create_engine(url, pool_pre_ping=True) for url in self.urls]
+        self._executor = ThreadPoolExecutor(max_workers=len(self.engines),
+                                            thread_name_prefix='subscriber-shard')
+
+    def __len__(self):
+        return len(self.engines)
+
+    def shard_for(self, subscriber_id):
+        return jump_hash(stable_hash(subscriber_id), len(self.engines))
+
+    @contextmanager
+    def session(self, shard):
+        session = Session(self.engines[shard], expire_on_commit=False)
+        try:
+            yield session
+        finally:
+            session.close()
+
+    @staticmethod
+    def shard_metadata():
+        """
+        Shard copies of the subscribers and personalization_results tables.
+
+        A/B tests stay in the main database, so shard results keep ab_test_id
+        without a foreign key (the main schema's ab_tests FK could never be
+        satisfied on a shard).
+        """
+        from models.subscriber import Subscriber
+        from models.personalization import PersonalizationResult
+
+        metadata = MetaData()
+        Subscriber.__table__.to_metadata(metadata)
+        Table(PersonalizationResult.__tablename__, metadata, *[
+            Column(c.name, c.type, *[ForeignKey(fk.target_fullname) for fk in c.foreign_keys
+                                     if fk.column.table.name == Subscriber.__tablename__],
+                   primary_key=c.primary_key, nullable=c.nullable, index=c.index)
+            for c in PersonalizationResult.__table__.columns
+        ])
+        return metadata
+
+    def create_tables(self):
+        """Create the sharded tables on every shard"""
+        metadata = self.shard_metadata()
+        for engine in self.engines:
+            metadata.create_all(engine)
+
+    def fan_out(self, fn):
+        """Run fn(session, shard) on every shard in parallel; results in shard order"""
+        def run(shard):
+            with self.session(shard) as session:
+                return fn(session, shard)
+        return list(self._executor.map(run, range(len(self.engines))))
+
+    # ------------------------------------------------------------------
+    # Point operations (one shard)
+    # ------------------------------------------------------------------
+
+    def get(self, subscriber_id):
+        from models.subscriber import Subscriber
+
+        with self.session(self.shard_for(subscriber_id)) as session:
+            return session.get(Subscriber, subscriber_id)
+
+    def get_by_email(self, email):
+        from main import db
+        from models.subscriber import SubscriberEmail
+
+        subscriber_id = db.session.query(SubscriberEmail.subscriber_id).filter_by(email=email).scalar()
+        return self.get(subscriber_id) if subscriber_id is not None else None
+
+    def _claim_email(self, email, subscriber_id):
+        """Register email for subscriber_id in the main database; False if it is taken"""
+        from main import db
+        from models.subscriber import SubscriberEmail
+
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(SubscriberEmail.__table__.insert(), [{
+                    'email': email, 'subscriber_id': subscriber_id, 'created_at': datetime.utcnow()
+                }])
+            return True
+        except IntegrityError:
+            return False
+
+    def _register_email(self, email, subscriber_id=None):
+        """Point a claimed email at subscriber_id, or release it when subscriber_id is None"""
+        from main import db
+        from models.subscriber import SubscriberEmail
+
+        table = SubscriberEmail.__table__
+        with db.engine.begin() as connection:
+            if subscriber_id is None:
+                connection.execute(table.delete().where(table.c.email == email))
+            else:
+                connection.execute(table.update().where(table.c.email == email).values(subscriber_id=subscriber_id))
+
+    def create(self, **fields):
+        """
+        Insert a subscriber on its shard; returns None if the email already exists.
+
+        The email is claimed in the main database's subscriber_emails registry
+        first, so two concurrent creates of one email cannot both succeed on
+        different shards. An id collision retries with a new id (and possibly
+        another shard) under the same claim.
+        """
+        from models.subscriber import Subscriber
+
+        email = fields['email']
+        subscriber_id = allocate_subscriber_id()
+        if not self._claim_email(email, subscriber_id):
+            return None
+        try:
+            for _attempt in range(3):
+                subscriber = Subscriber(id=subscriber_id, **fields)
+                with self.session(self.shard_for(subscriber_id)) as session:
+                    session.add(subscriber)
+                    try:
+                        session.commit()
+                    except IntegrityError:
+                        session.rollback()
+                        if session.get(Subscriber, subscriber_id) is None:
+                            # Not an id collision: the shard already has this email from before the registry
+                            self._register_email(email)
+                            return None
+                    else:
+                        return subscriber
+                subscriber_id = allocate_subscriber_id()
+                self._register_email(email, subscriber_id)
+            raise RuntimeError('Could not allocate a unique subscriber id')
+        except Exception:
+            self._register_email(email)
+            raise
+
+    def update(self, subscriber_id, fields):
+        from models.subscriber import Subscriber
+
+        with self.session(self.shard_for(subscriber_id)) as session:
+            subscriber = session.get(Subscriber, subscriber_id)
+            if subscriber is None:
+                return None
+            for field, value in fields.items():
+                setattr(subscriber, field, value)
+            subscriber.updated_at = datetime.utcnow()
+            session.commit()
+            return subscriber
+
+    def delete(self, subscriber_id):
+        from models.subscriber import Subscriber
+        from models.personalization import PersonalizationResult
+
+        with self.session(self.shard_for(subscriber_id)) as session:
+            session.query(PersonalizationResult).filter_by(subscriber_id=subscriber_id).delete()
+            deleted = session.query(Subscriber).filter_by(id=subscriber_id).delete()
+            session.commit()
+        if deleted:
+            self.release_emails([subscriber_id])
+        return bool(deleted)
+
+    def release_emails(self, subscriber_ids):
+        """Drop deleted subscribers from the email registry"""
+        from main import db
+        from models.subscriber import SubscriberEmail
+
+        table = SubscriberEmail.__table__
+        with db.engine.begin() as connection:
+            connection.execute(table.delete().where(table.c.subscriber_id.in_(list(subscriber_ids))))
+
+    def add_result(self, subscriber_id, **fields):
+        """Store a personalization result next to its subscriber"""
+        from models.personalization import PersonalizationResult
+
+        with self.session(self.shard_for(subscriber_id)) as session:
+            result = PersonalizationResult(subscriber_id=subscriber_id, **fields)
+            session.add(result)
+            session.commit()
+            return result
+
+    # ------------------------------------------------------------------
+    # Fan-out queries
+    # ------------------------------------------------------------------
+
+    def count(self, **filters):
+        from models.subscriber import Subscriber
+
+        return sum(self.fan_out(
+            lambda session, shard: Subscriber.apply_filters(session.query(Subscriber), **filters).count()
+        ))
+
+    def list(self, page=1, per_page=20, sort_by='created_at', sort_order='desc', **filters):
+        """
+        One page of subscribers across all shards.
+
+        Each shard returns its first page * per_page rows in order; the
+        sorted streams are merged and the requested page sliced off.
+        Returns (subscribers, total).
+        """
+        from models.subscriber import Subscriber
+
+        sort_by = Subscriber.sort_attribute(sort_by)
+        column = getattr(Subscriber, sort_by)
+        descending = sort_order == 'desc'
+        depth = page * per_page
+
+        def shard_page(session, shard):
+            query = Subscriber.apply_filters(session.query(Subscriber), **filters)
+            total = query.count()
+            ordering = ([column.desc().nullslast(), Subscriber.id.desc()] if descending
+                        else [column.asc().nullsfirst(), Subscriber.id.asc()])
+            return query.order_by(*ordering).limit(depth).all(), total
+
+        results = self.fan_out(shard_page)
+        total = sum(total for _, total in results)
+
+        def sort_key(subscriber):
+            value = getattr(subscriber, sort_by)
+            # None sorts first ascending / last descending, matching the per-shard order
+            return (value is not None, value if value is not None else 0, subscriber.id)
+
+        merged = heapq.merge(*[rows for rows, _ in results], key=sort_key, reverse=descending)
+        rows = list(merged)[(page - 1) * per_page:depth]
+        return rows, total
+
+    def collect(self, refine, order_by=None, descending=True, limit=None):
+        """
+        Subscribers matching refine(query) on every shard, merged.
+
+        With order_by, each shard returns its first `limit` rows by that
+        column (NULLs last) and the merged list is cut to `limit`.
+        """
+        from models.subscriber import Subscriber
+
+        def shard_rows(session, shard):
+            query = refine(session.query(Subscriber))
+            if order_by:
+                column = getattr(Subscriber, order_by)
+                query = query.order_by(column.desc().nullslast() if descending else column.asc().nullslast())
+            if limit is not None:
+                query = query.limit(limit)
+            return query.all()
+
+        rows = [subscriber for rows in self.fan_out(shard_rows) for subscriber in rows]
+        if order_by:
+            present = sorted((s for s in rows if getattr(s, order_by) is not None),
+                             key=lambda s: getattr(s, order_by), reverse=descending)
+            rows = present + [s for s in rows if getattr(s, order_by) is None]
+        return rows[:limit] if limit is not None else rows
+
+    def top(self, column_name, limit=10, descending=True, **filters):
+        """Segment query: top `limit` subscribers by a column across all shards"""
+        rows, _total = self.list(page=1, per_page=limit, sort_by=column_name,
+                                 sort_order='desc' if descending else 'asc', **filters)
+        return rows
+
+    # ------------------------------------------------------------------
+    # Rebalancing
+    # ------------------------------------------------------------------
+
+    def rebalance(self, new_urls, chunk_size=1000):
+        """
+        Move rows after adding shards: new_urls must extend the current URL list.
+
+        With jump consistent hashing only rows whose shard changes (about
+        1 / new shard count of them) are copied, subscriber first and then
+        its results, and deleted from the old shard. Returns rows moved per
+        shard.
+        """
+        from models.subscriber import Subscriber
+        from models.personalization import PersonalizationResult
+
+        if list(new_urls[:len(self.urls)]) != self.urls:
+            raise ValueError('New shard URLs must extend the existing list in order')
+        target = ShardRouter(new_urls)
+        target.create_tables()
+
+        subscriber_columns = [c.name for c in Subscriber.__table__.columns]
+        result_columns = [c.name for c in PersonalizationResult.__table__.columns]
+        moved = {}
+        for shard in range(len(self.engines)):
+            last_id = 0
+            while True:
+                with target.session(shard) as source:
+                    subscribers = source.query(Subscriber).filter(Subscriber.id > last_id).order_by(
+                        Subscriber.id
+                    ).limit(chunk_size).all()
+                    if not subscribers:
+                        break
+                    last_id = subscribers[-1].id
+                    relocate = {}
+                    for subscriber in subscribers:
+                        destination = target.shard_for(subscriber.id)
+                        if destination != shard:
+                            relocate.setdefault(destination, []).append(subscriber)
+
+                    for destination, batch in relocate.items():
+                        ids = [s.id for s in batch]
+                        results = source.query(PersonalizationResult).filter(
+                            PersonalizationResult.subscriber_id.in_(ids)
+                        ).all()
+                        with target.session(destination) as sink:
+                            sink.execute(Subscriber.__table__.insert(), [
+                                {c: getattr(s, c) for c in subscriber_columns} for s in batch
+                            ])
+                            if results:
+                                sink.execute(PersonalizationResult.__table__.insert(), [
+                                    {c: getattr(r, c) for c in result_columns} for r in results
+                                ])
+                            sink.commit()
+                        source.query(PersonalizationResult).filter(
+                            PersonalizationResult.subscriber_id.in_(ids)
+                        ).delete(synchronize_session=False)
+                        source.query(Subscriber).filter(Subscriber.id.in_(ids)).delete(
+                            synchronize_session=False
+                        )
+                        source.commit()
+                        moved[destination] = moved.get(destination, 0) + len(ids)
+        return moved
+
+
+class ShardingNotSupported(Exception):
+    """The operation reads subscribers or results from the main database only"""
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def shard_urls_from_env():
+    return [url.strip() for url in os.getenv('SUBSCRIBER_SHARD_URLS', '').split(',') if url.strip()]
+
+
+def get_shard_router():
+    """Shard router when SUBSCRIBER_SHARD_URLS is set, otherwise None (single database)"""
+    global _router
+    if _router is None:
+        urls = shard_urls_from_env()
+        if not urls:
+            return None
+        with _router_lock:
+            if _router is None:
+                router = ShardRouter(urls)
+                router.create_tables()
+                _router = router
+    return _router
+
+
+def require_unsharded(operation):
+    """Raise ShardingNotSupported when SUBSCRIBER_SHARD_URLS is set"""
+    if get_shard_router() is not None:
+        raise ShardingNotSupported(f'{operation} is not available with sharded subscriber storage '
+                                   '(SUBSCRIBER_SHARD_URLS is set)')
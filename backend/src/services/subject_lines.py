@@ -0,0 +1,306 @@
+"""
+Subject Line Generation for PersonalizeAI Platform
+Races the upstream model against a local template generator under a latency budget
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from services.hashing import stable_hash
+
+LOCAL_SOURCE = 'local-template'
+MAX_SUBJECT_LENGTH = 78
+
+PLACEHOLDER = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+# Used when no subject_line ContentTemplate applies
+DEFAULT_TEMPLATES = [
+    {'name': 'name_top_stock', 'content': '{{first_name}}, {{top_stock}} Leads Today\'s {{content_label}}', 'score': 0.8},
+    {'name': 'name_stocks_sentiment', 'content': '{{first_name}}: {{top_stocks}} in a {{sentiment}} Market', 'score': 0.75},
+    {'name': 'risk_profile', 'content': '{{content_label}} for {{risk_label}} Investors: {{top_stocks}}', 'score': 0.7},
+    {'name': 'name_base', 'content': '{{first_name}}, {{base_subject}}', 'score': 0.6},
+    {'name': 'base', 'content': '{{base_subject}}', 'score': 0.3}
+]
+
+RISK_LABELS = {'conservative': 'Conservative', 'moderate': 'Balanced', 'aggressive': 'Growth'}
+SENTIMENT_LABELS = {'bullish': 'Bullish', 'bearish': 'Bearish', 'neutral': 'Steady'}
+
+# Placeholders that make a subject line personal, for the confidence score
+PERSONAL_VARIABLES = {'first_name', 'top_stock', 'top_stocks', 'risk_label', 'experience_label'}
+
+
+def subject_line_context(subscriber, content_type, base_subject, market_context):
+    """Plain-data view of a request, safe to hand to another thread"""
+    market_context = market_context or {}
+    stocks = [str(s).upper() for s in market_context.get('trending_stocks') or []]
+    return {
+        'subscriber_id': subscriber.id,
+        'first_name': subscriber.first_name,
+        'risk_tolerance': subscriber.risk_tolerance,
+        'investment_experience': subscriber.investment_experience,
+        'portfolio_size': subscriber.portfolio_size,
+        'ai_persona': subscriber.ai_persona,
+        'preferred_content_types': subscriber.preferred_content_types or [],
+        'content_type': content_type,
+        'base_subject': base_subject,
+        'trending_stocks': stocks,
+        'market_sentiment': market_context.get('market_sentiment')
+    }
+
+
+def template_variables(context):
+    """Values for {{placeholders}}; a missing value makes templates that need it ineligible"""
+    stocks = context['trending_stocks']
+    values = {
+        'first_name': (context['first_name'] or '').strip() or None,
+        'base_subject': context['base_subject'] or None,
+        'content_label': (context['content_type'] or '').replace('_', ' ').title() or None,
+        'top_stock': stocks[0] if stocks else None,
+        'top_stocks': ' & '.join(stocks[:2]) if stocks else None,
+        'sentiment': SENTIMENT_LABELS.get(context['market_sentiment']),
+        'risk_label': RISK_LABELS.get(context['risk_tolerance']),
+        'experience_label': (context['investment_experience'] or '').title() or None,
+        'persona': (context['ai_persona'] or '').replace('_', ' ').title() or None
+    }
+    return {key: value for key, value in values.items() if value}
+
+
+def render_template(content, values):
+    """Fill {{placeholders}}; None if any placeholder has no value"""
+    needed = PLACEHOLDER.findall(content)
+    if any(name not in values for name in needed):
+        return None
+    subject = PLACEHOLDER.sub(lambda m: values[m.group(1)], content)
+    subject = ' '.join(subject.split())
+    if len(subject) > MAX_SUBJECT_LENGTH:
+        subject = subject[:MAX_SUBJECT_LENGTH].rsplit(' ', 1)[0].rstrip(',:;-') + '...'
+    return subject
+
+
+class TemplateCache:
+    """Active subject_line ContentTemplates, reloaded at most every max_age seconds"""
+
+    def __init__(self, max_age=60.0):
+        self.max_age = max_age
+        self._templates = []
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def get(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age:
+            from models.personalization import ContentTemplate
+
+            with self._lock:
+                rows = ContentTemplate.query.filter_by(template_type='subject_line', is_active=True).all()
+                self._templates = [{
+                    'name': row.template_name,
+                    'content': row.template_content,
+                    'score': row.avg_performance_score or 0.0,
+                    'rules': row.personalization_rules or {}
+                } for row in rows]
+                self._loaded_at = time.monotonic()
+        return self._templates
+
+
+template_cache = TemplateCache()
+
+
+class LocalSubjectLineGenerator:
+    """
+    Deterministic subject lines from templates, subscriber fields and market context.
+
+    Candidates are the active subject_line ContentTemplates whose
+    personalization_rules allow the request (optional 'content_types' and
+    'risk_tolerance' lists) and whose placeholders can all be filled, falling
+    back to DEFAULT_TEMPLATES. Among the best-performing candidates one is
+    picked by a stable hash of the subscriber and request, so the same request
+    always yields the same line.
+    """
+
+    def __init__(self, templates=template_cache, shortlist=3):
+        self.templates = templates
+        self.shortlist = shortlist
+
+    @staticmethod
+    def _allowed(template, context):
+        rules = template.get('rules') or {}
+        for field, key in (('content_types', 'content_type'), ('risk_tolerance', 'risk_tolerance')):
+            if rules.get(field) and context[key] not in rules[field]:
+                return False
+        return True
+
+    def generate(self, context, template=None):
+        values = template_variables(context)
+        if template is not None:
+            candidates = [{'name': 'ab_variant', 'content': template, 'score': 1.0}]
+        else:
+            candidates = [t for t in self.templates.get() if self._allowed(t, context)] + DEFAULT_TEMPLATES
+
+        rendered = []
+        for candidate in candidates:
+            subject = render_template(candidate['content'], values)
+            if subject:
+                rendered.append((candidate, subject))
+        if not rendered:
+            subject = context['base_subject'] or (values.get('content_label') or 'Your Market Update')
+            return {'subject': subject, 'score': 0.1, 'reasoning': 'No template could be filled; using the base subject'}
+
+        rendered.sort(key=lambda pair: -pair[0]['score'])
+        shortlist = rendered[:self.shortlist]
+        key = stable_hash(context['subscriber_id'], context['content_type'], context['base_subject'],
+                          ','.join(context['trending_stocks']))
+        candidate, subject = shortlist[key % len(shortlist)]
+
+        used = set(PLACEHOLDER.findall(candidate['content'])) & PERSONAL_VARIABLES
+        return {
+            'subject': subject,
+            'score': round(min(0.4 + 0.15 * len(used), 0.9), 2),
+            'reasoning': (f"Template '{candidate['name']}' filled with "
+                          f"{', '.join(sorted(used)) if used else 'the base subject'}")
+        }
+
+
+class ModelSubjectLineGenerator:
+    """Subject lines from the OpenAI chat API"""
+
+    def __init__(self, model=None, api_key=None, timeout=10.0):
+        self.model = model or os.getenv('PERSONALIZE_MODEL', 'gpt-4')
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
+        self.timeout = timeout
+        self._client = None
+
+    @property
+    def available(self):
+        return bool(self.api_key)
+
+    def _get_client(self):
+        if self._client is None:
+            from openai import OpenAI
+
+            # No retries: the latency budget decides what happens when a call is slow or fails
+            self._client = OpenAI(api_key=self.api_key, timeout=self.timeout, max_retries=0)
+        return self._client
+
+    def _prompt(self, context, template=None):
+        profile = {key: context[key] for key in ('first_name', 'risk_tolerance', 'investment_experience',
+                                                 'portfolio_size', 'ai_persona', 'preferred_content_types')}
+        return (
+            'Write one email subject line for an investment newsletter subscriber.\n'
+            f'Subscriber: {json.dumps(profile)}\n'
+            f'Content type: {context["content_type"]}\n'
+            f'Base subject: {template or context["base_subject"]}\n'
+            f'Trending stocks: {", ".join(context["trending_stocks"]) or "none"}\n'
+            f'Market sentiment: {context["market_sentiment"] or "unknown"}\n'
+            f'Keep it under {MAX_SUBJECT_LENGTH} characters. Reply with JSON: '
+            '{"subject": "...", "reasoning": "...", "score": 0.0-1.0}'
+        )
+
+    def generate(self, context, template=None):
+        response = self._get_client().chat.completions.create(
+            model=self.model,
+            messages=[
+                {'role': 'system', 'content': 'You write concise, compliant subject lines for financial newsletters.'},
+                {'role': 'user', 'content': self._prompt(context, template)}
+            ],
+            temperature=0.7,
+            max_tokens=120
+        )
+        text = (response.choices[0].message.content or '').strip()
+        try:
+            parsed = json.loads(text)
+        except ValueError:
+            parsed = {'subject': text.splitlines()[0] if text else ''}
+        subject = ' '.join(str(parsed.get('subject', '')).strip().strip('"').split())
+        if not subject:
+            raise ValueError('Model returned an empty subject line')
+        return {
+            'subject': subject[:MAX_SUBJECT_LENGTH],
+            'score': float(parsed.get('score') or 0.85),
+            'reasoning': parsed.get('reasoning') or 'Generated by the language model'
+        }
+
+
+class HedgedSubjectLineService:
+    """
+    Returns the model's subject line if it arrives within the latency budget,
+    otherwise the local one.
+
+    The local line is computed while the model call is in flight, so it is
+    always ready when the deadline passes. Calls that miss the deadline are
+    left to finish on the pool (bounded by the client timeout) and their
+    results discarded. At most max_in_flight model calls run at once; beyond
+    that, requests go straight to the local generator instead of queueing
+    behind a degraded upstream.
+    """
+
+    def __init__(self, model=None, local=None, default_budget_ms=None, max_in_flight=None):
+        self.model = model or ModelSubjectLineGenerator(
+            timeout=float(os.getenv('PERSONALIZE_MODEL_TIMEOUT_SECONDS', '10'))
+        )
+        self.local = local or LocalSubjectLineGenerator()
+        self.default_budget_ms = (default_budget_ms if default_budget_ms is not None
+                                  else int(os.getenv('PERSONALIZE_LATENCY_BUDGET_MS', '800')))
+        max_in_flight = max_in_flight or int(os.getenv('PERSONALIZE_MAX_MODEL_CALLS', '32'))
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='subject-line-model')
+
+    def _call_model(self, context, template):
+        try:
+            return self.model.generate(context, template)
+        finally:
+            self._slots.release()
+
+    def generate(self, context, budget_ms=None, template=None):
+        """{'subject', 'score', 'reasoning', 'source', 'fallback_reason', 'latency_ms'}"""
+        started = time.perf_counter()
+        budget_ms = self.default_budget_ms if budget_ms is None else budget_ms
+
+        future, fallback_reason = None, None
+        if budget_ms <= 0:
+            fallback_reason = 'local_only'
+        elif not self.model.available:
+            fallback_reason = 'model_unavailable'
+        elif not self._slots.acquire(blocking=False):
+            fallback_reason = 'model_saturated'
+        else:
+            try:
+                future = self._executor.submit(self._call_model, context, template)
+            except RuntimeError:
+                self._slots.release()
+                fallback_reason = 'model_unavailable'
+
+        local = self.local.generate(context, template)
+
+        if future is not None:
+            remaining = budget_ms / 1000.0 - (time.perf_counter() - started)
+            try:
+                result = future.result(timeout=max(remaining, 0.0))
+                return dict(result, source=self.model.model, fallback_reason=None,
+                            latency_ms=round((time.perf_counter() - started) * 1000, 2))
+            except FutureTimeout:
+                fallback_reason = 'deadline_exceeded'
+            except Exception:
+                fallback_reason = 'model_error'
+
+        return dict(local, source=LOCAL_SOURCE, fallback_reason=fallback_reason,
+                    latency_ms=round((time.perf_counter() - started) * 1000, 2))
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_subject_line_service():
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = HedgedSubjectLineService()
+    return _service
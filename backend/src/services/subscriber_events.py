@@ -0,0 +1,166 @@
+"""
+Subscriber Change Notifications for PersonalizeAI Platform
+Lets caches and indexes react to subscriber writes without coupling to the routes
+"""
+
+import threading
+import time
+from datetime import timedelta
+
+_listeners = []
+
+
+def on_subscribers_changed(listener):
+    """Register listener(subscriber_ids, action); usable as a decorator"""
+    _listeners.append(listener)
+    return listener
+
+
+def notify_subscribers_changed(subscriber_ids, action):
+    """Notify listeners once for a batch of changed subscribers (action: created, updated, deleted)"""
+    for listener in _listeners:
+        listener(list(subscriber_ids), action)
+
+
+class SubscriberChangeFeed:
+    """
+    Subscriber writes made by any worker process, read back from the table.
+
+    Listeners only hear about writes made in their own process. Every write
+    sets Subscriber.updated_at, so rows updated since the last poll are the
+    changed ones. Each poll looks back `lookback` seconds to catch
+    transactions that committed late with earlier timestamps; rows already
+    reported with the same updated_at are skipped. Deletions are found by
+    comparing the table's ids with the caller's when the row counts differ.
+    """
+
+    def __init__(self, poll_interval=5.0, lookback=60.0):
+        self.poll_interval = poll_interval
+        self.lookback = timedelta(seconds=lookback)
+        self._watermark = None
+        self._seen = {}  # subscriber_id -> updated_at, for rows inside the lookback window
+        self._polled_at = 0.0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Start from the table as it is now (call just before a full build)"""
+        from main import db
+        from models.subscriber import Subscriber
+        from sqlalchemy import func
+
+        self._watermark = db.session.query(func.max(Subscriber.updated_at)).scalar()
+        self._seen = {}
+        self._polled_at = time.monotonic()
+
+    def poll(self, force=False):
+        """Ids written since the last poll; None if poll_interval has not passed yet"""
+        from main import db
+        from models.subscriber import Subscriber
+
+        if not force and time.monotonic() - self._polled_at < self.poll_interval:
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None  # Another request thread is polling
+        try:
+            self._polled_at = time.monotonic()
+            query = db.session.query(Subscriber.id, Subscriber.updated_at)
+            if self._watermark is not None:
+                query = query.filter(Subscriber.updated_at > self._watermark - self.lookback)
+            rows = query.all()
+            changed = {subscriber_id for subscriber_id, updated_at in rows
+                       if self._seen.get(subscriber_id) != updated_at}
+            self._seen = {subscriber_id: updated_at for subscriber_id, updated_at in rows}
+            stamps = [updated_at for _, updated_at in rows if updated_at is not None]
+            if stamps:
+                self._watermark = max(stamps + ([self._watermark] if self._watermark else []))
+            return changed
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def reconcile(known_count, known_ids):
+        """
+        (missing, deleted) ids when the table's row count differs from
+        known_count; known_ids is a callable so it is only built when needed.
+        """
+        from main import db
+        from models.subscriber import Subscriber
+        from sqlalchemy import func
+
+        if db.session.query(func.count(Subscriber.id)).scalar() == known_count:
+            return set(), set()
+        table_ids = {row[0] for row in db.session.query(Subscriber.id)}
+        known = set(known_ids())
+        return table_ids - known, known - table_ids
+
+
+class IndexNotReady(Exception):
+    """A subscriber index is still being built in the background"""
+
+
+class BackgroundIndex:
+    """
+    A process-wide index built on a background thread on first use.
+
+    get() returns the index once it is built. Until then it starts the build
+    (if it is not already running) and raises IndexNotReady, so no request
+    waits for a full pass over the subscribers table. run() does the same for
+    the index's own rebuilds once it is serving.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.index = None
+        self._thread = None
+        self._task = None
+        self._lock = threading.Lock()
+
+    def get(self, wait=False):
+        if self.index is not None:
+            return self.index
+        from flask import current_app
+
+        with self._lock:
+            if self.index is None and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._build, args=(current_app._get_current_object(),),
+                                                name=f'{self.name}-build', daemon=True)
+                self._thread.start()
+            thread = self._thread
+        if wait:
+            thread.join()
+        if self.index is None:
+            raise IndexNotReady(f'The {self.name} index is being built; retry shortly')
+        return self.index
+
+    def _build(self, app):
+        with app.app_context():
+            try:
+                self.index = self.factory()
+            except Exception:
+                app.logger.exception('Building the %s index failed', self.name)
+
+    def run(self, task, wait=False):
+        """
+        Run task() on a background thread with an app context, unless a
+        previous one is still running; returns whether it was started
+        """
+        from flask import current_app
+
+        with self._lock:
+            started = self._task is None or not self._task.is_alive()
+            if started:
+                self._task = threading.Thread(target=self._run, args=(current_app._get_current_object(), task),
+                                              name=f'{self.name}-rebuild', daemon=True)
+                self._task.start()
+            thread = self._task
+        if wait:
+            thread.join()
+        return started
+
+    def _run(self, app, task):
+        with app.app_context():
+            try:
+                task()
+            except Exception:
+                app.logger.exception('Rebuilding the %s index failed', self.name)
@@ -0,0 +1,140 @@
+"""
+Subscriber Feature Encoding for PersonalizeAI Platform
+Turns Subscriber attributes into dense numeric vectors for similarity and clustering
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+# Import db from main app
+from main import db
+
+TIERS = ['basic', 'premium', 'enterprise']
+RISK_LEVELS = ['conservative', 'moderate', 'aggressive']
+EXPERIENCE_LEVELS = ['beginner', 'intermediate', 'advanced']
+PORTFOLIO_SIZES = ['<10k', '10k-100k', '100k-1m', '>1m']  # Ordinal
+CONTENT_TYPES = ['market_analysis', 'stock_picks', 'education', 'dividend_stocks',
+                 'growth_stocks', 'crypto', 'retirement', 'options']
+
+
+def _feature_columns():
+    from models.subscriber import Subscriber, ENGAGEMENT_SCORING_MODE
+
+    # In decayed mode the stored score is stale; the decay key gives the current one
+    engagement = (Subscriber.engagement_decay_key if ENGAGEMENT_SCORING_MODE == 'decayed'
+                  else Subscriber.engagement_score)
+    return [
+        Subscriber.id,
+        Subscriber.subscription_tier,
+        Subscriber.risk_tolerance,
+        Subscriber.investment_experience,
+        Subscriber.portfolio_size,
+        engagement,
+        Subscriber.churn_risk_score,
+        Subscriber.preferred_content_types,
+        Subscriber.content_preferences
+    ]
+
+
+FEATURE_NAMES = (
+    [f'tier={v}' for v in TIERS] +
+    [f'risk={v}' for v in RISK_LEVELS] +
+    [f'experience={v}' for v in EXPERIENCE_LEVELS] +
+    ['portfolio_size', 'engagement', 'churn_risk'] +
+    [f'content={v}' for v in CONTENT_TYPES]
+)
+
+_OFFSETS = {
+    'tier': 0,
+    'risk': len(TIERS),
+    'experience': len(TIERS) + len(RISK_LEVELS),
+    'numeric': len(TIERS) + len(RISK_LEVELS) + len(EXPERIENCE_LEVELS),
+    'content': len(TIERS) + len(RISK_LEVELS) + len(EXPERIENCE_LEVELS) + 3
+}
+_LOOKUPS = {
+    'tier': {v: i for i, v in enumerate(TIERS)},
+    'risk': {v: i for i, v in enumerate(RISK_LEVELS)},
+    'experience': {v: i for i, v in enumerate(EXPERIENCE_LEVELS)},
+    'portfolio': {v: i / (len(PORTFOLIO_SIZES) - 1) for i, v in enumerate(PORTFOLIO_SIZES)},
+    'content': {v: i for i, v in enumerate(CONTENT_TYPES)}
+}
+
+
+def _load_rows(query):
+    """Run a _feature_columns() query, turning decay keys into current engagement scores"""
+    from models.subscriber import ENGAGEMENT_SCORING_MODE, engagement_score_from_key
+
+    rows = query.all()
+    if ENGAGEMENT_SCORING_MODE != 'decayed':
+        return rows
+    now = datetime.utcnow()
+    return [row[:5] + (engagement_score_from_key(row[5], now),) + row[6:] for row in rows]
+
+
+def encode_rows(rows):
+    """
+    Encode rows of _feature_columns() into (ids, float32 matrix).
+
+    Categoricals are one-hot, portfolio size is ordinal in [0, 1], scores are
+    scaled to [0, 1] and content interests are multi-hot (learned
+    content_preferences weights override the declared preference).
+    """
+    ids = np.empty(len(rows), dtype=np.int64)
+    matrix = np.zeros((len(rows), len(FEATURE_NAMES)), dtype=np.float32)
+    numeric = _OFFSETS['numeric']
+
+    for i, (subscriber_id, tier, risk, experience, portfolio, engagement, churn,
+            content_types, content_preferences) in enumerate(rows):
+        ids[i] = subscriber_id
+        for key, value in (('tier', tier), ('risk', risk), ('experience', experience)):
+            index = _LOOKUPS[key].get(value)
+            if index is not None:
+                matrix[i, _OFFSETS[key] + index] = 1.0
+        matrix[i, numeric] = _LOOKUPS['portfolio'].get(portfolio, 0.0)
+        matrix[i, numeric + 1] = min(max((engagement or 0.0) / 100.0, 0.0), 1.0)
+        matrix[i, numeric + 2] = min(max(churn or 0.0, 0.0), 1.0)
+
+        for content_type in content_types or []:
+            index = _LOOKUPS['content'].get(content_type)
+            if index is not None:
+                matrix[i, _OFFSETS['content'] + index] = 1.0
+        if isinstance(content_preferences, dict):
+            for content_type, weight in content_preferences.items():
+                index = _LOOKUPS['content'].get(content_type)
+                if index is not None and isinstance(weight, (int, float)):
+                    matrix[i, _OFFSETS['content'] + index] = min(max(float(weight), 0.0), 1.0)
+    return ids, matrix
+
+
+def encode_subscriber(subscriber):
+    """Encode a single (possibly unsaved) Subscriber instance"""
+    row = (subscriber.id or 0, subscriber.subscription_tier, subscriber.risk_tolerance,
+           subscriber.investment_experience, subscriber.portfolio_size, subscriber.current_engagement_score(),
+           subscriber.churn_risk_score, subscriber.preferred_content_types, subscriber.content_preferences)
+    return encode_rows([row])[1][0]
+
+
+def load_features(subscriber_ids=None):
+    """Load and encode features for the given subscribers (or everyone)"""
+    from models.subscriber import Subscriber
+
+    query = db.session.query(*_feature_columns())
+    if subscriber_ids is not None:
+        query = query.filter(Subscriber.id.in_(list(subscriber_ids)))
+    return encode_rows(_load_rows(query))
+
+
+def iter_feature_chunks(chunk_size=10000):
+    """Stream encoded features for every subscriber in id-ordered chunks"""
+    from models.subscriber import Subscriber
+
+    last_id = 0
+    while True:
+        rows = _load_rows(db.session.query(*_feature_columns()).filter(
+            Subscriber.id > last_id
+        ).order_by(Subscriber.id).limit(chunk_size))
+        if not rows:
+            break
+        yield encode_rows(rows)
+        last_id = rows[-1][0]
@@ -0,0 +1,101 @@
+"""
+Synthetic Data for PersonalizeAI Platform
+Generates realistic-looking subscribers for load tests and local development
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from services.subscriber_features import (
+    TIERS, RISK_LEVELS, EXPERIENCE_LEVELS, PORTFOLIO_SIZES, CONTENT_TYPES
+)
+
+# Import db from main app
+from main import db
+
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda',
+               'David', 'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica',
+               'Thomas', 'Sarah', 'Charles', 'Karen', 'Wei', 'Priya', 'Carlos', 'Aisha']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+              'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas',
+              'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee', 'Chen', 'Patel', 'Kim', 'Nguyen']
+STATUSES = ['active'] * 8 + ['paused', 'cancelled']
+FREQUENCIES = ['daily', 'weekly', 'bi-weekly']
+DEVICES = ['desktop', 'mobile', 'tablet']
+
+
+def synthetic_subscriber(rng, index, now):
+    """Column values for one synthetic subscriber"""
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    sent = rng.randint(0, 400)
+    opened = int(sent * rng.betavariate(2, 5))
+    subscribed = now - timedelta(days=rng.randint(1, 1500))
+    return {
+        'email': f'{first.lower()}.{last.lower()}.{index}@example.com',
+        'first_name': first,
+        'last_name': last,
+        'subscription_date': subscribed,
+        'subscription_status': rng.choice(STATUSES),
+        'subscription_tier': rng.choices(TIERS, weights=[70, 25, 5])[0],
+        'total_emails_sent': sent,
+        'total_emails_opened': opened,
+        'total_clicks': int(opened * rng.betavariate(2, 8)),
+        'last_engagement_date': now - timedelta(days=rng.randint(0, 120)) if opened else None,
+        'engagement_score': round(rng.uniform(0, 100), 1),
+        'preferred_content_types': rng.sample(CONTENT_TYPES, rng.randint(1, 3)),
+        'risk_tolerance': rng.choice(RISK_LEVELS),
+        'investment_experience': rng.choice(EXPERIENCE_LEVELS),
+        'portfolio_size': rng.choice(PORTFOLIO_SIZES),
+        'preferred_frequency': rng.choice(FREQUENCIES),
+        'device_preference': rng.choice(DEVICES),
+        'churn_risk_score': round(rng.betavariate(2, 6), 3),
+        'lifetime_value': round(rng.lognormvariate(5, 1), 2),
+        'created_at': subscribed,
+        'updated_at': subscribed
+    }
+
+
+def seed_subscribers(count, chunk_size=5000, seed=0):
+    """
+    Bulk-insert `count` synthetic subscribers; returns the number inserted.
+
+    Emails carry a running index, so seeding again with a larger count only
+    adds the missing tail. With sharded storage, rows are spread across shards.
+    """
+    from models.subscriber import Subscriber, SubscriberEmail
+    from services.sharding import get_shard_router, allocate_subscriber_id
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    router = get_shard_router()
+    if router:
+        start = router.count()
+    else:
+        start = db.session.query(Subscriber).count()
+
+    inserted = 0
+    for offset in range(start, count, chunk_size):
+        rows = [synthetic_subscriber(rng, i, now) for i in range(offset, min(offset + chunk_size, count))]
+        if router:
+            by_shard, ids = {}, set()
+            for row in rows:
+                row['id'] = allocate_subscriber_id()
+                while row['id'] in ids:  # Same millisecond and random bits within this chunk
+                    row['id'] = allocate_subscriber_id()
+                ids.add(row['id'])
+                by_shard.setdefault(router.shard_for(row['id']), []).append(row)
+            db.session.execute(insert(SubscriberEmail), [
+                {'email': row['email'], 'subscriber_id': row['id'], 'created_at': now} for row in rows
+            ])
+            db.session.commit()
+            for shard, shard_rows in by_shard.items():
+                with router.session(shard) as session:
+                    session.execute(insert(Subscriber), shard_rows)
+                    session.commit()
+        else:
+            db.session.execute(insert(Subscriber), rows)
+            db.session.commit()
+        inserted += len(rows)
+    return inserted
@@ -0,0 +1,143 @@
+"""
+Webhook Test Sink for PersonalizeAI Platform
+Local HTTP receiver that records webhook deliveries, for tests and development
+
+Run standalone with `python services/webhook_sink.py --port 9000`, then
+register http://localhost:9000/ as a webhook endpoint.
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class WebhookSink:
+    """
+    Threaded HTTP server that stores every batch POSTed to it.
+
+    Failures can be scripted: `fail_next(n, status)` answers the next n
+    requests with an error status, and `delay` slows every response, to
+    exercise retries, dead-lettering and concurrency limits.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, secret=None, delay=0.0):
+        self.secret = secret
+        self.delay = delay
+        self.requests = []  # {'headers', 'events', 'signature_valid', 'received_at'}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._failures = []
+        self._lock = threading.Lock()
+        self._received = threading.Condition(self._lock)
+
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, so connection reuse is observable
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                status = sink._handle(dict(self.headers), body)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                reply = json.dumps({'received': status < 300}).encode('utf-8')
+                self.send_header('Content-Length', str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    @property
+    def events(self):
+        """Every event received, in arrival order"""
+        with self._lock:
+            return [event for entry in self.requests for event in entry['events']]
+
+    @property
+    def connections(self):
+        """Distinct client connections seen (fewer than requests means keep-alive worked)"""
+        with self._lock:
+            return len({entry['client'] for entry in self.requests})
+
+    def fail_next(self, count, status=500):
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def _handle(self, headers, body):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.delay:
+                time.sleep(self.delay)
+            with self._lock:
+                if self._failures:
+                    return self._failures.pop(0)
+                signature = headers.get('X-PersonalizeAI-Signature')
+                expected = ('sha256=' + hmac.new(self.secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+                            if self.secret else None)
+                self.requests.append({
+                    'headers': headers,
+                    'client': threading.current_thread().name,
+                    'events': json.loads(body or b'{}').get('events', []),
+                    'signature_valid': expected is None or hmac.compare_digest(signature or '', expected),
+                    'received_at': time.time()
+                })
+                self._received.notify_all()
+            return 200
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def wait_for(self, count, timeout=10.0):
+        """Block until at least `count` events have been received"""
+        deadline = time.monotonic() + timeout
+        with self._received:
+            while sum(len(entry['events']) for entry in self.requests) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._received.wait(remaining)
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='webhook-sink', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print webhook batches as they arrive')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--secret', help='Endpoint secret, to check signatures')
+    args = parser.parse_args()
+
+    sink = WebhookSink(port=args.port, secret=args.secret).start()
+    print(f'Listening on {sink.url}')
+    seen = 0
+    try:
+        while True:
+            sink.wait_for(seen + 1, timeout=1.0)
+            for event in sink.events[seen:]:
+                print(json.dumps(event))
+            seen = len(sink.events)
+    except KeyboardInterrupt:
+        sink.stop()
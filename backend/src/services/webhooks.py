@@ -0,0 +1,399 @@
+"""
+Webhook Dispatcher for PersonalizeAI Platform
+Transactional outbox for webhook events and the worker that delivers them
+"""
+
+import hashlib
+import hmac
+import ipaddress
+import json
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import requests
+from sqlalchemy import insert, update, and_
+
+# Import db from main app
+from main import db
+
+# Events documented in docs/API.md
+WEBHOOK_EVENTS = ['subscriber.created', 'subscriber.updated', 'subscriber.unsubscribed', 'subscriber.deleted',
+                  'email.sent', 'email.opened', 'email.clicked', 'ab_test.completed']
+
+SIGNATURE_HEADER = 'X-PersonalizeAI-Signature'
+DELIVERY_HEADER = 'X-PersonalizeAI-Delivery'
+
+# Endpoints may point at private, loopback or link-local addresses only when
+# this is set (local development with services/webhook_sink.py)
+ALLOW_PRIVATE_TARGETS = os.getenv('WEBHOOK_ALLOW_PRIVATE_TARGETS', 'false').lower() == 'true'
+
+
+def check_webhook_url(url, allow_private=None):
+    """
+    ValueError unless url is http(s) and every address its host resolves to
+    is public, so endpoints cannot be used to reach internal services.
+    """
+    allow_private = ALLOW_PRIVATE_TARGETS if allow_private is None else allow_private
+    parts = urlsplit(url if isinstance(url, str) else '')
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError('url must be an http(s) URL')
+    if allow_private:
+        return
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(parts.hostname, port, proto=socket.IPPROTO_TCP)}
+    except (OSError, ValueError) as e:
+        raise ValueError(f'Cannot resolve {parts.hostname}: {e}') from None
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if getattr(ip, 'ipv4_mapped', None):
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f'{parts.hostname} resolves to a non-public address ({ip})')
+
+
+# ----------------------------------------------------------------------
+# Outbox (request side)
+# ----------------------------------------------------------------------
+
+class _EndpointCache:
+    """Active endpoints per process, refreshed every few seconds, so enqueueing costs no extra query"""
+
+    def __init__(self, ttl=30.0):
+        self.ttl = ttl
+        self._endpoints = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        from models.webhook import WebhookEndpoint
+
+        if self._endpoints is None or time.monotonic() - self._loaded_at > self.ttl:
+            with self._lock:
+                rows = WebhookEndpoint.query.filter_by(is_active=True).all()
+                self._endpoints = [(e.id, frozenset(e.event_types or ())) for e in rows]
+                self._loaded_at = time.monotonic()
+        return self._endpoints
+
+    def invalidate(self):
+        self._endpoints = None
+
+
+endpoint_cache = _EndpointCache(ttl=float(os.getenv('WEBHOOK_ENDPOINT_CACHE_SECONDS', 30)))
+
+
+def webhook_payload(event_type, data, timestamp=None):
+    return {
+        'event': event_type,
+        'timestamp': (timestamp or datetime.utcnow()).isoformat() + 'Z',
+        'data': data
+    }
+
+
+def enqueue_webhooks(event_type, items):
+    """
+    Add outbox rows for a batch of events of one type to the current transaction.
+
+    One row per (event, subscribed endpoint), inserted with a single
+    executemany; nothing is sent until the dispatcher picks the rows up
+    after commit.
+    """
+    endpoints = [endpoint_id for endpoint_id, types in endpoint_cache.get()
+                 if not types or event_type in types]
+    if not endpoints or not items:
+        return 0
+    from models.webhook import WebhookOutbox
+
+    now = datetime.utcnow()
+    rows = []
+    for data in items:
+        event_id, payload = str(uuid.uuid4()), webhook_payload(event_type, data, now)
+        payload['id'] = event_id
+        rows.extend({
+            'event_id': event_id,
+            'event_type': event_type,
+            'payload': payload,
+            'endpoint_id': endpoint_id,
+            'status': 'pending',
+            'attempts': 0,
+            'next_attempt_at': now,
+            'created_at': now
+        } for endpoint_id in endpoints)
+    db.session.execute(insert(WebhookOutbox), rows)
+    return len(rows)
+
+
+def enqueue_webhook(event_type, data):
+    """Add one webhook event to the current transaction"""
+    return enqueue_webhooks(event_type, [data])
+
+
+# ----------------------------------------------------------------------
+# Delivery (worker side)
+# ----------------------------------------------------------------------
+
+def sign_body(secret, body):
+    return 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+class WebhookDispatcher:
+    """
+    Delivers outbox rows to their endpoints.
+
+    Due rows are claimed per endpoint in batches of the endpoint's
+    max_batch_size and POSTed as one request ({"events": [...]}) over a
+    keep-alive session per endpoint. At most max_concurrency batches per
+    endpoint, and `concurrency` overall, are in flight. HTTP runs on a thread
+    pool; all database work stays on the dispatcher thread. Failed batches
+    are retried with exponential backoff and jitter; after max_attempts the
+    rows are moved to the dead-letter queue (status 'dead').
+    """
+
+    def __init__(self, concurrency=16, timeout=10.0, max_attempts=8, base_delay=5.0,
+                 max_delay=3600.0, poll_interval=1.0, retention_hours=24):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.retention = timedelta(hours=retention_hours)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='webhook')
+        self._sessions = {}  # endpoint id -> requests.Session
+        self._in_flight = {}  # future -> (endpoint id, outbox ids, claim token)
+        self._stopping = threading.Event()
+        self._worker_id = uuid.uuid4().hex[:12]
+        self._claims = 0
+
+    def _session(self, endpoint):
+        session = self._sessions.get(endpoint.id)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                    pool_maxsize=endpoint.max_concurrency or 1)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = 'PersonalizeAI-Webhooks/1.0'
+            self._sessions[endpoint.id] = session
+        return session
+
+    def retry_delay(self, attempts):
+        """Exponential backoff with full jitter over the upper half of the window"""
+        delay = min(self.max_delay, self.base_delay * 2 ** max(attempts - 1, 0))
+        return delay * random.uniform(0.5, 1.0)
+
+    # -- claiming ------------------------------------------------------
+
+    def _release_expired_claims(self, now):
+        """Return rows claimed by a dispatcher that died mid-delivery to the queue"""
+        from models.webhook import WebhookOutbox
+
+        db.session.execute(
+            update(WebhookOutbox)
+            .where(WebhookOutbox.status == 'delivering', WebhookOutbox.locked_until < now)
+            .values(status='pending', locked_by=None, locked_until=None)
+        )
+
+    def _claim(self, endpoint, now):
+        """Claim up to max_batch_size due rows for an endpoint; returns them in id order"""
+        from models.webhook import WebhookOutbox
+
+        candidate_ids = [row[0] for row in db.session.query(WebhookOutbox.id).filter(
+            WebhookOutbox.endpoint_id == endpoint.id,
+            WebhookOutbox.status == 'pending',
+            WebhookOutbox.next_attempt_at <= now
+        ).order_by(WebhookOutbox.id).limit(endpoint.max_batch_size or 50)]
+        if not candidate_ids:
+            return []
+
+        # Conditional update: another dispatcher may have claimed some of them first
+        self._claims += 1
+        token = f'{self._worker_id}:{self._claims}'
+        db.session.execute(
+            update(WebhookOutbox)
+            .where(WebhookOutbox.id.in_(candidate_ids), WebhookOutbox.status == 'pending')
+            .values(status='delivering', locked_by=token,
+                    locked_until=now + timedelta(seconds=self.timeout * 3)),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        return WebhookOutbox.query.filter(
+            WebhookOutbox.id.in_(candidate_ids),
+            WebhookOutbox.locked_by == token
+        ).order_by(WebhookOutbox.id).all()
+
+    # -- delivery ------------------------------------------------------
+
+    def _deliver(self, session, url, secret, delivery_id, payloads):
+        """POST one batch (runs on the thread pool); returns None or an error string"""
+        try:
+            check_webhook_url(url)  # The host may have been re-pointed since the endpoint was registered
+        except ValueError as e:
+            return str(e)[:500]
+        body = json.dumps({'events': payloads}, separators=(',', ':')).encode('utf-8')
+        headers = {
+            'Content-Type': 'application/json',
+            DELIVERY_HEADER: delivery_id,
+            SIGNATURE_HEADER: sign_body(secret, body)
+        }
+        try:
+            response = session.post(url, data=body, headers=headers, timeout=self.timeout, allow_redirects=False)
+        except requests.RequestException as e:
+            return f'{type(e).__name__}: {e}'[:500]
+        if 200 <= response.status_code < 300:
+            return None
+        return f'HTTP {response.status_code}: {response.text[:200]}'
+
+    def _submit(self, endpoint, rows):
+        future = self._executor.submit(
+            self._deliver, self._session(endpoint), endpoint.url, endpoint.secret,
+            str(uuid.uuid4()), [row.payload for row in rows]
+        )
+        self._in_flight[future] = (endpoint.id, [row.id for row in rows], rows[0].locked_by)
+
+    def _complete(self, future):
+        """
+        Record the outcome of a finished batch.
+
+        Only rows still held under this batch's claim token are updated: if
+        the claim expired and another dispatcher re-claimed the rows, their
+        state belongs to that dispatcher now.
+        """
+        from models.webhook import WebhookOutbox
+
+        endpoint_id, ids, token = self._in_flight.pop(future)
+        error = future.result()
+        now = datetime.utcnow()
+        if error is None:
+            result = db.session.execute(
+                update(WebhookOutbox).where(WebhookOutbox.id.in_(ids), WebhookOutbox.locked_by == token)
+                .values(status='delivered', delivered_at=now, locked_by=None, locked_until=None,
+                        attempts=WebhookOutbox.attempts + 1, last_error=None),
+                execution_options={'synchronize_session': False}
+            )
+            return result.rowcount, 0
+
+        rows = WebhookOutbox.query.filter(WebhookOutbox.id.in_(ids), WebhookOutbox.locked_by == token).all()
+        dead = 0
+        for row in rows:
+            row.attempts = (row.attempts or 0) + 1
+            row.last_error = error
+            row.locked_by = None
+            row.locked_until = None
+            if row.attempts >= self.max_attempts:
+                row.status = 'dead'
+                dead += 1
+            else:
+                row.status = 'pending'
+                row.next_attempt_at = now + timedelta(seconds=self.retry_delay(row.attempts))
+        return 0, dead
+
+    # -- main loop -----------------------------------------------------
+
+    def run_once(self, now=None):
+        """
+        One dispatcher cycle: record finished batches, then fill free
+        concurrency with newly claimed batches. Returns counts for the cycle.
+        """
+        from models.webhook import WebhookEndpoint
+
+        stats = {'delivered': 0, 'dead': 0, 'submitted': 0}
+        for future in [f for f in self._in_flight if f.done()]:
+            delivered, dead = self._complete(future)
+            stats['delivered'] += delivered
+            stats['dead'] += dead
+        db.session.commit()
+
+        now = now or datetime.utcnow()
+        self._release_expired_claims(now)
+        db.session.commit()
+
+        busy = {}
+        for endpoint_id, _ids, _token in self._in_flight.values():
+            busy[endpoint_id] = busy.get(endpoint_id, 0) + 1
+
+        endpoints = WebhookEndpoint.query.filter_by(is_active=True).order_by(WebhookEndpoint.id).all()
+        # Round-robin one batch per endpoint per pass so a backlog on one endpoint cannot starve others
+        progress = True
+        while progress and len(self._in_flight) < self.concurrency:
+            progress = False
+            for endpoint in endpoints:
+                if len(self._in_flight) >= self.concurrency:
+                    break
+                if busy.get(endpoint.id, 0) >= (endpoint.max_concurrency or 1):
+                    continue
+                rows = self._claim(endpoint, now)
+                if rows:
+                    self._submit(endpoint, rows)
+                    busy[endpoint.id] = busy.get(endpoint.id, 0) + 1
+                    stats['submitted'] += 1
+                    progress = True
+        return stats
+
+    def run(self, drain=False):
+        """Dispatch until stopped (or, with drain=True, until nothing is due or in flight)"""
+        totals = {'delivered': 0, 'dead': 0, 'submitted': 0}
+        last_cleanup = 0.0
+        while not self._stopping.is_set():
+            stats = self.run_once()
+            for key in totals:
+                totals[key] += stats[key]
+
+            if time.monotonic() - last_cleanup > 600:
+                self.purge_delivered()
+                last_cleanup = time.monotonic()
+
+            if self._in_flight:
+                wait(list(self._in_flight), timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+            elif drain and not stats['submitted']:
+                break
+            elif not stats['submitted']:
+                self._stopping.wait(self.poll_interval)
+
+        # Record batches still in flight so their rows are not left claimed
+        wait(list(self._in_flight), timeout=self.timeout)
+        for future in [f for f in self._in_flight if f.done()]:
+            delivered, dead = self._complete(future)
+            totals['delivered'] += delivered
+            totals['dead'] += dead
+        db.session.commit()
+        return totals
+
+    def stop(self):
+        self._stopping.set()
+
+    def purge_delivered(self):
+        """Delete delivered rows older than the retention window"""
+        from models.webhook import WebhookOutbox
+
+        deleted = WebhookOutbox.query.filter(
+            WebhookOutbox.status == 'delivered',
+            WebhookOutbox.delivered_at < datetime.utcnow() - self.retention
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+
+def replay_dead_letters(endpoint_id=None, ids=None):
+    """Move dead-lettered rows back to the queue for immediate delivery"""
+    from models.webhook import WebhookOutbox
+
+    conditions = [WebhookOutbox.status == 'dead']
+    if endpoint_id is not None:
+        conditions.append(WebhookOutbox.endpoint_id == endpoint_id)
+    if ids:
+        conditions.append(WebhookOutbox.id.in_(ids))
+    result = db.session.execute(
+        update(WebhookOutbox).where(and_(*conditions))
+        .values(status='pending', attempts=0, next_attempt_at=datetime.utcnow(), last_error=None),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    return result.rowcount
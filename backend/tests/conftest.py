@@ -0,0 +1,34 @@
+"""
+Test Configuration for PersonalizeAI Platform
+Points the app at a throwaway SQLite database before main is imported
+"""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+_data_dir = tempfile.mkdtemp(prefix='personalizeai-tests-')
+atexit.register(shutil.rmtree, _data_dir, ignore_errors=True)
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(_data_dir, "test.db")}'
+os.environ['EVENT_STORE_PATH'] = os.path.join(_data_dir, 'events')
+os.environ['RATE_LIMIT_ENABLED'] = 'false'
+os.environ.pop('SUBSCRIBER_SHARD_URLS', None)
+
+# Services import db from main, and main imports the routes that import them,
+# so load the app first as it is in production
+import main  # noqa: E402,F401
+
+
+@pytest.fixture
+def app():
+    """The Flask app with an application context pushed"""
+    from main import app
+
+    with app.app_context():
+        yield app
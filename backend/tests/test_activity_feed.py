@@ -0,0 +1,79 @@
+"""
+Activity Feed Tests for PersonalizeAI Platform
+Ring buffer cursors, the table fallback for old cursors and publish-on-commit
+"""
+
+import pytest
+
+from main import db
+from services.activity_feed import ActivityFeed, activity_feed
+
+
+@pytest.fixture
+def commit_events(app):
+    """Commit n activity events through the shared feed; returns their ids"""
+    def commit(n):
+        events = [activity_feed.record('test.event', f'Event {i}') for i in range(n)]
+        db.session.commit()
+        return [event.id for event in events]
+
+    yield commit
+    db.session.rollback()
+
+
+def ids(entries):
+    return [entry['id'] for entry in entries]
+
+
+def test_cursor_returns_newer_events_oldest_first(commit_events):
+    feed = ActivityFeed(capacity=5, sync_interval=0)
+    first, second, third = commit_events(3)
+    assert ids(feed.since(first)) == [second, third]
+    assert ids(feed.since(second)) == [third]
+    assert feed.since(third) == []
+    assert ids(feed.since(first, limit=1)) == [second]
+
+
+def test_buffer_keeps_the_newest_events(commit_events):
+    feed = ActivityFeed(capacity=5, sync_interval=0)
+    committed = commit_events(8)
+    assert ids(feed.latest(10)) == committed[::-1][:5]
+    assert feed.head == committed[-1]
+
+
+def test_cursor_older_than_the_buffer_reads_the_table(commit_events):
+    feed = ActivityFeed(capacity=5, sync_interval=0)
+    committed = commit_events(8)
+    feed.sync(force=True)
+    assert ids(feed.since(committed[0])) == committed[1:]
+    assert ids(feed.since(committed[0], limit=3)) == committed[1:4]
+    assert ids(feed.since(committed[2])) == committed[3:]  # Just behind the buffer: no table read
+
+
+def test_late_events_are_inserted_in_order_once(app):
+    feed = ActivityFeed(capacity=3, sync_interval=float('inf'))  # Buffer only, never syncs
+    feed._push([{'id': 1}, {'id': 2}, {'id': 4}])
+    feed._push([{'id': 3}, {'id': 4}])
+    assert ids(feed.latest(10)) == [4, 3, 2]
+    assert ids(feed.since(1)) == [2, 3, 4]
+
+
+def test_only_committed_events_are_published(commit_events):
+    cursor = activity_feed.head
+    activity_feed.record('test.event', 'Rolled back')
+    db.session.flush()
+    db.session.rollback()
+    assert activity_feed.head == cursor
+
+    (committed,) = commit_events(1)
+    assert activity_feed.head == committed
+    assert [e['action'] for e in activity_feed.since(cursor)] == ['Event 0']
+
+
+def test_wait_wakes_when_the_head_passes_the_cursor(app):
+    feed = ActivityFeed(capacity=3, sync_interval=float('inf'))
+    feed._push([{'id': 7}])
+    assert not feed.wait(7, timeout=0.01)
+    assert feed.wait(6, timeout=0.01)
+    feed._push([{'id': 8}])
+    assert feed.wait(7, timeout=0.01)
@@ -0,0 +1,84 @@
+"""
+Analytics Route Tests for PersonalizeAI Platform
+Engagement metrics read from the event store, with period comparison and tier filter
+"""
+
+from datetime import datetime
+
+import pytest
+
+import routes.analytics
+from main import db
+from models.subscriber import Subscriber
+from services.event_store import EngagementEventStore
+
+
+@pytest.fixture
+def store(app, tmp_path, monkeypatch):
+    store = EngagementEventStore(str(tmp_path / 'events'))
+    monkeypatch.setattr(routes.analytics, 'get_event_store', lambda: store)
+    return store
+
+
+def add_events(store, subscriber_id, day, **counts):
+    """Append counts of each event type (sent=10, opened=3, ...) on a day"""
+    for event_type, count in counts.items():
+        store.append([subscriber_id] * count, [day] * count, [event_type] * count)
+
+
+def engagement(app, **params):
+    return app.test_client().get('/api/analytics/engagement', query_string=params)
+
+
+def test_rates_and_changes_against_the_previous_period(app, store):
+    add_events(store, 1, datetime(2026, 3, 10), sent=10, opened=4, clicked=2)
+    add_events(store, 2, datetime(2026, 3, 20), sent=10, opened=2, unsubscribed=1)
+    add_events(store, 1, datetime(2026, 2, 10), sent=10, opened=2, clicked=1)  # Previous 30 days
+    add_events(store, 1, datetime(2026, 4, 2), sent=50, opened=50)  # After end_date
+
+    response = engagement(app, start_date='2026-03-01', end_date='2026-03-31')
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['metrics'] == {
+        'total_emails_sent': 20,
+        'total_opens': 6,
+        'total_clicks': 2,
+        'open_rate': 30.0,
+        'click_rate': 10.0,
+        'unsubscribe_rate': 50.0
+    }
+    assert data['trends'] == {
+        'open_rate_change': '+50.0%',
+        'click_rate_change': '+0.0%',
+        'unsubscribe_rate_change': None
+    }
+
+
+def test_tier_filter_counts_only_that_tiers_subscribers(app, store):
+    premium = Subscriber(email='analytics-premium@example.com', subscription_tier='premium')
+    free = Subscriber(email='analytics-free@example.com', subscription_tier='free')
+    db.session.add_all([premium, free])
+    db.session.commit()
+    add_events(store, premium.id, datetime(2026, 3, 10), sent=4, opened=3)
+    add_events(store, free.id, datetime(2026, 3, 10), sent=6, opened=0)
+
+    data = engagement(app, start_date='2026-03-01', end_date='2026-03-31',
+                      subscriber_tier='premium').get_json()['data']
+    assert data['metrics']['total_emails_sent'] == 4
+    assert data['metrics']['open_rate'] == 75.0
+
+
+def test_empty_store_reports_zero_rates(app, store):
+    data = engagement(app, start_date='2026-03-01', end_date='2026-03-31').get_json()['data']
+    assert data['metrics']['total_emails_sent'] == 0
+    assert data['metrics']['open_rate'] == 0.0
+    assert data['trends']['open_rate_change'] is None
+
+
+@pytest.mark.parametrize('params', [
+    {'start_date': '03/01/2026'},
+    {'start_date': '2026-03-31', 'end_date': '2026-03-01'},
+    {'start_date': '2024-01-01', 'end_date': '2026-03-01'}
+])
+def test_invalid_periods_are_rejected(app, store, params):
+    assert engagement(app, **params).status_code == 400
@@ -0,0 +1,124 @@
+"""
+Bandit Allocation Tests for PersonalizeAI Platform
+Sticky hashed assignments, posterior updates and merging counts across workers
+"""
+
+import pytest
+
+from main import db
+from models.personalization import ABTest, ABTestAssignment
+from services.bandit import ThompsonSamplingAllocator
+
+
+@pytest.fixture
+def ab_test(app):
+    test = ABTest(test_name='Adaptive subject lines', test_type='subject_line', variants=['a', 'b'],
+                  traffic_split=[50, 50], target_metric='open_rate', allocation_mode='thompson',
+                  status='running')
+    db.session.add(test)
+    db.session.commit()
+    yield test
+    db.session.rollback()
+    ABTestAssignment.query.filter_by(ab_test_id=test.id).delete()
+    db.session.delete(test)
+    db.session.commit()
+
+
+def worker(**kwargs):
+    """An allocator that only persists when asked"""
+    return ThompsonSamplingAllocator(persist_interval=float('inf'), persist_every=10 ** 9, **kwargs)
+
+
+def stored_assignments(test):
+    return dict(db.session.query(ABTestAssignment.subscriber_id, ABTestAssignment.variant).filter_by(
+        ab_test_id=test.id
+    ))
+
+
+def test_assignments_are_sticky_and_identical_across_workers(ab_test):
+    first, second = worker(), worker()
+    variants = [first.assign(ab_test, i) for i in range(200)]
+    assert [first.assign(ab_test, i) for i in range(200)] == variants
+    assert [second.assign(ab_test, i) for i in range(200)] == variants
+    assert set(variants) == {'A', 'B'}  # Flat priors split traffic
+
+
+def test_assignments_are_stored_in_batches_when_persisting(ab_test):
+    allocator = worker()
+    variants = {i: allocator.assign(ab_test, i) for i in range(25)}
+    assert stored_assignments(ab_test) == {}
+    allocator.persist(ab_test)
+    assert stored_assignments(ab_test) == variants
+    allocator.persist(ab_test)  # Nothing new to write
+    assert len(stored_assignments(ab_test)) == 25
+
+
+def test_a_variant_stored_by_another_worker_first_is_adopted(ab_test):
+    allocator = worker()
+    variant = allocator.assign(ab_test, 7)
+    other = 'A' if variant == 'B' else 'B'
+    db.session.add(ABTestAssignment(ab_test_id=ab_test.id, subscriber_id=7, variant=other))
+    db.session.commit()
+    allocator.persist(ab_test)
+    assert allocator.assign(ab_test, 7) == other
+
+
+def test_exposure_cache_evicts_the_least_recently_used(ab_test):
+    allocator = worker(max_exposures=3)
+    for i in range(3):
+        allocator.assign(ab_test, i)
+    allocator.assign(ab_test, 0)  # Most recently used again
+    allocator.assign(ab_test, 3)
+    assert list(allocator._states[ab_test.id].exposures) == [2, 0, 3]
+
+
+def test_traffic_shifts_towards_the_better_variant_after_a_merge(ab_test):
+    allocator = worker()
+    for _ in range(400):
+        allocator.record_send(ab_test, 'A')
+        allocator.record_send(ab_test, 'B')
+    for _ in range(40):
+        allocator.record_success(ab_test, 'A')
+    for _ in range(80):
+        allocator.record_success(ab_test, 'B')
+    allocator.persist(ab_test)
+
+    variants = [allocator.assign(ab_test, i) for i in range(1000, 2000)]
+    assert variants.count('B') > 950
+    posteriors = ab_test.bandit_state['variants']
+    assert (posteriors['A']['trials'], posteriors['A']['successes']) == (400, 40)
+    assert (posteriors['B']['trials'], posteriors['B']['successes']) == (400, 80)
+
+
+def test_merge_adds_every_workers_counts(ab_test):
+    first, second = worker(), worker()
+    for _ in range(10):
+        first.record_send(ab_test, 'A')
+    for _ in range(5):
+        second.record_send(ab_test, 'A')
+        second.record_success(ab_test, 'B')
+    first.persist(ab_test)
+    second.persist(ab_test)
+    first.persist(ab_test)  # Picks up the second worker's counts
+
+    for allocator in (first, second):
+        posteriors = allocator._states[ab_test.id].posteriors
+        assert (posteriors['A'].trials, posteriors['B'].successes) == (15, 5)
+    assert ab_test.bandit_state['variants']['A']['trials'] == 15
+
+
+def test_failed_persist_is_logged_and_retried(ab_test, monkeypatch, caplog):
+    allocator = ThompsonSamplingAllocator(persist_interval=0.0)
+    allocator.assign(ab_test, 1)  # Creates the state; its persist succeeds
+
+    def fail(*args):
+        raise RuntimeError('database unavailable')
+
+    monkeypatch.setattr(ThompsonSamplingAllocator, '_store_assignments', staticmethod(fail))
+    variant = allocator.assign(ab_test, 2)
+    assert 'database unavailable' in caplog.text
+    assert allocator._states[ab_test.id].pending_assignments[2][0] == variant
+
+    monkeypatch.undo()
+    allocator.persist(ab_test)
+    assert stored_assignments(ab_test)[2] == variant
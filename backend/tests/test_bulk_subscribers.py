@@ -0,0 +1,168 @@
+"""
+Bulk Subscriber Tests for PersonalizeAI Platform
+Filtered bulk updates and deletes: guards, dry runs, keyset chunks and purges
+"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import inspect, text
+
+import routes.subscribers
+from main import db
+from models.personalization import PersonalizationResult
+from models.subscriber import Subscriber
+from services.event_store import EngagementEventStore
+from services.retention import ResultsRetention
+
+DOMAIN = 'bulk.example.com'
+
+
+@pytest.fixture
+def subscribers(app):
+    """Five basic-tier subscribers, two of them already cancelled"""
+    _clear()
+    rows = [Subscriber(email=f'user{i}@{DOMAIN}', subscription_tier='basic',
+                       subscription_status='cancelled' if i < 2 else 'active') for i in range(5)]
+    db.session.add_all(rows)
+    db.session.commit()
+    yield [row.id for row in rows]
+    _clear()
+
+
+def _clear():
+    db.session.rollback()
+    ids = [row[0] for row in db.session.query(Subscriber.id).filter(Subscriber.email.contains(DOMAIN))]
+    PersonalizationResult.query.filter(PersonalizationResult.subscriber_id.in_(ids)).delete(
+        synchronize_session=False
+    )
+    Subscriber.query.filter(Subscriber.id.in_(ids)).delete(synchronize_session=False)
+    for name in inspect(db.engine).get_table_names():
+        if name.startswith('personalization_results_2'):
+            db.session.execute(text(f'DROP TABLE {name}'))
+    db.session.commit()
+
+
+@pytest.fixture
+def webhooks(monkeypatch):
+    """(event_type, payload) for every webhook the routes queue"""
+    queued = []
+    monkeypatch.setattr(routes.subscribers, 'enqueue_webhooks',
+                        lambda event_type, items: queued.extend((event_type, item) for item in items))
+    return queued
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = EngagementEventStore(str(tmp_path / 'events'))
+    monkeypatch.setattr(routes.subscribers, 'get_event_store', lambda: store)
+    return store
+
+
+def bulk(app, method, body):
+    return app.test_client().open('/api/subscribers/', method=method, json=body)
+
+
+def statuses(ids):
+    return [db.session.get(Subscriber, i).subscription_status for i in ids]
+
+
+def test_dry_run_counts_matches_without_changing_them(app, subscribers):
+    response = bulk(app, 'PATCH', {'filters': {'search': DOMAIN, 'status': 'active'},
+                                   'updates': {'subscription_tier': 'premium'}, 'dry_run': True})
+    assert response.status_code == 200
+    assert response.get_json()['matched'] == 3
+    assert response.get_json()['affected'] == 0
+    db.session.expire_all()
+    assert {db.session.get(Subscriber, i).subscription_tier for i in subscribers} == {'basic'}
+
+
+def test_updates_run_in_keyset_chunks_and_report_affected_rows(app, subscribers, webhooks, store):
+    response = bulk(app, 'PATCH', {'filters': {'search': DOMAIN}, 'updates': {'subscription_tier': 'premium'},
+                                   'chunk_size': 2})
+    data = response.get_json()
+    assert (data['matched'], data['affected'], data['chunks']) == (5, 5, 3)
+    db.session.expire_all()
+    assert {db.session.get(Subscriber, i).subscription_tier for i in subscribers} == {'premium'}
+    assert sorted(item['subscriber_id'] for _, item in webhooks) == subscribers
+
+
+def test_chunks_follow_ids_not_offsets(app, subscribers):
+    chunks = list(routes.subscribers.iter_matching_id_chunks({'search': DOMAIN}, 2))
+    assert chunks == [subscribers[:2], subscribers[2:4], subscribers[4:]]
+
+
+def test_unsubscribe_webhooks_are_queued_only_for_newly_cancelled(app, subscribers, webhooks, store):
+    bulk(app, 'PATCH', {'filters': {'search': DOMAIN}, 'updates': {'subscription_status': 'cancelled'}})
+    unsubscribed = [item['subscriber_id'] for event, item in webhooks if event == 'subscriber.unsubscribed']
+    assert sorted(unsubscribed) == subscribers[2:]
+    assert sorted(store.scan()['subscriber_id'].tolist()) == subscribers[2:]
+
+
+@pytest.mark.parametrize('method', ['PATCH', 'DELETE'])
+def test_filters_are_required_unless_all_is_passed(app, subscribers, method):
+    response = bulk(app, method, {'updates': {'subscription_tier': 'premium'}})
+    assert response.status_code == 400
+    response = bulk(app, method, {'updates': {'subscription_tier': 'premium'}, 'all': True, 'dry_run': True})
+    assert response.status_code == 200
+    assert response.get_json()['matched'] >= len(subscribers)
+
+
+@pytest.mark.parametrize('updates', [
+    ['subscription_tier', 'premium'],
+    'premium',
+    {'subscription_tier': 'platinum'},
+    {'subscription_status': 'gone'},
+    {'preferred_content_types': ['astrology']},
+    {'first_name': 42}
+])
+def test_invalid_updates_are_rejected(app, subscribers, updates):
+    response = bulk(app, 'PATCH', {'filters': {'search': DOMAIN}, 'updates': updates})
+    assert response.status_code == 400
+
+
+def test_single_update_validates_the_same_fields(app, subscribers):
+    client = app.test_client()
+    assert client.put(f'/api/subscribers/{subscribers[0]}', json={'risk_tolerance': 'reckless'}).status_code == 400
+    assert client.put(f'/api/subscribers/{subscribers[0]}', json={'risk_tolerance': 'aggressive'}).status_code == 200
+
+
+def test_bulk_delete_purges_every_tier_and_queues_webhooks(app, subscribers, webhooks, store, tmp_path,
+                                                           monkeypatch):
+    monkeypatch.setenv('RESULTS_ARCHIVE_PATH', str(tmp_path / 'archives'))
+    keep = Subscriber(email='keep@elsewhere.example.com')
+    db.session.add(keep)
+    db.session.commit()
+    for subscriber_id in (subscribers[0], keep.id):
+        for created_at in (datetime(2025, 6, 15), datetime(2026, 5, 10), datetime.utcnow()):
+            db.session.add(PersonalizationResult(subscriber_id=subscriber_id, content_type='subject_line',
+                                                 personalized_content='Subject', created_at=created_at))
+        store.record(subscriber_id, 'opened', datetime(2026, 5, 10))
+    db.session.commit()
+    retention = ResultsRetention(hot_months=3, archive_after_months=12)
+    retention.run(now=datetime(2026, 10, 19))
+
+    response = bulk(app, 'DELETE', {'filters': {'search': DOMAIN}, 'chunk_size': 2})
+    assert response.get_json()['affected'] == 5
+    assert sorted(item['subscriber_id'] for event, item in webhooks if event == 'subscriber.deleted') == subscribers
+    assert retention.query(datetime(2025, 1, 1))['subscriber_id'].tolist() == [keep.id] * 3
+    assert store.scan()['subscriber_id'].tolist() == [keep.id]
+
+    PersonalizationResult.query.filter_by(subscriber_id=keep.id).delete()
+    db.session.delete(keep)
+    db.session.commit()
+
+
+def test_single_delete_removes_results_and_queues_a_webhook(app, subscribers, webhooks, store, tmp_path,
+                                                            monkeypatch):
+    monkeypatch.setenv('RESULTS_ARCHIVE_PATH', str(tmp_path / 'archives'))
+    db.session.add(PersonalizationResult(subscriber_id=subscribers[0], content_type='subject_line',
+                                         personalized_content='Subject'))
+    db.session.commit()
+    store.record(subscribers[0], 'sent')
+
+    assert app.test_client().delete(f'/api/subscribers/{subscribers[0]}').status_code == 200
+    assert webhooks == [('subscriber.deleted', webhooks[0][1])]
+    assert webhooks[0][1]['subscriber_id'] == subscribers[0]
+    assert PersonalizationResult.query.filter_by(subscriber_id=subscribers[0]).count() == 0
+    assert len(store.scan()['subscriber_id']) == 0
@@ -0,0 +1,149 @@
+"""
+Engagement Tests for PersonalizeAI Platform
+Decayed engagement scores, decay-key ordering, the result event route and the backfill
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import inspect, text
+
+import models.subscriber
+import routes.personalization
+from main import db
+from models.activity import ActivityEvent
+from models.personalization import PersonalizationResult
+from models.subscriber import ENGAGEMENT_HALF_LIFE_DAYS, Subscriber, engagement_score_from_key
+from services.engagement import backfill_decayed_engagement
+from services.retention import ResultsRetention
+
+DOMAIN = 'engagement.example.com'
+NOW = datetime(2026, 10, 19, 12, 0)
+HALF_LIFE = timedelta(days=ENGAGEMENT_HALF_LIFE_DAYS)
+
+
+def _clear():
+    db.session.rollback()
+    ids = [row[0] for row in db.session.query(Subscriber.id).filter(Subscriber.email.contains(DOMAIN))]
+    PersonalizationResult.query.filter(PersonalizationResult.subscriber_id.in_(ids)).delete(
+        synchronize_session=False
+    )
+    ActivityEvent.query.filter(ActivityEvent.event_type.like('email.%')).delete(synchronize_session=False)
+    Subscriber.query.filter(Subscriber.id.in_(ids)).delete(synchronize_session=False)
+    for name in inspect(db.engine).get_table_names():
+        if name.startswith('personalization_results_2'):
+            db.session.execute(text(f'DROP TABLE {name}'))
+    db.session.commit()
+
+
+@pytest.fixture
+def decayed(app, monkeypatch):
+    monkeypatch.setattr(models.subscriber, 'ENGAGEMENT_SCORING_MODE', 'decayed')
+    _clear()
+    yield
+    _clear()
+
+
+def subscriber(name, events=()):
+    row = Subscriber(email=f'{name}@{DOMAIN}')
+    for event_type, at in events:
+        row.record_engagement_event(event_type, at)
+    db.session.add(row)
+    db.session.commit()
+    return row
+
+
+def test_current_score_decays_between_events(decayed):
+    row = subscriber('reader', [('clicked', NOW)])
+    assert row.current_engagement(NOW) == pytest.approx(3.0)
+    assert row.current_engagement(NOW + HALF_LIFE) == pytest.approx(1.5)
+    assert row.current_engagement(NOW - timedelta(days=1)) == pytest.approx(3.0)  # Never grows backwards
+    assert row.current_engagement_score(NOW + HALF_LIFE) < row.current_engagement_score(NOW)
+    assert row.current_engagement_score(NOW + HALF_LIFE) == row.decayed_engagement_score(NOW + HALF_LIFE)
+    assert engagement_score_from_key(row.engagement_decay_key, NOW + HALF_LIFE) == \
+        row.decayed_engagement_score(NOW + HALF_LIFE)
+
+
+def test_late_events_are_decayed_forward(decayed):
+    in_order = subscriber('ordered', [('opened', NOW - HALF_LIFE), ('clicked', NOW)])
+    late = subscriber('late', [('clicked', NOW), ('opened', NOW - HALF_LIFE)])
+    assert late.decayed_engagement_at == in_order.decayed_engagement_at == NOW
+    assert late.current_engagement(NOW) == pytest.approx(in_order.current_engagement(NOW)) == pytest.approx(3.5)
+
+
+def test_decay_keys_order_subscribers_by_current_score(decayed, app):
+    rows = [
+        subscriber('recent-open', [('opened', NOW)]),
+        subscriber('old-conversion', [('converted', NOW - 3 * HALF_LIFE)]),
+        subscriber('old-clicks', [('clicked', NOW - 2 * HALF_LIFE)] * 3),
+        subscriber('steady', [('opened', NOW - timedelta(days=d)) for d in range(0, 60, 5)]),
+        subscriber('never')
+    ]
+    by_score = sorted(rows, key=lambda row: -row.decayed_engagement_score(NOW))
+    by_key = Subscriber.query.filter(Subscriber.email.contains(DOMAIN)).order_by(
+        getattr(Subscriber, Subscriber.sort_attribute('engagement_score')).desc().nullslast()
+    ).all()
+    assert [row.email for row in by_key] == [row.email for row in by_score]
+
+    response = app.test_client().get('/api/subscribers/', query_string={
+        'search': DOMAIN, 'sort_by': 'engagement_score', 'sort_order': 'desc'
+    })
+    listed = response.get_json()['subscribers']
+    assert [s['email'] for s in listed] == [row.email for row in by_score]
+    scores = [s['engagement_score'] for s in listed]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_result_events_queue_webhooks_and_activity_from_the_route(decayed, app, monkeypatch):
+    queued = []
+    monkeypatch.setattr(routes.personalization, 'enqueue_webhook', lambda event, data: queued.append((event, data)))
+    row = subscriber('routed')
+    result = PersonalizationResult(subscriber_id=row.id, content_type='subject_line', personalized_content='Hi')
+    db.session.add(result)
+    db.session.commit()
+
+    client = app.test_client()
+    for event in ('sent', 'opened', 'opened'):
+        client.post(f'/api/personalize/results/{result.id}/events', json={'event': event})
+    assert [event for event, _ in queued] == ['email.sent', 'email.opened']  # The repeat open is not counted
+    assert ActivityEvent.query.filter_by(event_type='email.opened').count() == 1
+    db.session.expire_all()
+    assert (row.total_emails_sent, row.total_emails_opened) == (1, 1)
+
+    # The model only updates its own state
+    queued.clear()
+    row.record_engagement_event('clicked')
+    assert queued == [] and not any(isinstance(obj, ActivityEvent) for obj in db.session.new)
+    db.session.rollback()
+
+
+def test_backfill_reads_results_from_every_retention_tier(decayed, tmp_path, monkeypatch):
+    monkeypatch.setenv('RESULTS_ARCHIVE_PATH', str(tmp_path / 'archives'))
+    row, untouched = subscriber('history'), subscriber('totals-only')
+    untouched.last_engagement_date, untouched.total_emails_opened = NOW - HALF_LIFE, 2
+    events = []
+    for created_at in (datetime(2025, 6, 15), datetime(2026, 5, 10), datetime(2026, 10, 1)):
+        opened_at, clicked_at = created_at + timedelta(hours=2), created_at + timedelta(days=40)
+        db.session.add(PersonalizationResult(subscriber_id=row.id, content_type='subject_line',
+                                             personalized_content='Hi', created_at=created_at,
+                                             opened_at=opened_at, clicked_at=clicked_at))
+        events += [('opened', opened_at), ('clicked', clicked_at)]
+    db.session.commit()
+    ResultsRetention(hot_months=3, archive_after_months=12).run(now=NOW)
+    assert PersonalizationResult.query.filter_by(subscriber_id=row.id).count() == 1  # Others are warm or cold
+
+    unseeded = Subscriber.query.filter(Subscriber.decayed_engagement_at.is_(None)).count()  # Others' too
+    assert backfill_decayed_engagement(chunk_size=1) == unseeded
+    expected = Subscriber(email='expected@example.com')
+    expected.seed_decayed_engagement(events)
+    db.session.expire_all()
+    assert row.decayed_engagement_at == expected.decayed_engagement_at == datetime(2026, 11, 10)
+    assert row.decayed_engagement == pytest.approx(expected.decayed_engagement)
+    assert row.engagement_decay_key == pytest.approx(expected.engagement_decay_key)
+    assert untouched.current_engagement(NOW) == pytest.approx(1.0)  # Two opens, one half-life ago
+
+    unseeded = Subscriber.query.filter(Subscriber.decayed_engagement_at.is_(None)).count()
+    assert backfill_decayed_engagement() == unseeded  # Only those without history or totals
+    assert backfill_decayed_engagement(force=True) == Subscriber.query.count()
+    db.session.expire_all()
+    assert row.decayed_engagement == pytest.approx(expected.decayed_engagement)
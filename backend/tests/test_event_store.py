@@ -0,0 +1,154 @@
+"""
+Event Store Tests for PersonalizeAI Platform
+Appends, torn-append repair, compaction and its recovery, range scans and monthly aggregates
+"""
+
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from services.event_store import ACTIVE_SEGMENT, COLUMNS, COMPACTION_JOURNAL, EVENT_TYPES, EngagementEventStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EngagementEventStore(str(tmp_path / 'events'))
+
+
+def rows(result):
+    """(subscriber_id, ts, event_type, result_id) tuples of a scan, in order"""
+    return list(zip(*(result[column].tolist() for column in COLUMNS)))
+
+
+def segments(store, partition):
+    return store._segments(os.path.join(store.root, partition))
+
+
+def epoch(*args):
+    return int((datetime(*args) - datetime(1970, 1, 1)).total_seconds())
+
+
+def test_appends_are_routed_to_month_partitions(store):
+    store.append([1, 2, 3], [datetime(2026, 3, 31, 23, 59), datetime(2026, 4, 1), epoch(2026, 5, 2)],
+                 ['sent', 'opened', EVENT_TYPES['clicked']], [10, None, 30])
+    assert store.partitions() == ['2026-03', '2026-04', '2026-05']
+    assert rows(store.scan()) == [
+        (1, epoch(2026, 3, 31, 23, 59), EVENT_TYPES['sent'], 10),
+        (2, epoch(2026, 4, 1), EVENT_TYPES['opened'], -1),
+        (3, epoch(2026, 5, 2), EVENT_TYPES['clicked'], 30)
+    ]
+
+
+def test_scan_filters_by_range_and_subscriber(store):
+    store.append([1, 2, 1, 2], [datetime(2026, 3, d) for d in (1, 10, 20, 31)], ['sent'] * 4)
+    store.compact()
+    store.append([1, 2], [datetime(2026, 3, 5), datetime(2026, 4, 1)], ['opened'] * 2)  # Active segment
+
+    march = store.scan(datetime(2026, 3, 5), datetime(2026, 4, 1))
+    assert sorted(march['ts'].tolist()) == [epoch(2026, 3, d) for d in (5, 10, 20, 31)]
+    assert len(store.scan(datetime(2026, 3, 10), datetime(2026, 3, 10))['ts']) == 0
+    assert sorted(store.scan(subscriber_ids=[2])['ts'].tolist()) == [epoch(2026, 3, 10), epoch(2026, 3, 31),
+                                                                    epoch(2026, 4, 1)]
+    assert len(store.scan(datetime(2026, 4, 1))['ts']) == 1
+
+
+def test_a_torn_append_is_ignored_by_reads_and_cut_back_on_the_next_write(store):
+    store.record(1, 'sent', datetime(2026, 3, 1))
+    active = os.path.join(store.root, '2026-03', ACTIVE_SEGMENT)
+    # A crash mid-append: two columns got the new row (one only partly), the others did not
+    with open(os.path.join(active, 'subscriber_id.bin'), 'ab') as f:
+        f.write(np.array([2], dtype='<i8').tobytes())
+    with open(os.path.join(active, 'ts.bin'), 'ab') as f:
+        f.write(np.array([epoch(2026, 3, 2)], dtype='<i8').tobytes()[:5])
+
+    assert store.scan()['subscriber_id'].tolist() == [1]
+    store.record(3, 'opened', datetime(2026, 3, 3), result_id=7)
+    assert rows(store.scan()) == [(1, epoch(2026, 3, 1), EVENT_TYPES['sent'], -1),
+                                  (3, epoch(2026, 3, 3), EVENT_TYPES['opened'], 7)]
+    sizes = {column: os.path.getsize(os.path.join(active, f'{column}.bin')) // dtype.itemsize
+             for column, dtype in COLUMNS.items()}
+    assert set(sizes.values()) == {2}
+
+
+def test_compaction_merges_segments_into_one_sorted_segment(store):
+    store.append([1, 2, 3], [datetime(2026, 3, d) for d in (20, 5, 12)], ['sent'] * 3)
+    assert store.compact() == 1
+    store.append([4], [datetime(2026, 3, 1)], ['opened'])
+    before = rows(store.scan())
+    assert len(segments(store, '2026-03')) == 2
+
+    assert store.compact('2026-03') == 1
+    (compacted,) = segments(store, '2026-03')
+    assert compacted != ACTIVE_SEGMENT
+    assert sorted(rows(store.scan())) == sorted(before)
+    assert store.scan()['ts'].tolist() == sorted(ts for _, ts, _, _ in before)
+    assert store.compact() == 0  # Nothing left to merge
+
+
+def test_an_interrupted_compaction_is_rolled_forward(store):
+    store.append([1, 2], [datetime(2026, 3, 1), datetime(2026, 3, 2)], ['sent'] * 2)
+    path = os.path.join(store.root, '2026-03')
+    merged = store._merge_segments(path, [ACTIVE_SEGMENT])
+    # Crash after the merged segment was swapped in, before the inputs were removed
+    os.makedirs(os.path.join(path, 'c1'))
+    for column, values in merged.items():
+        values.tofile(os.path.join(path, 'c1', f'{column}.bin'))
+    with open(os.path.join(path, COMPACTION_JOURNAL), 'w') as f:
+        json.dump({'new': 'c1', 'replaced': [ACTIVE_SEGMENT]}, f)
+
+    assert store.scan()['subscriber_id'].tolist() == [1, 2]  # Not counted twice
+    store.record(3, 'sent', datetime(2026, 3, 3))
+    assert not os.path.exists(os.path.join(path, COMPACTION_JOURNAL))
+    assert sorted(store.scan()['subscriber_id'].tolist()) == [1, 2, 3]
+
+
+def test_an_interrupted_compaction_is_rolled_back(store):
+    store.append([1, 2], [datetime(2026, 3, 1), datetime(2026, 3, 2)], ['sent'] * 2)
+    path = os.path.join(store.root, '2026-03')
+    # Crash before the merged segment was renamed into place
+    os.makedirs(os.path.join(path, '.tmp-c1'))
+    with open(os.path.join(path, COMPACTION_JOURNAL), 'w') as f:
+        json.dump({'new': 'c1', 'replaced': [ACTIVE_SEGMENT]}, f)
+
+    assert store.scan()['subscriber_id'].tolist() == [1, 2]
+    assert store.compact() == 1
+    assert sorted(os.listdir(path)) == ['.lock', segments(store, '2026-03')[0]]
+    assert store.scan()['subscriber_id'].tolist() == [1, 2]
+
+
+def test_delete_subscribers_rewrites_only_affected_partitions(store):
+    store.append([1, 2, 1], [datetime(2026, 3, 1), datetime(2026, 3, 2), datetime(2026, 4, 1)], ['sent'] * 3)
+    store.append([2], [datetime(2026, 5, 1)], ['sent'])
+    assert store.delete_subscribers([1]) == 2
+    assert segments(store, '2026-05') == [ACTIVE_SEGMENT]  # Untouched
+    assert store.scan()['subscriber_id'].tolist() == [2, 2]
+
+
+def test_monthly_aggregates_count_events_rates_and_active_subscribers(store):
+    store.append(
+        [1, 2, 3, 1, 2, 1, 1, 4],
+        [datetime(2026, 9, 2), datetime(2026, 9, 3), datetime(2026, 9, 4), datetime(2026, 9, 5),
+         datetime(2026, 9, 6), datetime(2026, 9, 7), datetime(2026, 10, 1), datetime(2026, 6, 30)],
+        ['sent', 'sent', 'sent', 'opened', 'opened', 'clicked', 'unsubscribed', 'sent']
+    )
+    months = store.monthly_aggregates(months=2, now=datetime(2026, 10, 19))
+    assert [m['period'] for m in months] == ['2026-09', '2026-10']
+    september, october = months
+    assert (september['sent'], september['opened'], september['clicked']) == (3, 2, 1)
+    assert (september['open_rate'], september['click_rate']) == (66.67, 33.33)
+    assert september['active_subscribers'] == 3
+    assert (october['unsubscribed'], october['sent'], october['open_rate']) == (1, 0, 0.0)
+    assert october['active_subscribers'] == 1
+
+    only = store.monthly_aggregates(months=2, now=datetime(2026, 10, 19), subscriber_ids=[2])
+    assert (only[0]['sent'], only[0]['active_subscribers'], only[1]['active_subscribers']) == (1, 1, 0)
+
+
+def test_active_subscribers_with_large_ids(store):
+    big = 2 ** 50  # Sharded ids are ~50-bit
+    store.append([big, big + 1, big, 5], [datetime(2026, 10, d) for d in (1, 2, 3, 4)], ['sent'] * 4)
+    (october,) = store.monthly_aggregates(months=1, now=datetime(2026, 10, 19))
+    assert (october['sent'], october['active_subscribers']) == (4, 3)
@@ -0,0 +1,43 @@
+"""
+Hashing Tests for PersonalizeAI Platform
+Jump consistent hash placement and stable_hash determinism
+"""
+
+import hashlib
+
+from services.hashing import jump_hash, stable_hash
+
+KEYS = [stable_hash('subscriber', i) for i in range(20000)]
+
+
+def test_stable_hash_is_blake2b_of_joined_parts():
+    expected = int.from_bytes(hashlib.blake2b(b'test:42:A', digest_size=8).digest(), 'big')
+    assert stable_hash('test', 42, 'A') == expected
+    assert stable_hash('test', 42, 'A') != stable_hash('test', 42, 'B')
+
+
+def test_jump_hash_stays_in_range_and_is_deterministic():
+    for buckets in (1, 2, 7, 64):
+        placed = [jump_hash(key, buckets) for key in KEYS[:1000]]
+        assert all(0 <= bucket < buckets for bucket in placed)
+        assert placed == [jump_hash(key, buckets) for key in KEYS[:1000]]
+    assert {jump_hash(key, 1) for key in KEYS[:1000]} == {0}
+
+
+def test_jump_hash_spreads_keys_evenly():
+    buckets = 10
+    counts = [0] * buckets
+    for key in KEYS:
+        counts[jump_hash(key, buckets)] += 1
+    expected = len(KEYS) / buckets
+    assert all(abs(count - expected) < expected * 0.1 for count in counts)
+
+
+def test_adding_a_bucket_only_moves_keys_into_it():
+    for buckets in (1, 3, 8):
+        before = [jump_hash(key, buckets) for key in KEYS]
+        after = [jump_hash(key, buckets + 1) for key in KEYS]
+        moved = [new for old, new in zip(before, after) if old != new]
+        assert set(moved) <= {buckets}
+        share = len(moved) / len(KEYS)
+        assert abs(share - 1 / (buckets + 1)) < 0.02
@@ -0,0 +1,149 @@
+"""
+Lookalike Tests for PersonalizeAI Platform
+Subscriber feature encoding and the incrementally maintained nearest-neighbour index
+"""
+
+import numpy as np
+import pytest
+
+import services.lookalike
+from main import db
+from models.subscriber import Subscriber
+from services.lookalike import LookalikeIndex
+from services.subscriber_events import BackgroundIndex
+from services.subscriber_features import FEATURE_NAMES, encode_rows, load_features
+
+DOMAIN = 'lookalike.example.com'
+
+
+@pytest.fixture
+def subscribers(app):
+    """60 identical conservative subscribers and 40 varied ones"""
+    rows = [Subscriber(email=f'seed{i}@{DOMAIN}', subscription_tier='basic', risk_tolerance='conservative',
+                       investment_experience='beginner', portfolio_size='<10k', churn_risk_score=0.2)
+            for i in range(60)]
+    tiers, risks = ['basic', 'premium', 'enterprise'], ['conservative', 'moderate', 'aggressive']
+    rows += [Subscriber(email=f'other{i}@{DOMAIN}', subscription_tier=tiers[i % 3], risk_tolerance=risks[i // 3 % 3],
+                        investment_experience='advanced', portfolio_size='>1m', churn_risk_score=i / 40)
+             for i in range(40)]
+    db.session.add_all(rows)
+    db.session.commit()
+    yield [row.id for row in rows]
+    db.session.rollback()
+    Subscriber.query.filter(Subscriber.email.contains(DOMAIN)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def brute_force(seed_ids, k):
+    """Sorted distances of the k nearest non-seed subscribers, by exhaustive search"""
+    ids, vectors = load_features()
+    seeds = vectors[np.isin(ids, seed_ids)]
+    distances = np.sqrt(((vectors[:, None, :] - seeds[None, :, :]) ** 2).sum(axis=2)).min(axis=1)
+    return pytest.approx(np.sort(distances[~np.isin(ids, seed_ids)])[:k].tolist(), abs=1e-4)
+
+
+def distances(matches):
+    return [m['distance'] for m in matches]
+
+
+def feature(name):
+    return FEATURE_NAMES.index(name)
+
+
+def test_encoder_one_hot_ordinal_and_clamped_features():
+    ids, matrix = encode_rows([
+        (7, 'premium', 'aggressive', 'advanced', '100k-1m', 150.0, -0.5, ['crypto', 'unknown'],
+         {'education': 2.0, 'crypto': 0.25, 'options': 'high'})
+    ])
+    row = matrix[0]
+    assert ids.tolist() == [7]
+    assert row[feature('tier=premium')] == 1.0 and row[feature('tier=basic')] == 0.0
+    assert row[feature('risk=aggressive')] == 1.0 and row[feature('experience=advanced')] == 1.0
+    assert row[feature('portfolio_size')] == pytest.approx(2 / 3)
+    assert row[feature('engagement')] == 1.0 and row[feature('churn_risk')] == 0.0
+    # Learned weights override the declared preference; non-numeric weights are ignored
+    assert row[feature('content=crypto')] == 0.25
+    assert row[feature('content=education')] == 1.0
+    assert row[feature('content=options')] == 0.0
+
+
+def test_encoder_leaves_unknown_and_missing_values_empty():
+    _, matrix = encode_rows([(1, 'gold', None, None, None, None, None, None, None)])
+    assert not matrix.any()
+
+
+def test_query_matches_exhaustive_search(subscribers):
+    index = LookalikeIndex()
+    index.build()
+    seeds = subscribers[60:63]
+    assert distances(index.query(seeds, k=10)) == brute_force(seeds, 10)
+
+
+def test_many_identical_seeds_still_find_k_lookalikes(subscribers):
+    # Each seed's nearest neighbours are the other 59 seeds, far more than k
+    index = LookalikeIndex()
+    index.build()
+    seeds = subscribers[:60]
+    matches = index.query(seeds, k=10)
+    assert len(matches) == 10
+    assert not {m['subscriber_id'] for m in matches} & set(seeds)
+    assert distances(matches) == brute_force(seeds, 10)
+
+
+def test_changes_and_deletes_are_applied_incrementally(subscribers):
+    index = LookalikeIndex(max_delta=1000)
+    index.build()
+    changed, deleted = subscribers[60], subscribers[61]
+    db.session.get(Subscriber, changed).subscription_tier = 'enterprise'
+    db.session.delete(db.session.get(Subscriber, deleted))
+    db.session.commit()
+    index.mark_changed([changed])
+    index.mark_changed([deleted], 'deleted')
+
+    ids, vectors = index.vectors_for([changed, deleted])
+    assert ids == [changed]
+    assert vectors[0][feature('tier=enterprise')] == 1.0
+    assert deleted not in {m['subscriber_id'] for m in index.query(subscribers[:1], k=100)}
+    assert distances(index.query(subscribers[62:64], k=10)) == brute_force(subscribers[62:64], 10)
+
+
+def test_rebuild_runs_in_the_background_and_keeps_changes_made_during_it(subscribers, monkeypatch):
+    background = BackgroundIndex('test lookalike', None)
+    index = LookalikeIndex(rebuild_ratio=0.0, max_delta=0, background=background)
+    index.build()
+    late = subscribers[70]
+    building = services.lookalike.BallTree
+
+    def build_tree(*args, **kwargs):
+        # A write that lands while the new tree is being built
+        db.session.get(Subscriber, late).risk_tolerance = 'aggressive'
+        db.session.commit()
+        index.mark_changed([late])
+        with monkeypatch.context() as patch:
+            patch.setattr(index, 'background', None)
+            patch.setattr(index, 'rebuild_ratio', 1.0)
+            patch.setattr(index, 'max_delta', 10 ** 6)
+            index._apply_pending()
+        return building(*args, **kwargs)
+
+    db.session.get(Subscriber, subscribers[65]).subscription_tier = 'premium'
+    db.session.commit()
+    monkeypatch.setattr(services.lookalike, 'BallTree', build_tree)
+    index.mark_changed([subscribers[65]])
+    index._apply_pending()  # Starts the rebuild and returns
+    background._task.join()
+    monkeypatch.undo()
+
+    assert list(index._delta) == [late]
+    assert index._stale == {late}
+    assert index.vectors_for([late])[1][0][feature('risk=aggressive')] == 1.0
+    assert distances(index.query(subscribers[60:62], k=10)) == brute_force(subscribers[60:62], 10)
+
+
+@pytest.mark.parametrize('body', [
+    {'k': 0}, {'k': -5}, {'k': 1001}, {'k': '10'}, {'k': True},
+    {'top_ltv_percent': 0}, {'top_ltv_percent': 150}, {'top_ltv_percent': 'all'},
+    {'seed_ids': 'seed'}, {'seed_ids': [1, 'two']}
+])
+def test_invalid_lookalike_requests_are_rejected(app, body):
+    assert app.test_client().post('/api/subscribers/lookalikes', json=body).status_code == 400
@@ -0,0 +1,120 @@
+"""
+Lifetime Value Tests for PersonalizeAI Platform
+The LTV model and the incremental, watermarked refresh across retention tiers
+"""
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+from sqlalchemy import inspect, text
+
+from main import db
+from models.personalization import PersonalizationResult
+from models.pipeline import PipelineState
+from models.subscriber import Subscriber
+from services.ltv import LATE_CONVERSION_WINDOW, PIPELINE_NAME, LTVModel, refresh_lifetime_values
+from services.retention import ResultsRetention
+
+DOMAIN = 'ltv.example.com'
+HISTORICAL = LTVModel(include_projection=False)  # LTV is the conversion total
+
+
+def _clear():
+    db.session.rollback()
+    ids = [row[0] for row in db.session.query(Subscriber.id).filter(Subscriber.email.contains(DOMAIN))]
+    PersonalizationResult.query.filter(PersonalizationResult.subscriber_id.in_(ids)).delete(
+        synchronize_session=False
+    )
+    Subscriber.query.filter(Subscriber.id.in_(ids)).delete(synchronize_session=False)
+    PipelineState.query.filter_by(name=PIPELINE_NAME).delete()
+    for name in inspect(db.engine).get_table_names():
+        if name.startswith('personalization_results_2'):
+            db.session.execute(text(f'DROP TABLE {name}'))
+    db.session.commit()
+
+
+@pytest.fixture
+def subscribers(app, tmp_path, monkeypatch):
+    monkeypatch.setenv('RESULTS_ARCHIVE_PATH', str(tmp_path / 'archives'))
+    _clear()
+    rows = [Subscriber(email=f'buyer{i}@{DOMAIN}', lifetime_value=0.0) for i in range(3)]
+    db.session.add_all(rows)
+    db.session.commit()
+    yield rows
+    _clear()
+
+
+def convert(subscriber, value, converted_at, created_at=None):
+    db.session.add(PersonalizationResult(subscriber_id=subscriber.id, content_type='subject_line',
+                                         personalized_content='Subject', conversion_value=value,
+                                         converted_at=converted_at, created_at=created_at or converted_at))
+    db.session.commit()
+
+
+def lifetime_values(rows):
+    db.session.expire_all()
+    return [row.lifetime_value for row in rows]
+
+
+def watermark():
+    db.session.expire_all()
+    return db.session.get(PipelineState, PIPELINE_NAME).watermark
+
+
+def test_projection_matches_the_discounted_monthly_sum():
+    now = datetime(2026, 10, 19)
+    frame = pd.DataFrame({'historical': [120.0, 0.0], 'subscription_date': [now - timedelta(days=365), None],
+                          'subscription_tier': ['premium', 'basic'], 'churn_risk_score': [0.3, None]})
+    tenure = 365 / 30.44
+    ratio = (1 - 0.3 / 12) / 1.01
+    expected = 120.0 + 120.0 / tenure * sum(ratio ** m for m in range(1, 25))
+    assert LTVModel().compute(frame, now=now).tolist() == pytest.approx([expected, 0.0])
+
+
+def test_only_subscribers_with_new_conversions_are_refreshed(subscribers):
+    now = datetime.utcnow()
+    first, second, untouched = subscribers
+    convert(first, 10.0, now - timedelta(days=2))
+    convert(second, 5.0, now - timedelta(days=1))
+
+    assert refresh_lifetime_values(HISTORICAL) == 2
+    assert lifetime_values(subscribers) == [10.0, 5.0, 0.0]
+    assert watermark() == now - timedelta(days=1)  # The latest conversion, not the wall clock
+
+    assert refresh_lifetime_values(HISTORICAL) == 1  # Only the rescanned late window: `second`
+    convert(first, 2.5, now)
+    assert refresh_lifetime_values(HISTORICAL) == 2  # `first`, and `second` again from the window
+    assert lifetime_values(subscribers) == [12.5, 5.0, 0.0]
+    assert watermark() == now
+
+
+def test_conversions_committed_late_with_earlier_timestamps_are_picked_up(subscribers):
+    now = datetime.utcnow()
+    first, second, _ = subscribers
+    convert(first, 10.0, now)
+    refresh_lifetime_values(HISTORICAL)
+
+    convert(second, 4.0, now - LATE_CONVERSION_WINDOW / 2)  # Before the watermark, inside the window
+    convert(second, 1.0, now - LATE_CONVERSION_WINDOW * 2)  # Outside it: counted with the next change
+    assert refresh_lifetime_values(HISTORICAL) == 2
+    assert lifetime_values(subscribers)[:2] == [10.0, 5.0]
+    assert watermark() == now
+
+
+def test_totals_include_conversions_in_warm_and_archived_months(subscribers):
+    now = datetime.utcnow()
+    first, second, _ = subscribers
+    convert(first, 7.0, now - timedelta(days=400))  # Archived
+    convert(first, 3.0, now - timedelta(days=150))  # Warm
+    convert(second, 1.0, now - timedelta(days=400))
+    ResultsRetention(hot_months=3, archive_after_months=12, attribution_days=30).run(now=now)
+    assert PersonalizationResult.query.filter(PersonalizationResult.subscriber_id.in_(
+        [first.id, second.id])).count() == 0
+
+    assert refresh_lifetime_values(HISTORICAL, full=True) == Subscriber.query.count()
+    assert lifetime_values(subscribers) == [10.0, 1.0, 0.0]
+
+    convert(first, 2.0, now)  # A new hot conversion recomputes the full total
+    assert refresh_lifetime_values(HISTORICAL, chunk_size=1) == 1
+    assert lifetime_values(subscribers) == [12.0, 1.0, 0.0]
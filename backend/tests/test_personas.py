@@ -0,0 +1,62 @@
+"""
+Persona Tests for PersonalizeAI Platform
+Stable persona names across refits via Hungarian matching of centroids
+"""
+
+import numpy as np
+
+from services.personas import MATCH_DISTANCE, name_clusters
+from services.subscriber_features import FEATURE_NAMES
+
+
+def centroid(**features):
+    """A centroid with the named features set, e.g. centroid(churn_risk=0.9)"""
+    vector = np.zeros(len(FEATURE_NAMES))
+    for name, value in features.items():
+        vector[FEATURE_NAMES.index(name.replace('__', '='))] = value
+    return vector
+
+
+PREVIOUS_CENTROIDS = np.array([
+    centroid(churn_risk=0.9),
+    centroid(experience__beginner=1.0),
+    centroid(risk__aggressive=1.0, experience__advanced=1.0),
+    centroid(risk__conservative=1.0, experience__intermediate=1.0)
+])
+PREVIOUS = {'centroids': PREVIOUS_CENTROIDS.tolist(), 'names': ['churners', 'newcomers', 'traders', 'savers']}
+
+
+def test_refit_clusters_keep_their_names_whatever_their_order():
+    order = [2, 0, 3, 1]
+    noise = np.random.default_rng(3).normal(0, 0.05, PREVIOUS_CENTROIDS.shape)
+    refit = PREVIOUS_CENTROIDS[order] + noise
+    assert name_clusters(refit, PREVIOUS) == [PREVIOUS['names'][i] for i in order]
+
+
+def test_matching_minimises_total_distance_rather_than_going_greedy():
+    # The first new centroid is nearest to B, but giving it B would leave the
+    # second one too far from A to match; the optimal assignment names both
+    a, b = centroid(portfolio_size=0.0), centroid(portfolio_size=1.0)
+    new = np.array([centroid(portfolio_size=0.6), centroid(portfolio_size=1.5)])
+    previous = {'centroids': [a.tolist(), b.tolist()], 'names': ['A', 'B']}
+    assert name_clusters(new, previous) == ['A', 'B']
+
+
+def test_distant_clusters_get_rule_based_names_with_suffixes():
+    far = centroid(churn_risk=0.9, portfolio_size=MATCH_DISTANCE + 1.0)
+    refit = np.vstack([PREVIOUS_CENTROIDS[:3], far, far])
+    names = name_clusters(refit, PREVIOUS)
+    assert names[:3] == ['churners', 'newcomers', 'traders']
+    assert names[3:] == ['at_risk_reader', 'at_risk_reader_2']
+
+
+def test_a_changed_feature_layout_ignores_the_previous_names():
+    previous = {'centroids': [[0.0, 1.0]], 'names': ['old']}
+    assert name_clusters(PREVIOUS_CENTROIDS, previous) == [
+        'at_risk_reader', 'new_investor', 'active_trader', 'conservative_investor'
+    ]
+
+
+def test_first_fit_names_are_unique():
+    names = name_clusters(np.array([centroid(churn_risk=0.9)] * 3))
+    assert names == ['at_risk_reader', 'at_risk_reader_2', 'at_risk_reader_3']
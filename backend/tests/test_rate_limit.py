@@ -0,0 +1,115 @@
+"""
+Rate Limiting Tests for PersonalizeAI Platform
+Token bucket consumption and refill in the shared memory-mapped table, and the request hooks
+"""
+
+import pytest
+from flask import Flask
+
+import middleware.rate_limit
+from middleware.rate_limit import SLOTS_PER_GROUP, SharedTokenBuckets, init_rate_limiter
+
+
+@pytest.fixture
+def buckets(tmp_path):
+    return SharedTokenBuckets(str(tmp_path / 'buckets'), groups=16)
+
+
+def drain(buckets, key, capacity, rate, now):
+    """Consume until the bucket refuses; returns how many requests were allowed"""
+    allowed = 0
+    while buckets.consume(key, capacity, rate, now=now)[0]:
+        allowed += 1
+    return allowed
+
+
+def test_new_bucket_starts_full(buckets):
+    assert drain(buckets, 'key', 5, 1.0, now=1000.0) == 5
+    allowed, tokens, seconds_until_full = buckets.consume('key', 5, 1.0, now=1000.0)
+    assert not allowed
+    assert tokens == pytest.approx(0.0)
+    assert seconds_until_full == pytest.approx(5.0)
+
+
+def test_tokens_refill_at_the_configured_rate(buckets):
+    drain(buckets, 'key', 10, 0.5, now=1000.0)
+    assert not buckets.consume('key', 10, 0.5, now=1001.0)[0]  # Half a token
+    allowed, tokens, _ = buckets.consume('key', 10, 0.5, now=1004.0)
+    assert allowed
+    assert tokens == pytest.approx(0.5 + 1.5 - 1.0)  # Kept from 1001, refilled since, spent
+    assert drain(buckets, 'key', 10, 0.5, now=1010.0) == 4
+
+
+def test_refill_is_capped_at_capacity(buckets):
+    buckets.consume('key', 3, 1.0, now=1000.0)
+    assert drain(buckets, 'key', 3, 1.0, now=100000.0) == 3
+
+
+def test_keys_have_separate_buckets(buckets):
+    drain(buckets, 'a', 2, 1.0, now=1000.0)
+    assert buckets.consume('b', 2, 1.0, now=1000.0)[0]
+
+
+def test_buckets_are_shared_through_the_file(tmp_path):
+    path = str(tmp_path / 'buckets')
+    first, second = SharedTokenBuckets(path, groups=16), SharedTokenBuckets(path, groups=16)
+    assert drain(first, 'key', 4, 1.0, now=1000.0) == 4
+    assert not second.consume('key', 4, 1.0, now=1000.0)[0]
+    assert second.consume('key', 4, 1.0, now=1001.0)[0]
+
+
+def test_full_group_reuses_the_stalest_slot(tmp_path):
+    buckets = SharedTokenBuckets(str(tmp_path / 'buckets'), groups=1)
+    for i in range(SLOTS_PER_GROUP):
+        drain(buckets, f'key-{i}', 2, 0.001, now=1000.0 + i)
+    # The group is full; a new key takes key-0's slot and key-0 starts over with a full bucket
+    assert buckets.consume('new', 2, 0.001, now=2000.0)[0]
+    assert not buckets.consume('key-1', 2, 0.001, now=2000.0)[0]
+    assert drain(buckets, 'key-0', 2, 0.001, now=2000.0) == 2
+
+
+@pytest.fixture
+def limited_app(tmp_path, monkeypatch):
+    """A bare app with the limiter registered as main.py does, with the environment defaults"""
+    monkeypatch.delenv('RATE_LIMIT_ENABLED', raising=False)
+    monkeypatch.setenv('RATE_LIMIT_FILE', str(tmp_path / 'buckets'))
+    monkeypatch.setenv('API_KEYS', 'secret:basic')
+    monkeypatch.setitem(middleware.rate_limit.TIER_LIMITS, 'free', 2)
+    monkeypatch.setattr(middleware.rate_limit, 'DASHBOARD_LIMIT', 5)
+    app = Flask(__name__)
+    for path in ('/api/dashboard', '/api/subscribers/', '/api/personalize'):
+        app.add_url_rule(path, path, lambda: 'ok', methods=['GET', 'POST'])
+    assert init_rate_limiter(app) is not None  # On unless explicitly disabled
+    return app.test_client()
+
+
+def allowed(client, method, path, **kwargs):
+    """How many requests pass before the first 429"""
+    count = 0
+    while client.open(path, method=method, **kwargs).status_code == 200:
+        count += 1
+    return count
+
+
+def test_limiter_can_be_disabled(monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', 'false')
+    assert init_rate_limiter(Flask(__name__)) is None
+
+
+def test_anonymous_clients_get_the_free_tier(limited_app):
+    response = limited_app.post('/api/personalize')
+    assert response.headers['X-RateLimit-Limit'] == '2'
+    assert allowed(limited_app, 'POST', '/api/personalize') == 1
+
+
+def test_dashboard_reads_have_their_own_bucket(limited_app):
+    assert limited_app.get('/api/dashboard').headers['X-RateLimit-Limit'] == '5'
+    assert allowed(limited_app, 'GET', '/api/subscribers/') == 4
+    # The free-tier bucket for the same address is untouched, and writes still use it
+    assert allowed(limited_app, 'POST', '/api/subscribers/') == 2
+    assert allowed(limited_app, 'GET', '/api/personalize') == 0
+
+
+def test_api_keys_use_their_tier(limited_app):
+    response = limited_app.get('/api/dashboard', headers={'X-API-Key': 'secret'})
+    assert response.headers['X-RateLimit-Limit'] == '1000'
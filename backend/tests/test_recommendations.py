@@ -0,0 +1,149 @@
+"""
+Recommendation Tests for PersonalizeAI Platform
+Subscriber interest index: audiences, incremental changes and background rebuilds; content routes
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from main import db
+from models.content import ContentItem
+from models.subscriber import Subscriber
+from services.recommendations import SubscriberTermIndex, TermVocabulary, subscriber_terms
+from services.subscriber_events import BackgroundIndex
+
+DOMAIN = 'recommendations.example.com'
+
+
+@pytest.fixture
+def subscribers(app):
+    """Three crypto readers and three education readers"""
+    rows = [Subscriber(email=f'reader{i}@{DOMAIN}', risk_tolerance='moderate',
+                       preferred_content_types=['crypto' if i < 3 else 'education']) for i in range(6)]
+    db.session.add_all(rows)
+    db.session.commit()
+    yield [row.id for row in rows]
+    db.session.rollback()
+    Subscriber.query.filter(Subscriber.email.contains(DOMAIN)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def audience_ids(index, term):
+    return sorted(subscriber_id for subscriber_id, _ in index.audience({term: 1.0}, limit=1000))
+
+
+def set_content_types(subscriber_id, content_types):
+    db.session.get(Subscriber, subscriber_id).preferred_content_types = content_types
+    db.session.commit()
+
+
+def test_audience_lists_interested_subscribers(subscribers):
+    index = SubscriberTermIndex(TermVocabulary())
+    index.build()
+    assert audience_ids(index, 'type:crypto') == subscribers[:3]
+    assert audience_ids(index, 'type:education') == subscribers[3:]
+    assert audience_ids(index, 'type:options') == []
+
+
+def test_audience_scores_match_the_full_product(subscribers):
+    set_content_types(subscribers[1], ['crypto', 'education'])
+    db.session.get(Subscriber, subscribers[2]).content_preferences = {'crypto': 0.2, 'tickers': ['BTC']}
+    db.session.commit()
+    index = SubscriberTermIndex(TermVocabulary())
+    index.build()
+    query = {'type:crypto': 1.0, 'ticker:BTC': 0.5, 'tag:never-seen': 2.0}  # The last term grows the vocabulary
+
+    rows = db.session.query(Subscriber.id, Subscriber.preferred_content_types, Subscriber.content_preferences,
+                            Subscriber.risk_tolerance).order_by(Subscriber.id).all()
+    interests = index.vocabulary.matrix([subscriber_terms(r[1], r[2], r[3]) for r in rows]).toarray()
+    weights = index.vocabulary.matrix([query]).toarray().ravel()
+    expected = interests @ weights[:interests.shape[1]]
+    ranked = sorted(((rows[i][0], round(float(expected[i]), 6)) for i in np.flatnonzero(expected > 0)),
+                    key=lambda pair: -pair[1])
+
+    audience = index.audience(query, limit=1000)
+    assert [subscriber_id for subscriber_id, _ in audience] == [subscriber_id for subscriber_id, _ in ranked]
+    assert [score for _, score in audience] == pytest.approx([score for _, score in ranked], abs=1e-5)
+
+
+def test_changed_subscribers_shadow_their_indexed_rows(subscribers):
+    index = SubscriberTermIndex(TermVocabulary())
+    index.build()
+    set_content_types(subscribers[0], ['education'])
+    index.mark_changed([subscribers[0]])
+    assert audience_ids(index, 'type:crypto') == subscribers[1:3]
+    assert audience_ids(index, 'type:education') == [subscribers[0]] + subscribers[3:]
+
+
+def test_rebuild_runs_in_the_background_and_keeps_changes_made_during_it(subscribers, monkeypatch):
+    background = BackgroundIndex('test interest', None)
+    index = SubscriberTermIndex(TermVocabulary(), rebuild_ratio=0.0, min_delta=0, chunk_size=2,
+                                background=background)
+    index.build()
+    late = subscribers[5]
+    reading = index.vocabulary.matrix
+    rebuilding = []
+
+    def read_chunk(term_dicts, grow=False):
+        if grow and rebuilding == [True]:  # The rebuild's first chunk: a write lands during the scan
+            rebuilding.append(False)
+            set_content_types(late, ['crypto'])
+            index.mark_changed([late])
+            with monkeypatch.context() as patch:
+                patch.setattr(index, 'min_delta', 10 ** 6)
+                index._apply_pending()
+        return reading(term_dicts, grow)
+
+    monkeypatch.setattr(index.vocabulary, 'matrix', read_chunk)
+    set_content_types(subscribers[0], ['education'])
+    index.mark_changed([subscribers[0]])
+    rebuilding.append(True)
+    index._apply_pending()  # Starts the rebuild and returns
+    background._task.join()
+
+    assert list(index._delta) == [late]
+    assert audience_ids(index, 'type:crypto') == subscribers[1:3] + [late]
+    assert audience_ids(index, 'type:education') == [subscribers[0], subscribers[3], subscribers[4]]
+
+
+@pytest.fixture
+def content(app):
+    yield app.test_client()
+    ContentItem.query.filter(ContentItem.title.like('Recommendation test%')).delete(synchronize_session=False)
+    db.session.commit()
+
+
+@pytest.mark.parametrize('published_at, stored', [
+    ('2026-05-01T14:30:00Z', datetime(2026, 5, 1, 14, 30)),
+    ('2026-05-01T16:30:00+02:00', datetime(2026, 5, 1, 14, 30)),
+    ('2026-05-01T09:30:00-05:00', datetime(2026, 5, 1, 14, 30)),
+    ('2026-05-01T14:30:00', datetime(2026, 5, 1, 14, 30))
+])
+def test_published_at_is_stored_as_utc(content, published_at, stored):
+    response = content.post('/api/content/', json={'title': 'Recommendation test', 'content_type': 'education',
+                                                   'published_at': published_at})
+    assert response.status_code == 201
+    assert db.session.get(ContentItem, response.get_json()['content']['id']).published_at == stored
+
+
+@pytest.mark.parametrize('published_at', ['yesterday', '2026-13-01', 1714573800])
+def test_invalid_published_at_is_rejected(content, published_at):
+    response = content.post('/api/content/', json={'title': 'Recommendation test', 'content_type': 'education',
+                                                   'published_at': published_at})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('body', [
+    {'max_age_days': 'week'}, {'max_age_days': -1}, {'max_age_days': True}, {'max_age_days': [7]},
+    {'content_types': 'education'}, {'content_types': [1, 2]}, {'content_types': {'education': 1}},
+    {'k': 'five'}, {'k': 0}, {'k': 51},
+    {'subscriber_ids': 'all'}, {'subscriber_ids': ['1']}, {'filters': ['tier']}
+])
+def test_invalid_recommendation_requests_are_rejected(content, body):
+    assert content.post('/api/content/recommendations', json=body).status_code == 400
+
+
+def test_negative_max_age_is_rejected_for_one_subscriber(content):
+    assert content.get('/api/content/recommendations/1?max_age_days=-3').status_code == 400
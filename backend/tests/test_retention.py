@@ -0,0 +1,141 @@
+"""
+Retention Tests for PersonalizeAI Platform
+Personalization results moved through the hot, warm and cold tiers and read back
+"""
+
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import inspect, text
+
+from main import db
+from models.personalization import PersonalizationResult
+from models.subscriber import Subscriber
+from services.retention import ResultsRetention
+
+NOW = datetime(2026, 10, 19, 12, 0)
+
+
+def _clear():
+    db.session.rollback()
+    PersonalizationResult.query.delete()
+    for name in inspect(db.engine).get_table_names():
+        if name.startswith('personalization_results_2'):
+            db.session.execute(text(f'DROP TABLE {name}'))
+    db.session.commit()
+
+
+@pytest.fixture
+def subscriber(app):
+    _clear()
+    subscriber = Subscriber(email='retention@example.com')
+    db.session.add(subscriber)
+    db.session.commit()
+    yield subscriber
+    _clear()
+    Subscriber.query.filter(Subscriber.email.like('retention%')).delete(synchronize_session=False)
+    db.session.commit()
+
+
+@pytest.fixture
+def retention(tmp_path):
+    return ResultsRetention(hot_months=3, archive_after_months=12, archive_dir=str(tmp_path), chunk_size=2,
+                            attribution_days=30)
+
+
+def add_result(subscriber, created_at, **fields):
+    result = PersonalizationResult(subscriber_id=subscriber.id, content_type='subject_line',
+                                   personalized_content=f'Subject {created_at:%Y-%m-%d}', created_at=created_at,
+                                   **fields)
+    db.session.add(result)
+    db.session.commit()
+    return result.id
+
+
+def hot_ids():
+    return sorted(row[0] for row in db.session.query(PersonalizationResult.id))
+
+
+def test_run_moves_old_months_to_warm_partitions_and_archives(subscriber, retention):
+    cold = add_result(subscriber, datetime(2025, 6, 15))
+    warm = [add_result(subscriber, datetime(2026, 5, day)) for day in (1, 10, 31)]
+    hot = [add_result(subscriber, datetime(2026, 9, 25)), add_result(subscriber, datetime(2026, 10, 2))]
+
+    assert retention.run(now=NOW) == {'demoted': {'2025-06': 1, '2026-05': 3}, 'archived': {'2025-06': 1}}
+    assert hot_ids() == hot
+    assert retention.warm_months() == ['2026-05']
+    assert retention.archived_months() == ['2025-06']
+    assert retention.query(datetime(2026, 5, 1), datetime(2026, 6, 1))['id'].tolist() == warm
+    assert retention.query(datetime(2025, 6, 1), datetime(2025, 7, 1))['id'].tolist() == [cold]
+
+    assert retention.run(now=NOW) == {'demoted': {}, 'archived': {}}
+
+
+def test_query_reads_every_tier_back_unchanged(subscriber, retention):
+    fields = {'was_sent': True, 'was_opened': True, 'ab_test_variant': 'B',
+              'sent_at': datetime(2025, 6, 15, 9), 'opened_at': datetime(2025, 6, 15, 10),
+              'conversion_value': 12.5, 'converted_at': datetime(2025, 6, 16)}
+    ids = [add_result(subscriber, datetime(2025, 6, 15), **fields),
+           add_result(subscriber, datetime(2026, 5, 10), **fields),
+           add_result(subscriber, datetime(2026, 10, 2), **fields)]
+    before = retention.query(datetime(2025, 1, 1))
+    retention.run(now=NOW)
+    after = retention.query(datetime(2025, 1, 1))
+
+    assert after['id'].tolist() == ids
+    columns = ['id', 'subscriber_id', 'was_sent', 'was_opened', 'was_clicked', 'conversion_value',
+               'ab_test_variant', 'created_at', 'sent_at', 'opened_at', 'clicked_at', 'converted_at']
+    after['was_clicked'] = after['was_clicked'].astype(bool)
+    before['was_clicked'] = before['was_clicked'].astype(bool)
+    pd.testing.assert_frame_equal(after[columns], before[columns], check_dtype=False)
+
+
+def test_query_filters_apply_in_every_tier(subscriber, retention):
+    other = Subscriber(email='retention-other@example.com')
+    db.session.add(other)
+    db.session.commit()
+    mine = [add_result(subscriber, datetime(2025, 6, 15)), add_result(subscriber, datetime(2026, 5, 10)),
+            add_result(subscriber, datetime(2026, 10, 2))]
+    for created_at in (datetime(2025, 6, 16), datetime(2026, 5, 11), datetime(2026, 10, 3)):
+        add_result(other, created_at)
+    retention.run(now=NOW)
+
+    assert retention.query(datetime(2025, 1, 1), subscriber_ids=[subscriber.id])['id'].tolist() == mine
+    assert retention.query(datetime(2025, 1, 1), subscriber_ids=[])['id'].tolist() == []
+
+
+def test_conversion_totals_and_month_iteration_cover_archived_results(subscriber, retention):
+    add_result(subscriber, datetime(2025, 6, 15), conversion_value=10.0)
+    add_result(subscriber, datetime(2026, 5, 10), conversion_value=2.5)
+    add_result(subscriber, datetime(2026, 10, 2), conversion_value=100.0)
+    retention.run(now=NOW)
+
+    # Warm and cold tiers only: the hot table is summed by the LTV refresh itself
+    assert retention.archived_conversion_totals([subscriber.id]).tolist() == [12.5]
+    months = {month: len(frame) for month, frame in retention.iter_months(columns=['id', 'created_at'], now=NOW)}
+    assert list(months)[0] == '2025-06' and list(months)[-1] == '2026-10'
+    assert sum(months.values()) == 3
+
+
+def test_late_rows_are_merged_into_an_existing_archive(subscriber, retention):
+    first = add_result(subscriber, datetime(2025, 6, 15))
+    retention.run(now=NOW)
+    late = add_result(subscriber, datetime(2025, 6, 20))
+    assert retention.run(now=NOW) == {'demoted': {'2025-06': 1}, 'archived': {'2025-06': 2}}
+    assert retention.query(datetime(2025, 6, 1), datetime(2025, 7, 1))['id'].tolist() == [first, late]
+
+
+def test_months_stay_hot_until_their_attribution_window_passes(app, subscriber, tmp_path):
+    retention = ResultsRetention(hot_months=1, archive_dir=str(tmp_path), attribution_days=30)
+    august = add_result(subscriber, datetime(2026, 8, 20))
+    september = add_result(subscriber, datetime(2026, 9, 28))
+
+    # September ended 18 days before NOW, so it still accepts events
+    assert retention.run(now=NOW)['demoted'] == {'2026-08': 1}
+    assert hot_ids() == [september]
+
+    client = app.test_client()
+    response = client.post(f'/api/personalize/results/{september}/events', json={'event': 'opened'})
+    assert response.status_code == 200 and response.get_json()['counted']
+    assert client.post(f'/api/personalize/results/{august}/events', json={'event': 'opened'}).status_code == 404
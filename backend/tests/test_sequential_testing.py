@@ -0,0 +1,109 @@
+"""
+Sequential Testing Tests for PersonalizeAI Platform
+mSPRT p-values, always-valid confidence intervals and their running intersection
+"""
+
+import numpy as np
+import pytest
+
+from models.personalization import ABTest
+from services import sequential_testing
+from services.sequential_testing import DEFAULT_MIXING_SD, SequentialEvaluator, always_valid_interval, msprt
+
+
+def test_p_value_matches_the_mixture_likelihood_ratio():
+    theta, variance, p_value = msprt(4000, 400, 4000, 480)
+    p_control, p_treatment = 400 / 4000, 480 / 4000
+    expected_variance = p_control * (1 - p_control) / 4000 + p_treatment * (1 - p_treatment) / 4000
+    tau2 = DEFAULT_MIXING_SD ** 2
+    ratio = (np.sqrt(expected_variance / (expected_variance + tau2)) *
+             np.exp(tau2 * 0.02 ** 2 / (2 * expected_variance * (expected_variance + tau2))))
+    assert np.isclose(theta, 0.02)
+    assert np.isclose(variance, expected_variance)
+    assert np.isclose(p_value, 1 / ratio)
+
+
+def test_equal_rates_give_p_value_one():
+    _, _, p_value = msprt(5000, 500, 5000, 500)
+    assert p_value == 1.0
+
+
+def test_p_value_shrinks_as_evidence_accumulates():
+    sizes = np.array([500, 2000, 8000, 32000])
+    _, _, p_values = msprt(sizes, sizes * 0.10, sizes, sizes * 0.12)
+    assert np.all(np.diff(p_values) < 0)
+    assert p_values[-1] < 0.001
+
+
+def test_empty_or_degenerate_arms_give_p_value_one():
+    _, _, p_values = msprt([0, 100, 100], [0, 0, 100], [100, 0, 100], [10, 0, 100])
+    assert np.array_equal(p_values, [1.0, 1.0, 1.0])
+
+
+def test_checking_after_every_batch_keeps_the_false_positive_rate():
+    # A/A tests peeked at 50 times each: the running minimum p-value may
+    # cross alpha in at most about alpha of them
+    rng = np.random.default_rng(7)
+    experiments, looks, batch, rate, alpha = 400, 50, 200, 0.1, 0.05
+    control = rng.binomial(batch, rate, size=(experiments, looks)).cumsum(axis=1)
+    treatment = rng.binomial(batch, rate, size=(experiments, looks)).cumsum(axis=1)
+    n = np.arange(1, looks + 1) * batch
+    _, _, p_values = msprt(n, control, n, treatment)
+    false_positives = (p_values.min(axis=1) < alpha).mean()
+    assert false_positives <= alpha
+
+
+def test_interval_excludes_zero_exactly_when_significant():
+    alpha = 0.05
+    n = np.array([1000, 3000, 6000, 12000, 24000])
+    theta, variance, p_values = msprt(n, n * 0.10, n, n * 0.115)
+    low, high = always_valid_interval(theta, variance, alpha)
+    assert np.all((low <= theta) & (theta <= high))
+    assert np.array_equal(p_values < alpha, (low > 0) | (high < 0))
+    assert (p_values < alpha).any() and not (p_values < alpha).all()
+
+
+def evaluate(monkeypatch, test, control, treatment):
+    """Run the evaluator on one A/B test with (participants, opens) per arm"""
+    counts = {(test.id, 'A'): {'participants': control[0], 'opens': control[1]},
+              (test.id, 'B'): {'participants': treatment[0], 'opens': treatment[1]}}
+    monkeypatch.setattr(sequential_testing, 'load_variant_counts', lambda test_ids: counts)
+    return SequentialEvaluator(auto_stop=False).evaluate([test])[test.id]
+
+
+@pytest.fixture
+def ab_test(app):
+    return ABTest(id=1, test_name='Subject lines', test_type='subject_line', variants=['a', 'b'],
+                  traffic_split=[50, 50], target_metric='open_rate', status='running',
+                  confidence_level=0.95, minimum_sample_size=100)
+
+
+def test_running_interval_is_the_intersection_of_every_run(monkeypatch, ab_test):
+    evaluate(monkeypatch, ab_test, (2000, 200), (2000, 230))
+    first = ab_test.sequential_results['variants']['B']['interval']
+    evaluate(monkeypatch, ab_test, (2200, 220), (2200, 218))
+    second = ab_test.sequential_results['variants']['B']['interval']
+
+    theta, variance, _ = msprt(2200, 220, 2200, 218)
+    lower, upper = always_valid_interval(theta, variance, 0.05)
+    assert second == [max(first[0], float(lower)), min(first[1], float(upper))]
+
+
+def test_decision_follows_the_interval_not_the_current_sign(monkeypatch, ab_test):
+    # Earlier runs showed B worse; B now edges ahead but its interval still overlaps the old one
+    ab_test.sequential_results = {'variants': {'B': {'p_value': 1e-6, 'interval': [-0.05, -0.01]}}}
+    decision = evaluate(monkeypatch, ab_test, (2000, 200), (2000, 205))
+    assert decision['winning_variant'] == 'A' and decision['reason'] == 'control_better'
+    assert ab_test.sequential_results['variants']['B']['interval'][1] == -0.01
+
+
+def test_no_decision_while_the_interval_contains_zero(monkeypatch, ab_test):
+    assert evaluate(monkeypatch, ab_test, (500, 50), (500, 55)) is None
+    low, high = ab_test.sequential_results['variants']['B']['interval']
+    assert low < 0 < high
+
+
+def test_treatment_wins_once_its_interval_lies_above_zero(monkeypatch, ab_test):
+    decision = evaluate(monkeypatch, ab_test, (20000, 2000), (20000, 2600))
+    assert decision['winning_variant'] == 'B' and decision['reason'] == 'treatment_better'
+    assert ab_test.sequential_results['variants']['B']['interval'][0] > 0
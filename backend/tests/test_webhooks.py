@@ -0,0 +1,199 @@
+"""
+Webhook Tests for PersonalizeAI Platform
+Outbox claiming and completion, retries into the dead-letter queue, and URL checks
+"""
+
+import socket
+from concurrent.futures import wait
+from datetime import datetime, timedelta
+
+import pytest
+
+from main import db
+from models.webhook import WebhookEndpoint, WebhookOutbox
+from services.webhooks import (WebhookDispatcher, check_webhook_url, endpoint_cache, enqueue_webhooks,
+                               replay_dead_letters)
+
+ADMIN_TOKEN = 'test-admin-token'
+
+
+@pytest.fixture
+def resolve(monkeypatch):
+    """Make every host name resolve to the given addresses"""
+    def set_addresses(*addresses):
+        monkeypatch.setattr(socket, 'getaddrinfo', lambda host, port, **kwargs: [
+            (socket.AF_INET6 if ':' in a else socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (a, port))
+            for a in addresses
+        ])
+    set_addresses('93.184.216.34')
+    return set_addresses
+
+
+@pytest.fixture
+def endpoint(app):
+    """The only active endpoint: batches of two, one request in flight"""
+    WebhookEndpoint.query.update({'is_active': False})
+    endpoint = WebhookEndpoint(url='https://hooks.example.com/in', secret='secret', max_batch_size=2,
+                               max_concurrency=1)
+    db.session.add(endpoint)
+    db.session.commit()
+    endpoint_cache.invalidate()
+    yield endpoint
+    db.session.rollback()
+    WebhookOutbox.query.delete()
+    WebhookEndpoint.query.delete()
+    db.session.commit()
+    endpoint_cache.invalidate()
+
+
+class FakeDelivery:
+    """Stands in for the HTTP POST; answers with the queued errors, then success"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.batches = []
+
+    def __call__(self, session, url, secret, delivery_id, payloads):
+        self.batches.append([p['data']['subscriber_id'] for p in payloads])
+        return self.errors.pop(0) if self.errors else None
+
+
+def dispatcher(delivery, **kwargs):
+    dispatcher = WebhookDispatcher(concurrency=4, **kwargs)
+    dispatcher._deliver = delivery
+    return dispatcher
+
+
+def cycle(dispatcher, now=None):
+    """Run one cycle and let the batches it submitted finish"""
+    stats = dispatcher.run_once(now=now)
+    wait(list(dispatcher._in_flight))
+    return stats
+
+
+def queue(count):
+    enqueue_webhooks('subscriber.created', [{'subscriber_id': i} for i in range(count)])
+    db.session.commit()
+
+
+def statuses():
+    db.session.expire_all()
+    return [row.status for row in WebhookOutbox.query.order_by(WebhookOutbox.id)]
+
+
+def test_rows_are_claimed_in_batches_and_marked_delivered(endpoint):
+    queue(3)
+    delivery = FakeDelivery()
+    worker = dispatcher(delivery)
+
+    assert cycle(worker)['submitted'] == 1  # max_concurrency=1 holds back the second batch
+    assert statuses() == ['delivering', 'delivering', 'pending']
+    assert cycle(worker) == {'delivered': 2, 'dead': 0, 'submitted': 1}
+    assert worker.run_once()['delivered'] == 1
+    assert delivery.batches == [[0, 1], [2]]
+    assert statuses() == ['delivered'] * 3
+    assert {row.attempts for row in WebhookOutbox.query} == {1}
+
+
+def test_failures_back_off_then_move_to_the_dead_letter_queue(endpoint):
+    queue(1)
+    worker = dispatcher(FakeDelivery('HTTP 500: oops', 'HTTP 503: busy'), max_attempts=2, base_delay=60.0)
+    now = datetime.utcnow()
+
+    cycle(worker, now)
+    assert worker.run_once(now)['submitted'] == 0  # Recorded the failure; not due again yet
+    row = WebhookOutbox.query.one()
+    assert (row.status, row.attempts, row.last_error) == ('pending', 1, 'HTTP 500: oops')
+    assert now + timedelta(seconds=30) <= row.next_attempt_at <= now + timedelta(seconds=61)
+
+    cycle(worker, now + timedelta(minutes=2))
+    assert worker.run_once()['dead'] == 1
+    db.session.expire_all()
+    assert (row.status, row.attempts, row.last_error) == ('dead', 2, 'HTTP 503: busy')
+
+    assert replay_dead_letters(endpoint_id=endpoint.id) == 1
+    assert cycle(worker)['submitted'] == 1
+    assert worker.run_once()['delivered'] == 1
+
+
+def test_expired_claims_are_released_and_the_late_result_is_ignored(endpoint):
+    queue(1)
+    slow, fast = dispatcher(FakeDelivery('HTTP 500: late')), dispatcher(FakeDelivery())
+    cycle(slow)
+
+    # The first claim outlives its lock; another dispatcher re-claims and delivers the row
+    later = datetime.utcnow() + timedelta(minutes=5)
+    cycle(fast, later)
+    assert fast.run_once(later)['delivered'] == 1
+    assert slow.run_once(later) == {'delivered': 0, 'dead': 0, 'submitted': 0}
+    assert statuses() == ['delivered']
+
+
+def test_enqueue_respects_endpoint_event_filters(endpoint):
+    endpoint.event_types = ['email.opened']
+    db.session.commit()
+    endpoint_cache.invalidate()
+    queue(2)
+    assert statuses() == []
+    enqueue_webhooks('email.opened', [{'subscriber_id': 1}])
+    db.session.commit()
+    assert statuses() == ['pending']
+
+
+@pytest.mark.parametrize('address', [
+    '127.0.0.1', '10.1.2.3', '192.168.0.10', '169.254.169.254', '::1', '::ffff:127.0.0.1', 'fd00::1', '224.0.0.1'
+])
+def test_urls_resolving_to_internal_addresses_are_rejected(resolve, address):
+    resolve('93.184.216.34', address)  # One bad address is enough
+    with pytest.raises(ValueError, match='non-public'):
+        check_webhook_url('https://hooks.example.com/in')
+    check_webhook_url('https://hooks.example.com/in', allow_private=True)
+
+
+@pytest.mark.parametrize('url', ['ftp://hooks.example.com/in', 'hooks.example.com/in', 'https:///in', None, 42])
+def test_non_http_urls_are_rejected(resolve, url):
+    with pytest.raises(ValueError, match='http'):
+        check_webhook_url(url)
+
+
+def test_delivery_is_refused_if_the_host_is_re_pointed(resolve):
+    class Session:
+        def post(self, *args, **kwargs):
+            raise AssertionError('should not be called')
+
+    resolve('10.0.0.5')
+    error = WebhookDispatcher(concurrency=1)._deliver(Session(), 'https://hooks.example.com/in', 'secret', 'id', [])
+    assert 'non-public' in error
+
+
+def create(app, body):
+    return app.test_client().post('/api/webhooks/endpoints', json=body, headers={'X-Admin-Token': ADMIN_TOKEN})
+
+
+@pytest.fixture
+def admin(app, resolve, monkeypatch):
+    monkeypatch.setenv('WEBHOOK_ADMIN_TOKEN', ADMIN_TOKEN)
+    yield app
+    WebhookEndpoint.query.filter(WebhookEndpoint.url.contains('admin.example.com')).delete()
+    db.session.commit()
+    endpoint_cache.invalidate()
+
+
+@pytest.mark.parametrize('body', [
+    {'max_batch_size': 0}, {'max_batch_size': 501}, {'max_batch_size': '50'}, {'max_batch_size': 2.5},
+    {'max_concurrency': 0}, {'max_concurrency': 33}, {'max_concurrency': True}, {'max_concurrency': None},
+    {'event_types': 'email.opened'}, {'event_types': ['email.bounced']}, {'url': 'http://localhost/in'}
+])
+def test_invalid_endpoints_are_rejected(admin, resolve, body):
+    if body.get('url'):
+        resolve('127.0.0.1')
+    response = create(admin, dict({'url': 'https://admin.example.com/in'}, **body))
+    assert response.status_code == 400
+
+
+def test_endpoint_is_created_with_its_limits(admin):
+    response = create(admin, {'url': 'https://admin.example.com/in', 'max_batch_size': 500, 'max_concurrency': 1})
+    assert response.status_code == 201
+    endpoint = response.get_json()['endpoint']
+    assert (endpoint['max_batch_size'], endpoint['max_concurrency']) == (500, 1)
+    assert endpoint['secret']
@@ -42,6 +42,27 @@ function App() {
     fetchDashboardData();
   }, []);
 
+  // Live activity feed: the server pushes new events over SSE, so the
+  // dashboard payload doesn't need to be re-fetched to stay current
+  useEffect(() => {
+    if (!dashboardData || typeof EventSource === 'undefined') return;
+
+    const cursor = dashboardData.activity_cursor || 0;
+    const source = new EventSource(`${API_BASE_URL}/activity/stream?since=${cursor}`);
+
+    source.addEventListener('activity', (event) => {
+      const activity = JSON.parse(event.data);
+      setDashboardData((current) => ({
+        ...current,
+        activity_cursor: activity.id,
+        recent_activity: [activity, ...(current?.recent_activity || [])
+          .filter((item) => item.id !== activity.id)].slice(0, 10)
+      }));
+    });
+
+    return () => source.close();
+  }, [dashboardData !== null]);
+
   const fetchDashboardData = async () => {
     try {
       setLoading(true);